@@ -132,6 +132,7 @@ output.append(f'''
       TYPE: 'MRK'
       SIMULATION_SOURCE: 'simulationdb:5432'
       WS_HOST: 'controller'
+      MARKET_SOLVER: 'gurobi'
     configs:
       - source: market_config
         target: /opt/gurobi/gurobi.lic
@@ -12,7 +12,10 @@ class MarketAgent(BasicAgent):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         start_time = time.time()
-        self.market = DayAheadMarket()
+        self.market = DayAheadMarket(solver_type=kwargs.get('market_solver', 'gurobi'),
+                                     pricing=kwargs.get('market_pricing', 'max_price'),
+                                     warm_start=kwargs.get('market_warm_start', False),
+                                     presolve=kwargs.get('market_presolve', False))
 
         self.logger.info(f'setup of the agent completed in {time.time() - start_time:.2f} seconds')
 
@@ -28,35 +31,27 @@ class MarketAgent(BasicAgent):
     def market_clearing(self):
         start_time = time.time()
         df = self.simulation_interface.get_hourly_orders()
-        ask = df.loc[df['type'] == 'generation']
-        hourly_ask = {}
-        for key, value in ask.to_dict(orient='index').items():
-            hourly_ask.update({key: (value['price'], value['volume'])})
-
-        hourly_bid = {}
-        bid = df.loc[df['type'] == 'demand']
-        for key, value in bid.to_dict(orient='index').items():
-            hourly_bid.update({key: (value['price'], value['volume'])})
+        hourly_ask = df.loc[df['type'] == 'generation']
+        hourly_bid = df.loc[df['type'] == 'demand']
         self.logger.info(f'got hourly_orders in {time.time() - start_time:.2f} seconds')
         start_time = time.time()
 
-        df = self.simulation_interface.get_linked_orders()
-        linked_orders = {}
-        for key, value in df.to_dict(orient='index').items():
-            linked_orders.update({key: (value['price'], value['volume'], value['link'])})
+        linked_orders = self.simulation_interface.get_linked_orders()
         self.logger.info(f'got linked_orders in {time.time() - start_time:.2f} seconds')
         start_time = time.time()
 
-        df = self.simulation_interface.get_exclusive_orders()
-        exclusive_orders = {}
-        for key, value in df.to_dict(orient='index').items():
-            exclusive_orders.update({key: (value['price'], value['volume'])})
+        exclusive_orders = self.simulation_interface.get_exclusive_orders()
         self.logger.info(f'got exclusive_orders in {time.time() - start_time:.2f} seconds')
         start_time = time.time()
 
         self.market.set_parameter(hourly_ask, hourly_bid, linked_orders, exclusive_orders)
-        self.logger.info(f'start market optimization')
-        auction_results, used_ask_orders, used_linked_orders, used_exclusive_orders, used_bid_orders, merit_order = self.market.optimize()
+        if self.market.only_hourly_orders():
+            self.logger.info(f'start market clearing by merit order')
+            result = self.market.clear_merit_order()
+        else:
+            self.logger.info(f'start market optimization')
+            result = self.market.optimize()
+        auction_results, used_ask_orders, used_linked_orders, used_exclusive_orders, used_bid_orders, merit_order = result
         self.logger.info('get market results')
         t1 = time.time()
         market_results = dict(
@@ -17,7 +17,14 @@ class PwpAgent(BasicAgent):
         super().__init__(*args, **kwargs)
         start_time = time.time()
 
-        self.portfolio: PowerPlantPortfolio = PowerPlantPortfolio(name=self.name)
+        self.portfolio: PowerPlantPortfolio = PowerPlantPortfolio(name=self.name,
+                                                                  solver_type=kwargs.get('pwp_solver', 'highs'),
+                                                                  batch_steps=kwargs.get('pwp_batch_steps', False),
+                                                                  cache_size=kwargs.get('pwp_cache_size', 0),
+                                                                  workers=kwargs.get('pwp_workers', 0),
+                                                                  clusters=kwargs.get('pwp_clusters', 0))
+        # -> the error of the clustering is reported once against the optimization of each plant
+        self.clustering_reported = False
 
         self.weather_forecast = WeatherForecast(position=dict(lat=self.latitude, lon=self.longitude),
                                                 weather_interface=self.weather_interface)
@@ -59,6 +66,21 @@ class PwpAgent(BasicAgent):
 
         return local_weather, prices
 
+    def _log_cache(self):
+        statistics = self.portfolio.get_cache_statistics()
+        if statistics:
+            requests = statistics['hits'] + statistics['misses']
+            hit_rate = statistics['hits'] / requests if requests > 0 else 0
+            self.logger.info(f'optimization cache hit rate {hit_rate:.1%} '
+                             f"({statistics['hits']} of {requests} solves, {statistics['entries']} entries)")
+
+    def _log_clustering_error(self, weather, prices):
+        error = self.portfolio.get_clustering_error(self.date, weather.copy(), prices.copy())
+        self.logger.info(f"clustering of {error['systems']} into {error['representatives']} plants: "
+                         f"error of power {error['power']:.1%}, dispatch {error['dispatch']:.1%}, "
+                         f"objective {error['obj']:.1%}, {error['speedup']:.1f} times faster")
+        self.clustering_reported = True
+
     def optimize_day_ahead(self):
         """scheduling for the DayAhead market"""
         self.logger.info(f'dayAhead market scheduling started {self.date}')
@@ -69,6 +91,9 @@ class PwpAgent(BasicAgent):
         # Step 2: optimization
         self.portfolio.optimize(self.date, weather.copy(), prices.copy())
         self.logger.info(f'finished day ahead optimization in {time.time() - start_time:.2f} seconds')
+        self._log_cache()
+        if self.portfolio.clusters > 0 and not self.clustering_reported:
+            self._log_clustering_error(weather, prices)
 
         # save optimization results
         self.simulation_interface.set_generation(self.portfolio, 'optimize_dayAhead', self.area, self.date)
@@ -95,6 +120,7 @@ class PwpAgent(BasicAgent):
             self.logger.error(repr(e))
         except Exception:
             self.logger.exception('Error in PostMarket')
+        self._log_cache()
         # save optimization results
         self.simulation_interface.set_generation(self.portfolio, 'post_dayAhead', self.area, self.date)
         self.simulation_interface.set_demand(self.portfolio, 'post_dayAhead', self.area, self.date)
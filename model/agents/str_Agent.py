@@ -18,7 +18,7 @@ class StrAgent(BasicAgent):
         super().__init__(*args, **kwargs)
         start_time = time.time()
 
-        self.portfolio = StrPort(name=self.name)
+        self.portfolio = StrPort(name=self.name, batch=kwargs.get('str_batch', False))
 
         self.weather_forecast = WeatherForecast(position=dict(lat=self.latitude, lon=self.longitude),
                                                 weather_interface=self.weather_interface)
@@ -50,15 +50,16 @@ class PortfolioModel:
         self.energy_systems: list[EnergySystem] = []
         self.steps = steps
 
-        self.pool = Pool(4)
         self.run_multi_processing = run_multi_processing
+        self.pool = Pool(4) if run_multi_processing else None
 
 
         self.weather = pd.DataFrame()
         self.prices = pd.DataFrame()
 
     def __del__(self):
-        self.pool.close()
+        if self.pool is not None:
+            self.pool.close()
 
     def _set_parameter(self, date: pd.Timestamp, weather: pd.DataFrame, prices: pd.DataFrame) -> None:
         self.date = date
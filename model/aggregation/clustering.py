@@ -0,0 +1,76 @@
+# third party modules
+import numpy as np
+from sklearn.cluster import KMeans
+
+# -> parameters, which have to be equal in a cluster
+GROUP_KEYS = ['fuel', 'type', 'runTime', 'stopTime']
+
+
+def get_state(energy_system: dict) -> tuple:
+    # -> on state and the remaining must run and must stop hours, which have to be equal in a cluster
+    return (energy_system['P0'] > 0, min(energy_system['on'], energy_system['runTime']),
+            min(energy_system['off'], energy_system['stopTime']))
+
+
+def get_features(energy_system: dict) -> list:
+    # -> eta and the parameters relative to maxPower, which are clustered
+    max_power = energy_system['maxPower']
+    return [energy_system['eta'], energy_system['minPower'] / max_power,
+            energy_system['gradP'] / max_power, energy_system['gradM'] / max_power]
+
+
+def get_clusters(energy_systems: list, k: int) -> list:
+    """
+    clusters the power plants by fuel, type year, run and stop time and their initial state into groups
+    and each group by eta, minPower ratio and ramp ratios into clusters (k-means weighted by maxPower),
+    k is shared by the groups according to their size, returns the indices of the members of each cluster
+    """
+    if k >= len(energy_systems):
+        return [[index] for index in range(len(energy_systems))]
+
+    groups = {}
+    for index, energy_system in enumerate(energy_systems):
+        group = tuple(energy_system.get(key, 0) for key in GROUP_KEYS) + get_state(energy_system)
+        groups.setdefault(group, []).append(index)
+
+    features = np.asarray([get_features(energy_system) for energy_system in energy_systems], float)
+    scale = features.std(axis=0)
+    features /= np.where(scale > 0, scale, 1)
+    weights = np.asarray([energy_system['maxPower'] for energy_system in energy_systems], float)
+
+    clusters = []
+    for members in groups.values():
+        members = np.asarray(members)
+        # -> at least one representative per group
+        num = max(1, int(round(k * len(members) / len(energy_systems))))
+        num = min(num, len(np.unique(features[members], axis=0)))
+        if num == 1:
+            clusters.append(list(members))
+            continue
+        k_means = KMeans(n_clusters=num, n_init=10, random_state=0)
+        labels = k_means.fit_predict(features[members], sample_weight=weights[members])
+        clusters += [list(members[labels == label]) for label in np.unique(labels)]
+    return clusters
+
+
+def get_representative(energy_systems: list, name: str) -> dict:
+    """
+    representative plant of a cluster with the summed capacities and the capacity weighted mean of the ratios,
+    a start of the representative starts each member, so its start cost is the sum of the start costs
+    """
+    weights = np.asarray([energy_system['maxPower'] for energy_system in energy_systems], float)
+    max_power = weights.sum()
+    weights /= max_power
+
+    def get_mean(key: str) -> float:
+        return float(sum(w * energy_system[key] for w, energy_system in zip(weights, energy_systems)))
+
+    def get_sum(key: str) -> float:
+        return float(sum(energy_system[key] for energy_system in energy_systems))
+
+    first = energy_systems[0]
+    _, on, off = get_state(first)
+    return dict(unitID=name, fuel=first['fuel'], maxPower=max_power, minPower=get_sum('minPower'),
+                eta=get_mean('eta'), P0=get_sum('P0'), chi=get_mean('chi'), stopTime=first['stopTime'],
+                runTime=first['runTime'], gradP=get_sum('gradP'), gradM=get_sum('gradM'),
+                on=on, off=off, startCost=get_sum('startCost'))
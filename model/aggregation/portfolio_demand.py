@@ -4,8 +4,10 @@ import numpy as np
 
 
 # model modules
-from systems.prosumer import Prosumer
+from systems.prosumer import Prosumer, get_battery_use
+from systems.pv_fleet import PVFleet
 from systems.basic_system import EnergySystem, CONSUMER_TYPES
+from demandlib.electric_profile import get_load_profiles
 from aggregation.basic_portfolio import PortfolioModel
 
 
@@ -16,17 +18,29 @@ class DemandPortfolio(PortfolioModel):
         self._unique_pv_systems = {}
         self._unique_bat_systems = {}
         self._number_of_systems = {}
+        self.pv_fleet = PVFleet(T=T)
+        # -> unitID and demandP of the consumers of each type, which share one aggregated load
+        self._consumers = {consumer_type: [] for consumer_type in CONSUMER_TYPES}
+        self._consumer_systems = {}
 
     def add_energy_system(self, energy_system: dict) -> None:
 
         if energy_system['type'] in CONSUMER_TYPES:
-            model = EnergySystem(demand_type=energy_system['type'], **energy_system)
-            self.energy_systems.append(model)
+            model = self._consumer_systems.get(energy_system['type'])
+            if model is None:
+                model = EnergySystem(demand_type=energy_system['type'], **energy_system)
+                self._consumer_systems[energy_system['type']] = model
+                self.energy_systems.append(model)
+            else:
+                # -> the load profiles are linear in demandP
+                model.demand_generator.demandP += energy_system['demandP']
+            self._consumers[energy_system['type']].append((energy_system.get('unitID'), energy_system['demandP']))
         else:
 
-            model = Prosumer(T=self.T, **energy_system)
+            model = Prosumer(T=self.T, storage=energy_system['type'] == 'battery', **energy_system)
 
             if energy_system['type'] == 'battery':
+                model.simulate_storage = False
                 key = (energy_system['maxPower'], energy_system['batPower'], energy_system['VMax'],
                        energy_system['azimuth'], energy_system['tilt'], energy_system['demandP'])
                 if key not in self._unique_bat_systems.keys():
@@ -44,14 +58,45 @@ class DemandPortfolio(PortfolioModel):
             self.capacities['solar'] += energy_system['maxPower']
 
     def add_unique_systems(self):
-        for values in self._unique_pv_systems.values():
+        # -> the demand of the prosumers with a battery is not part of the household demand of the agent
+        for values in list(self._unique_pv_systems.values()) + list(self._unique_bat_systems.values()):
             self.energy_systems.append(values['model'])
+            self.pv_fleet.add_system(values['model'].name, values['model'].generation_system)
             self._number_of_systems[values['model'].name] = values['num']
-        for values in self._unique_bat_systems.values():
-            self._number_of_systems[values['model'].name] = values['num']
+
+    def _use_storages(self) -> None:
+        # -> one call of the battery kernel for all prosumers with a battery
+        models = [model for model in self.energy_systems
+                  if isinstance(model, Prosumer) and model.storage_system is not None]
+        if not models:
+            return
+        residual = np.asarray([model.demand['power'] - model.generation['solar'] for model in models])
+        grid_use, volume, vt = get_battery_use(residual,
+                                               np.asarray([model.storage_system['v0'] for model in models], float),
+                                               np.asarray([model.storage_system['v_max'] for model in models], float),
+                                               np.asarray([model.storage_system['efficiency'] for model in models], float))
+        for model, power, v, v_end in zip(models, grid_use, volume, vt):
+            model.set_storage_result(power, v, v_end)
+
+    def get_consumer_demand(self, date: pd.Timestamp = None) -> pd.DataFrame:
+        """
+        demand of each consumer, which is part of an aggregated load
+        :return: time series in [kW] for each unitID
+        """
+        date = self.date if date is None else date
+        demand = {}
+        for consumer_type, consumers in self._consumers.items():
+            if consumers:
+                names, demand_p = zip(*consumers)
+                demand.update(zip(names, get_load_profiles(demand_p, date, type=consumer_type)))
+        return pd.DataFrame(demand, index=self.t)
 
     def optimize(self, date: pd.Timestamp, weather: pd.DataFrame, prices: pd.DataFrame) -> np.array:
+        self.pv_fleet.set_generation(self.energy_systems, weather)
         super().optimize(date=date, weather=weather, prices=prices)
+        # -> the process pool returns copies of the systems
+        self._consumer_systems = {model.demand_type: model for model in self.energy_systems if model.fuel_type is None}
+        self._use_storages()
         self._reset_data()
         for model in self.energy_systems:
             number = 1 if model.fuel_type is None else self._number_of_systems[model.name]
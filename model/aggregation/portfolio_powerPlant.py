@@ -1,21 +1,277 @@
 # third party modules
+import time
+from multiprocessing import Pipe, Process
 import numpy as np
 import pandas as pd
 
 # model modules
+from aggregation.clustering import get_clusters, get_representative, get_state
+from systems.cache import LRUCache
 from systems.powerPlant import PowerPlant
 from aggregation.basic_portfolio import PortfolioModel
 
+
+def run_worker(connection, T: int, steps: tuple, solver_type: str, batch_steps: bool, cache_size: int,
+               energy_systems: list) -> None:
+    """
+    long living worker, which holds its power plants and optimizes them on request,
+    only prices, committed power and the reductions of the next day are received
+    and the states of the plants are sent back
+    """
+    cache = LRUCache(cache_size) if cache_size > 0 else None
+    models = [PowerPlant(T=T, steps=steps, solver_type=solver_type, batch_steps=batch_steps, cache=cache,
+                         **energy_system) for energy_system in energy_systems]
+    while True:
+        task, args, reductions = connection.recv()
+        if task == 'close':
+            break
+        if cache is not None:
+            cache.reset_statistics()
+        states = []
+        for i, model in enumerate(models):
+            try:
+                # -> the reductions used by the order book are removed in the agent process
+                model.reduction_next_day = reductions[i]
+                if task == 'optimize':
+                    date, prices = args
+                    model.optimize(date, pd.DataFrame(), prices.copy())
+                else:
+                    committed_power, power_prices = args
+                    model.optimize_post_market(committed_power[i], power_prices)
+                states.append(model.get_state())
+            except Exception as e:
+                states.append(repr(e))
+        statistics = (cache.hits, cache.misses, len(cache)) if cache is not None else (0, 0, 0)
+        connection.send((states, statistics))
+    connection.close()
+
+
 class PowerPlantPortfolio(PortfolioModel):
 
     def __init__(self, T: int = 24, date: pd.Timestamp = pd.Timestamp(2022, 1, 1),
-                 steps=(-10/1e3, -5/1e3, 0, 5/1e3, 100/1e3, 1e6), name: str = 'powerPlant Portfolio'):
+                 steps=(-10/1e3, -5/1e3, 0, 5/1e3, 100/1e3, 1e6), name: str = 'powerPlant Portfolio',
+                 solver_type: str = 'highs', batch_steps: bool = False, cache_size: int = 0, workers: int = 0,
+                 clusters: int = 0):
         super().__init__(T=T, date=date, steps=steps, name=name, run_multi_processing=False)
+        # -> milp solver (highs, glpk, cbc or gurobi) or dp (dynamic programming) for the unit commitment
+        self.solver_type = solver_type
+        # -> solve the milp of all price steps of a power plant in one call
+        self.batch_steps = batch_steps
+        # -> shared results of power plants with the same normalized parameters, disabled with cache_size 0
+        self.cache = LRUCache(cache_size) if cache_size > 0 else None
+        self.cache_statistics = dict(hits=0, misses=0, entries=0)
+        # -> number of worker processes, which hold the power plants, 0 optimizes in this process
+        self.workers = workers
+        self.worker_systems = [[] for _ in range(workers)]
+        self.worker_keys = [set() for _ in range(workers)]
+        self.connections = []
+        # -> number of representative plants, which are optimized instead of the plants, 0 disables the clustering
+        self.clusters = clusters
+        self.systems = []
+        self.representatives, self.cluster_members = [], []
+        self.optimization_time = 0
 
     def add_energy_system(self, energy_system):
-        model = PowerPlant(T=self.T, steps=self.steps, **energy_system)
+        model = PowerPlant(T=self.T, steps=self.steps, solver_type=self.solver_type,
+                           batch_steps=self.batch_steps, cache=self.cache, **energy_system)
         self.capacities[str(energy_system['fuel']).replace('_combined', '')] += energy_system['maxPower'] # [kW]
         self.energy_systems.append(model)
+        if self.clusters > 0:
+            self.systems.append(dict(energy_system))
+        elif self.workers > 0:
+            self._assign_worker(len(self.energy_systems) - 1, energy_system)
+
+    def _get_systems(self) -> list:
+        # -> parameters of the power plants with their current state
+        return [dict(system, **{key: model.generation_system[key] for key in ['P0', 'on', 'off']})
+                for system, model in zip(self.systems, self.energy_systems)]
+
+    def _build_clusters(self) -> None:
+        systems = self._get_systems()
+        self.cluster_members = get_clusters(systems, self.clusters)
+        self.representatives = []
+        for i, members in enumerate(self.cluster_members):
+            representative = PowerPlant(T=self.T, steps=self.steps, solver_type=self.solver_type,
+                                        batch_steps=self.batch_steps, cache=self.cache,
+                                        **get_representative([systems[index] for index in members],
+                                                             f'{self.name}_{i}'))
+            # -> the members share the prevented start of their representative
+            representative.reduction_next_day = dict(self.energy_systems[members[0]].reduction_next_day)
+            self.representatives.append(representative)
+        self.logger.info(f'clustered {len(self.systems)} power plants into {len(self.representatives)} '
+                         f'representative plants')
+
+    def _get_cluster_scales(self):
+        # -> representative, member and the share of the member on the capacity of the representative
+        for representative, members in zip(self.representatives, self.cluster_members):
+            for index in members:
+                model = self.energy_systems[index]
+                max_power = representative.generation_system['maxPower']
+                yield representative, model, model.generation_system['maxPower'] / max_power
+
+    def _is_clustered(self) -> bool:
+        # -> the members of a cluster share the state of their representative, else they are clustered again
+        if not self.representatives:
+            return False
+        systems = self._get_systems()
+        return all(len({get_state(systems[index]) for index in members}) == 1 for members in self.cluster_members)
+
+    def _set_member_results(self) -> None:
+        """
+        the schedules of the representatives are scaled back to their members by their share on maxPower,
+        the scaled schedules keep minPower, gradP and gradM of the members as far as their ratios to maxPower
+        match the representative, which is the capacity weighted mean of the cluster
+        """
+        for representative, model, scale in self._get_cluster_scales():
+            # -> each member pays its own start cost for a start of the representative
+            start_scale = model.start_cost / representative.start_cost if representative.start_cost > 0 else scale
+            model.opt_results = {}
+            for step, result in representative.opt_results.items():
+                model.opt_results[step] = {key: value * scale for key, value in result.items()}
+                model.opt_results[step]['start'] = result['start'] * start_scale
+                model.opt_results[step]['obj'] += (scale - start_scale) * np.sum(result['start'])
+            for key in ['generation', 'demand', 'cash_flow']:
+                setattr(model, key, {k: v * scale for k, v in getattr(representative, key).items()})
+            model.cash_flow['start_ups'] = representative.cash_flow['start_ups'] * start_scale
+            model.power = representative.power * scale
+            model.prevented_start = dict(representative.prevented_start)
+            model.reduction_next_day = dict(representative.reduction_next_day)
+            model.prices = representative.prices.copy()
+            model.generation_system.update(P0=representative.generation_system['P0'] * scale,
+                                           on=representative.generation_system['on'],
+                                           off=representative.generation_system['off'])
+
+    def _optimize_clusters(self, date: pd.Timestamp, weather: pd.DataFrame, prices: pd.DataFrame) -> np.array:
+        start_time = time.time()
+        if not self._is_clustered():
+            self._build_clusters()
+        self._reset_data()
+        self._set_parameter(date, weather, prices)
+        for representative in self.representatives:
+            representative.optimize(date, weather, prices.copy())
+        for model in self.energy_systems:
+            model.set_parameter(date, weather, prices.copy())
+        self._set_member_results()
+        self._add_results()
+        self.optimization_time = time.time() - start_time
+        return self.power
+
+    def get_clustering_error(self, date: pd.Timestamp, weather: pd.DataFrame, prices: pd.DataFrame) -> dict:
+        """
+        optimizes each plant without clustering and returns the relative errors of the clustered run
+        for the total power, the dispatch of the plants and the objective and the run times,
+        must be called after optimize with the same date and prices
+        """
+        start_time = time.time()
+        power, dispatch_error, obj = np.zeros(self.T), 0, 0
+        for model in self.energy_systems:
+            plant = PowerPlant(T=self.T, steps=self.steps, solver_type=self.solver_type, batch_steps=self.batch_steps,
+                               cache=self.cache, unitID=model.name, startCost=model.start_cost,
+                               **model.generation_system)
+            plant.optimize(date, weather, prices.copy())
+            power += plant.power
+            dispatch_error += np.abs(model.power - plant.power).sum()
+            obj += plant.opt_results[0]['obj']
+        unclustered_time = time.time() - start_time
+
+        clustered_obj = sum(model.opt_results[0]['obj'] for model in self.energy_systems)
+        total = max(power.sum(), 1e-9)
+        return dict(systems=len(self.energy_systems), representatives=len(self.representatives),
+                    power=np.abs(self.generation['total'] - power).sum() / total,
+                    dispatch=dispatch_error / total,
+                    obj=abs(clustered_obj - obj) / max(abs(obj), 1e-9),
+                    time=self.optimization_time, unclustered_time=unclustered_time,
+                    speedup=unclustered_time / max(self.optimization_time, 1e-9))
+
+    def _assign_worker(self, index: int, energy_system: dict) -> None:
+        # -> plants with the same parameters relative to maxPower go to the same worker and share its cache,
+        #    the workers are balanced by the number of different plants
+        key = self.energy_systems[index].get_cache_key_parameters() if self.cache is not None else index
+        worker = next((i for i, keys in enumerate(self.worker_keys) if key in keys), None)
+        if worker is None:
+            worker = min(range(self.workers), key=lambda i: len(self.worker_keys[i]))
+            self.worker_keys[worker].add(key)
+        self.worker_systems[worker].append((index, energy_system))
+
+    def _start_workers(self) -> None:
+        for systems in self.worker_systems:
+            connection, worker_connection = Pipe()
+            worker = Process(target=run_worker, daemon=True,
+                             args=(worker_connection, self.T, self.steps, self.solver_type, self.batch_steps,
+                                   self.cache.max_size if self.cache is not None else 0,
+                                   [energy_system for _, energy_system in systems]))
+            worker.start()
+            self.connections.append(connection)
+
+    def _run_workers(self, task: str, args_per_worker: list) -> None:
+        if not self.connections:
+            self._start_workers()
+        for connection, args, systems in zip(self.connections, args_per_worker, self.worker_systems):
+            connection.send((task, args, [self.energy_systems[index].reduction_next_day for index, _ in systems]))
+        for connection, systems in zip(self.connections, self.worker_systems):
+            states, statistics = connection.recv()
+            for (index, _), state in zip(systems, states):
+                model = self.energy_systems[index]
+                if isinstance(state, str):
+                    self.logger.error(f'error in {task} of system {model.name}: {state}')
+                else:
+                    model.set_state(state)
+            for key, value in zip(['hits', 'misses'], statistics[:2]):
+                self.cache_statistics[key] += value
+            self.cache_statistics['entries'] += statistics[2]
+
+    def close(self) -> None:
+        for connection in self.connections:
+            try:
+                connection.send(('close', None, None))
+                connection.close()
+            except (BrokenPipeError, OSError):
+                pass
+        self.connections = []
+
+    def __del__(self):
+        self.close()
+        super().__del__()
+
+    def get_cache_statistics(self) -> dict:
+        """
+        returns the hits, misses and entries of the optimization cache since the last call
+        """
+        if self.cache is None:
+            return {}
+        if self.workers > 0:
+            statistics = self.cache_statistics
+        else:
+            statistics = dict(hits=self.cache.hits, misses=self.cache.misses, entries=len(self.cache))
+            self.cache.reset_statistics()
+        self.cache_statistics = dict(hits=0, misses=0, entries=0)
+        return statistics
+
+    def optimize(self, date: pd.Timestamp, weather: pd.DataFrame, prices: pd.DataFrame) -> np.array:
+        if self.clusters > 0:
+            return self._optimize_clusters(date, weather, prices)
+        if self.workers == 0:
+            return super().optimize(date, weather, prices)
+        self._reset_data()
+        self._set_parameter(date, weather, prices)
+        # -> the plants of this process only keep the parameters for the order book
+        for model in self.energy_systems:
+            model.set_parameter(date, weather, prices.copy())
+        self.cache_statistics['entries'] = 0
+        self._run_workers('optimize', [(date, prices)] * self.workers)
+        self._add_results()
+        return self.power
+
+    def _add_results(self) -> None:
+        for model in self.energy_systems:
+            for key, value in model.generation.items():
+                self.generation[key] += value           # [kW]
+            for key, value in model.demand.items():
+                self.demand[key] += value               # [kW]
+            for key, value in model.cash_flow.items():
+                self.cash_flow[key] += value            # [ct]
+
+        self.power = self.generation['total'] - self.demand['power']
 
     def optimize_post_market(self, committed_power, power_prices):
         """
@@ -32,8 +288,19 @@ class PowerPlantPortfolio(PortfolioModel):
 
             return p
 
-        for model in self.energy_systems:
-            model.optimize_post_market(get_committed_power(model), power_prices)
+        if self.clusters > 0:
+            committed = [get_committed_power(model) for model in self.energy_systems]
+            for representative, members in zip(self.representatives, self.cluster_members):
+                representative.optimize_post_market(sum(committed[index] for index in members), power_prices)
+            self._set_member_results()
+        elif self.workers > 0:
+            self.cache_statistics['entries'] = 0
+            self._run_workers('optimize_post_market',
+                              [([get_committed_power(self.energy_systems[i]) for i, _ in systems], power_prices)
+                               for systems in self.worker_systems])
+        else:
+            for model in self.energy_systems:
+                model.optimize_post_market(get_committed_power(model), power_prices)
 
         self._reset_data()
 
@@ -47,45 +314,53 @@ class PowerPlantPortfolio(PortfolioModel):
         self.generation['allocation'] = alloc
         self.cash_flow['forecast'] = self.prices['power'].values[:self.T]
 
-        for model in self.energy_systems:
-            for key, value in model.generation.items():
-                self.generation[key] += value           # [kW]
-            for key, value in model.demand.items():
-                self.demand[key] += value               # [kW]
-            for key, value in model.cash_flow.items():
-                self.cash_flow[key] += value            # [ct]
-
-        self.power = self.generation['total'] - self.demand['power']
+        self._add_results()
 
         return self.power
 
     def get_ask_orders(self, price: float = -0.5) -> pd.DataFrame:
         if len(self.energy_systems) < 1:
             raise Exception('no systems to get orders from')
-        total_order_book = []
-        for system in self.energy_systems:
-            ask_orders = system.get_ask_orders()
-            link = ask_orders['link'].values
-            if all([l in ask_orders.index.get_level_values('block_id') for l in link if l != -1]):
-                total_order_book += [ask_orders.reset_index()]
+        if self.clusters > 0:
+            # -> the orders of the representatives are scaled to their members
+            representative_orders = {id(representative): representative.get_order_arrays()
+                                     for representative in self.representatives}
+            system_orders = []
+            for representative, model, scale in self._get_cluster_scales():
+                orders = representative_orders[id(representative)]
+                system_orders.append((model, dict(orders, volume=orders['volume'] * scale)))
+        else:
+            system_orders = [(system, system.get_order_arrays()) for system in self.energy_systems]
+
+        order_blocks, names = [], []
+        for system, orders in system_orders:
+            link = orders['link']
+            if np.isin(link[link != -1], orders['block_id']).all():
+                order_blocks += [orders]
+                names += [np.full(len(link), system.name, dtype=object)]
             else:
                 self.logger.error(f'invalid orderbook for system {system.name} and agent {self.name}')
                 print('Orderbook:')
-                print(ask_orders)
+                print(pd.DataFrame(orders))
                 print('System Parameter:')
                 print(system)
                 print('Prices:')
                 print(self.prices)
 
-        if len(total_order_book) > 0:
-            df = pd.concat(total_order_book, axis=0)
+        if len(order_blocks) > 0:
+            # -> one columnar block for all systems of the portfolio
+            orders = {key: np.concatenate([block[key] for block in order_blocks])
+                      for key in ['block_id', 'hour', 'price', 'volume', 'link']}
+            index = pd.MultiIndex.from_arrays([orders['block_id'], orders['hour'], np.concatenate(names)],
+                                              names=['block_id', 'hour', 'name'])
+            df = pd.DataFrame(dict(price=orders['price'], volume=orders['volume'], link=orders['link'],
+                                   type='generation'), index=index)
         else:
             df = pd.DataFrame(columns=['block_id', 'hour', 'name', 'volume', 'price', 'link'])
+            df.set_index(['block_id', 'hour', 'name'], inplace=True)
 
-        df.set_index(['block_id', 'hour', 'name'], inplace=True)
         return df
 
-
 if __name__ == '__main__':
     ppp = PowerPlantPortfolio()
     plant = {'unitID': 'x',
@@ -5,6 +5,7 @@ import numpy as np
 # model modules
 from systems.basic_system import EnergySystem
 from systems.prosumer import Prosumer
+from systems.pv_fleet import PVFleet
 from systems.generation_wind import WindModel
 from aggregation.basic_portfolio import PortfolioModel
 
@@ -14,6 +15,7 @@ class RenewablePortfolio(PortfolioModel):
     def __init__(self, T: int = 24, date: pd.Timestamp = pd.Timestamp(2022, 1, 1), name: str = 'ResPort'):
         super().__init__(T=T, date=date, name=name)
         self.priority_fuel = ['wind', 'bio', 'water', 'solar']
+        self.pv_fleet = PVFleet(T=T)
 
     def add_energy_system(self, energy_system: dict) -> None:
         energy_system['fuel_type'] = energy_system['type']
@@ -21,12 +23,17 @@ class RenewablePortfolio(PortfolioModel):
             model = WindModel(self.T, energy_system['turbines'])
         elif energy_system['type'] == 'solar':
             model = Prosumer(self.T, **energy_system)
+            self.pv_fleet.add_system(model.name, model.generation_system)
         else:
             model = EnergySystem(self.T, **energy_system)
 
         self.capacities[energy_system['type']] += energy_system['maxPower']
         self.energy_systems += [model]
 
+    def optimize(self, date: pd.Timestamp, weather: pd.DataFrame, prices: pd.DataFrame) -> np.array:
+        self.pv_fleet.set_generation(self.energy_systems, weather)
+        return super().optimize(date=date, weather=weather, prices=prices)
+
     def optimize_post_market(self, committed_power) -> np.array:
         """
         adjust power generation after day ahead clearing
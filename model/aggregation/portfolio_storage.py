@@ -5,6 +5,7 @@ import logging
 
 # model modules
 from systems.storage_hydroPlant import Storage
+from systems.storage_matrix import solve_price_variants, get_exclusive_order_book
 from aggregation.basic_portfolio import PortfolioModel
 
 log = logging.getLogger('storage_portfolio')
@@ -13,20 +14,20 @@ log.setLevel('INFO')
 
 class StrPort(PortfolioModel):
 
-    def __int__(self, T: int = 24, date: pd.Timestamp = pd.Timestamp(2022, 1, 1),
-                steps=(-10/1e3, -5/1e3, 0, 5/1e3, 100/1e3, 1e6)):
-        super().__init__(T=T, date=date, steps=steps)
+    def __init__(self, T: int = 24, date: pd.Timestamp = pd.Timestamp(2022, 1, 1),
+                 steps=(-10/1e3, -5/1e3, 0, 5/1e3, 100/1e3, 1e6), name: str = None,
+                 run_multi_processing: bool = True, batch: bool = False):
+        super().__init__(T=T, date=date, steps=steps, name=name, run_multi_processing=run_multi_processing)
+        # -> solve the lp of all price functions of all storages at once
+        self.batch = batch
 
     def add_energy_system(self, energy_system):
-        model = Storage(T=self.T, **energy_system)
+        model = Storage(T=self.T, batch_variants=self.batch, **energy_system)
         self.capacities['storage'] += energy_system['VMax']
         self.energy_systems.append(model)
 
     def get_exclusive_orders(self) -> pd.DataFrame:
-        total_order_book = [system.get_exclusive_orders().reset_index() for system in self.energy_systems]
-
-        df = pd.concat(total_order_book, axis=0)
-        df.set_index(['block_id', 'hour', 'name'], inplace=True)
+        df = get_exclusive_order_book(self.energy_systems)
 
         if not df.loc[df.isna().any(axis=1)].empty:
             log.error('Orderbook has NaN values')
@@ -34,6 +35,38 @@ class StrPort(PortfolioModel):
 
         return df
 
+    def optimize(self, date: pd.Timestamp, weather: pd.DataFrame, prices: pd.DataFrame) -> np.array:
+        if not self.batch:
+            return super().optimize(date, weather, prices)
+
+        self._reset_data()
+        self._set_parameter(date, weather, prices)
+
+        variants = []
+        for model in self.energy_systems:
+            model._reset_data()
+            model._set_parameter(date=date, weather=weather.copy(), prices=prices.copy())
+            base_power = model.prices['power'].values.copy()
+            variants.append(model.get_price_variants(base_power))
+            model.prices['power'] = base_power
+
+        if not solve_price_variants(self.energy_systems, variants):
+            # -> each storage solves its own lp, if the batched lp failed
+            for model in self.energy_systems:
+                model.optimize(date, weather.copy(), prices.copy())
+
+        for model in self.energy_systems:
+            for key, value in model.generation.items():
+                self.generation[key] += value           # [kW]
+            for key, value in model.demand.items():
+                self.demand[key] += value               # [kW]
+            for key, value in model.cash_flow.items():
+                self.cash_flow[key] += value            # [ct]
+
+        self.power = self.generation['total'] - self.demand['power']
+
+        return self.power
+
     def optimize_post_market(self, committed_power, power_prices):
         """
         optimize the portfolio after receiving market results
@@ -0,0 +1,78 @@
+'''
+Measures how the clearing of the DayAheadMarket scales with the size of the order book.
+For each scale (power plants, storages, hourly agents) a synthetic order book is generated and cleared,
+the build, solve and extraction time and the peak memory of the clearing are recorded.
+The peak memory is traced with tracemalloc in a second clearing, so it covers the python allocations only
+and does not distort the timings.
+
+usage (from the model directory):
+    python -m benchmarks.market_clearing --scales 10,5,10 100,20,100 --backends pyomo matrix --output clearing.csv
+'''
+import argparse
+import logging
+import os
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.order_book import get_order_book, save_order_book
+from systems.market import DayAheadMarket
+
+SCALES = [(10, 5, 10), (50, 10, 50), (200, 40, 200)]
+
+
+def clear(order_book: tuple, backend: str = 'pyomo', solver: str = 'highs') -> DayAheadMarket:
+    market = DayAheadMarket(solver_type=solver, backend=backend, warm_start=False)
+    market.set_parameter(*order_book)
+    market.optimize()
+    return market
+
+
+def measure(order_book: tuple, backend: str = 'pyomo', solver: str = 'highs') -> dict:
+    t1 = time.time()
+    market = clear(order_book, backend, solver)
+    total = time.time() - t1
+
+    tracemalloc.start()
+    clear(order_book, backend, solver)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return dict(solver=market.solver_type, total=total, **market.timings, peak_memory_mb=peak / 1e6)
+
+
+def run_benchmark(scales: list, backends: list, solver: str = 'highs', seed: int = 0,
+                  order_book_path: str = None) -> pd.DataFrame:
+    rows = []
+    for num_plants, num_storages, num_hourly in scales:
+        t1 = time.time()
+        order_book = get_order_book(num_plants, num_storages, num_hourly, seed=seed)
+        generation_time = time.time() - t1
+        if order_book_path:
+            save_order_book(order_book, os.path.join(order_book_path, f'{num_plants}_{num_storages}_{num_hourly}'))
+        for backend in backends:
+            rows.append(dict(date=pd.Timestamp.now(), plants=num_plants, storages=num_storages, hourly=num_hourly,
+                             orders=sum(len(orders) for orders in order_book), generation=generation_time,
+                             backend=backend, **measure(order_book, backend, solver)))
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='measure the market clearing on synthetic order books')
+    parser.add_argument('--scales', nargs='+', default=[','.join(map(str, scale)) for scale in SCALES],
+                        help='number of power plants, storages and hourly agents, e.g. 10,5,10')
+    parser.add_argument('--backends', nargs='+', default=['pyomo', 'matrix'])
+    parser.add_argument('--solver', default='highs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='csv file the results are appended to')
+    parser.add_argument('--order-books', help='directory to store the generated order books in')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    scales = [tuple(int(value) for value in scale.split(',')) for scale in args.scales]
+    results = run_benchmark(scales, args.backends, args.solver, args.seed, args.order_books)
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(results)
+    if args.output:
+        results.to_csv(args.output, mode='a', header=not os.path.exists(args.output), index=False)
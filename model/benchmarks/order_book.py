@@ -0,0 +1,94 @@
+'''
+Generates synthetic order books for the DayAheadMarket from the energy systems of the simulation:
+linked orders of power plants, exclusive orders of storages and hourly orders of demand and renewables.
+'''
+import os
+
+import numpy as np
+import pandas as pd
+
+from systems.powerPlant import PowerPlant
+from systems.storage_hydroPlant import Storage
+from systems.utils import get_test_prices, get_test_power_plant, get_test_storage
+
+FUELS = ['lignite', 'coal', 'gas', 'nuc']
+STEPS = (-10/1e3, -5/1e3, 0, 5/1e3, 100/1e3, 1e6)
+
+
+def get_prices(rng: np.random.Generator, num: int = 48) -> pd.DataFrame:
+    prices = get_test_prices(num=num)
+    hours = np.arange(num)
+    # -> daily profile with a peak at noon in €/kWh
+    prices['power'] = rng.uniform(0.06, 0.1) + 0.03 * np.sin(np.pi * (hours % 24 - 6) / 12)
+    return prices
+
+
+def get_power_plant_orders(num: int, rng: np.random.Generator, date: pd.Timestamp) -> pd.DataFrame:
+    orders = []
+    for i in range(num):
+        plant = get_test_power_plant(p_max=rng.uniform(100, 1000) * 1e3)
+        plant.update(unitID=f'pwp_{i}', fuel=rng.choice(FUELS), eta=rng.uniform(0.3, 0.6))
+        power_plant = PowerPlant(T=24, steps=STEPS, **plant)
+        power_plant.optimize(date=date, prices=get_prices(rng), weather=pd.DataFrame())
+        orders.append(power_plant.get_ask_orders())
+    return pd.concat(orders) if orders else pd.DataFrame(columns=['price', 'volume', 'link'])
+
+
+def get_storage_orders(num: int, rng: np.random.Generator, date: pd.Timestamp) -> pd.DataFrame:
+    orders = []
+    for i in range(num):
+        storage = get_test_storage(v_max=rng.uniform(100, 8000) * 1e3)
+        storage.update(unitID=f'str_{i}')
+        storage = Storage(T=24, **storage)
+        storage.optimize(date=date, prices=get_prices(rng, num=24), weather=pd.DataFrame())
+        orders.append(storage.get_exclusive_orders())
+    return pd.concat(orders) if orders else pd.DataFrame(columns=['price', 'volume'])
+
+
+def get_hourly_orders(num: int, demand: np.array, rng: np.random.Generator) -> (pd.DataFrame, pd.DataFrame):
+    """
+    splits the demand onto num demand agents and adds num renewable agents with a solar profile
+    """
+    hours = np.arange(24)
+    solar = np.clip(np.sin(np.pi * (hours - 6) / 12), 0, None)
+    asks, bids = [], []
+    # -> shares of the agents on the demand, which sum to 1
+    shares = rng.dirichlet(np.ones(num)) if num > 1 else np.ones(num)
+    for i in range(num):
+        bids.append(pd.DataFrame(dict(block_id=hours, hour=hours, name=f'dem_{i}', price=3.0,
+                                      volume=-shares[i] * demand, type='demand')))
+        capacity = rng.uniform(0.1, 0.3) * demand.mean() / max(num, 1)
+        asks.append(pd.DataFrame(dict(block_id=hours, hour=hours, name=f'res_{i}', price=-0.5 / 1e3,
+                                      volume=capacity * solar, type='generation')))
+    index = ['block_id', 'hour', 'name']
+    return pd.concat(asks).set_index(index), pd.concat(bids).set_index(index)
+
+
+def get_order_book(num_plants: int = 10, num_storages: int = 5, num_hourly: int = 10, seed: int = 0,
+                   date: pd.Timestamp = pd.Timestamp(2018, 1, 1)) -> tuple:
+    """
+    returns (hourly_ask, hourly_bid, linked_orders, exclusive_orders) as DataFrames for DayAheadMarket.set_parameter,
+    the demand is scaled to 70 percent of the offered generation in each hour
+    """
+    rng = np.random.default_rng(seed)
+    linked_orders = get_power_plant_orders(num_plants, rng, date)
+    exclusive_orders = get_storage_orders(num_storages, rng, date)
+
+    generation = np.zeros(24)
+    if not linked_orders.empty:
+        volume = linked_orders.groupby('hour')['volume'].sum()
+        generation[volume.index.values] += volume.values
+    demand = np.maximum(0.7 * generation, 1e3)
+    hourly_ask, hourly_bid = get_hourly_orders(num_hourly, demand, rng)
+    return hourly_ask, hourly_bid, linked_orders, exclusive_orders
+
+
+def save_order_book(order_book: tuple, path: str) -> None:
+    """
+    writes the order book in the csv format of benchmarks.market_solvers.load_order_book
+    """
+    hourly_ask, hourly_bid, linked_orders, exclusive_orders = order_book
+    os.makedirs(path, exist_ok=True)
+    pd.concat([hourly_ask, hourly_bid]).to_csv(os.path.join(path, 'hourly_orders.csv'))
+    linked_orders.to_csv(os.path.join(path, 'linked_orders.csv'))
+    exclusive_orders.to_csv(os.path.join(path, 'exclusive_orders.csv'))
@@ -0,0 +1,82 @@
+'''
+Measures the time per solve of the small pyomo models of the simulation with each solver:
+the unit commitment of a PowerPlant, the LP of a Storage and the clearing of a small DayAheadMarket.
+For these models the time is dominated by the overhead of the solver interface, which is the writing of
+the model file, the start of the solver process and the reading of the solution for glpk and cbc
+and the update of the model in the solver process for highs.
+
+usage (from the model directory):
+    python -m benchmarks.solver_overhead --solvers glpk highs --repetitions 50
+'''
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.order_book import STEPS, get_order_book, get_prices
+from systems.market import DayAheadMarket
+from systems.powerPlant import PowerPlant
+from systems.solver import is_available
+from systems.storage_hydroPlant import Storage
+from systems.utils import get_test_power_plant, get_test_storage
+
+
+def measure_power_plant(solver: str, repetitions: int, rng: np.random.Generator) -> dict:
+    power_plant = PowerPlant(T=24, steps=STEPS, solver_type=solver, **get_test_power_plant(500e3))
+    power_plant.optimize(date=pd.Timestamp(2018, 1, 1), prices=get_prices(rng), weather=pd.DataFrame())
+    t1 = time.time()
+    for _ in range(repetitions):
+        power_plant.prices.loc[:, 'power'] = power_plant.base_price['power'].values[:24] + rng.normal(0, 0.01, 24)
+        power_plant._solve()
+    return dict(model='power_plant', solver=power_plant.solver_type, per_solve=(time.time() - t1) / repetitions)
+
+
+def measure_storage(solver: str, repetitions: int, rng: np.random.Generator) -> dict:
+    storage = Storage(T=24, solver_type=solver, **get_test_storage(2000e3))
+    t1 = time.time()
+    for _ in range(repetitions):
+        storage.optimize(date=pd.Timestamp(2018, 1, 1), prices=get_prices(rng, num=24), weather=pd.DataFrame())
+    # -> one solve for each price function of the storage
+    solves = repetitions * len(storage.opt_results)
+    return dict(model='storage', solver=storage.solver_type, per_solve=(time.time() - t1) / solves)
+
+
+def measure_market(solver: str, repetitions: int, order_book: tuple) -> dict:
+    solve_time = 0
+    for _ in range(repetitions):
+        market = DayAheadMarket(solver_type=solver, warm_start=False)
+        market.set_parameter(*order_book)
+        market.optimize()
+        solve_time += market.timings['solve']
+    return dict(model='market', solver=market.solver_type, per_solve=solve_time / repetitions)
+
+
+def run_benchmark(solvers: list, repetitions: int = 20, seed: int = 0) -> pd.DataFrame:
+    order_book = get_order_book(num_plants=3, num_storages=2, num_hourly=3, seed=seed)
+    rows = []
+    for solver in solvers:
+        rng = np.random.default_rng(seed)
+        rows += [measure_power_plant(solver, repetitions, rng), measure_storage(solver, repetitions, rng),
+                 measure_market(solver, max(repetitions // 10, 1), order_book)]
+    results = pd.DataFrame(rows)
+    results['per_solve_ms'] = results.pop('per_solve') * 1e3
+    return results.pivot(index='model', columns='solver', values='per_solve_ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='measure the time per solve of the small models with each solver')
+    parser.add_argument('--solvers', nargs='+', default=['glpk', 'highs'])
+    parser.add_argument('--repetitions', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # -> only compare solvers which are installed, the models would fall back to another one
+    solvers = [solver for solver in args.solvers if is_available(solver)]
+    if not solvers:
+        print(f'none of the solvers {args.solvers} is available')
+    else:
+        print(f'time per solve in ms ({args.repetitions} repetitions)')
+        print(run_benchmark(solvers, args.repetitions, args.seed))
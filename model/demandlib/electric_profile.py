@@ -1,5 +1,6 @@
 import numpy as np
 from datetime import date, timedelta
+from functools import lru_cache
 from dateutil.easter import easter
 
 
@@ -37,6 +38,48 @@ winter = np.asarray(np.load(open(r'./demandlib/data/winter.pkl', 'rb')))
 summer = np.asarray(np.load(open(r'./demandlib/data/summer.pkl', 'rb')))
 
 
+# -> profile columns of saturdays, sundays and holidays, working days in summer, winter and the transition period
+SEASON_COLUMNS = {'summer': (3, 4, 5), 'winter': (0, 1, 2), 'transition': (6, 7, 8)}
+
+
+def get_household_factor(doy):
+    return -0.000000000392 * doy ** 4 + 0.00000032 * doy ** 3 - 0.0000702 * doy ** 2 + 0.0021 * doy + 1.24
+
+
+@lru_cache(maxsize=None)
+def get_profile_table(type, year):
+    '''
+    returns the normalized quarter hourly (days x 96) and hourly (days x 24) profiles of a year
+    and the day factor of the household dynamisation
+    '''
+    doy = np.arange(1, date(year, 12, 31).timetuple().tm_yday + 1)
+    dow = (date(year, 1, 1).weekday() + doy - 1) % 7
+
+    columns = np.full(len(doy), SEASON_COLUMNS['transition'][2])
+    for season, days in [('transition', None), ('winter', winter), ('summer', summer)]:
+        in_season = np.ones(len(doy), bool) if days is None else np.isin(doy, days)
+        saturday, sunday, working_day = SEASON_COLUMNS[season]
+        columns[in_season & (dow == 5)] = saturday
+        columns[in_season & (dow < 5)] = working_day
+        columns[in_season & ((dow == 6) | np.isin(doy, get_holidays(year)))] = sunday
+
+    quarter_hourly = profiles[type][:, columns].T
+    # -> the hour is the mean of its first three quarter hours
+    hourly = quarter_hourly.reshape((len(doy), 24, 4))[:, :, :3].mean(axis=2)
+    factor = get_household_factor(doy) if type == 'household' else np.ones(len(doy))
+    return quarter_hourly, hourly, factor
+
+
+def get_load_profiles(demandP, d, type='household', hourly=True):
+    '''
+    returns the load profiles (len(demandP) x 24 or 96) for a given day in [kW]
+    '''
+    quarter_hourly, hourly_profiles, factor = get_profile_table(type, d.year)
+    profile = hourly_profiles[d.dayofyear - 1] if hourly else quarter_hourly[d.dayofyear - 1]
+    f = np.asarray(demandP, float).reshape((-1, 1)) / 1e6 * factor[d.dayofyear - 1]  # [kW] -> [GWh/a]
+    return profile * f
+
+
 class StandardLoadProfile:
 
     def __init__(self, demandP, type='household', hourly=True):
@@ -54,43 +97,7 @@ class StandardLoadProfile:
         '''
         returns the load profile for a given day in [kW]
         '''
-
-        doy = d.dayofyear
-        dow = d.dayofweek
-        year = d.year
-
-        f = self.demandP / 1e6  # [kW] -> [GWh/a]
-        if self.type == 'household':
-            f *= -0.000000000392 * doy ** 4 + 0.00000032 * doy ** 3 - 0.0000702 * doy ** 2 + 0.0021 * doy + 1.24
-
-        demand = np.zeros(96)
-
-        if doy in self.summer:
-            if dow == 6 or doy in get_holidays(year):
-                demand = self.profile[:, 4] * f
-            elif dow < 5:
-                demand = self.profile[:, 5] * f
-            elif dow == 5:
-                demand = self.profile[:, 3] * f
-        elif doy in self.winter:
-            if dow == 6 or doy in get_holidays(year):
-                demand = self.profile[:, 1] * f
-            elif dow < 5:
-                demand = self.profile[:, 2] * f
-            elif dow == 5:
-                demand = self.profile[:, 0] * f
-        else:
-            if dow == 6 or doy in get_holidays(year):
-                demand = self.profile[:, 7] * f
-            elif dow < 5:
-                demand = self.profile[:, 8] * f
-            elif dow == 5:
-                demand = self.profile[:, 6] * f
-
-        if self.hourly:
-            return np.asarray([np.mean(demand[i:i + 3]) for i in range(0, 96, 4)], float).reshape((-1,))
-        else:
-            return demand
+        return get_load_profiles(self.demandP, d, type=self.type, hourly=self.hourly)[0]
 
 if __name__ == '__main__':
     s = StandardLoadProfile(1000)
@@ -37,6 +37,26 @@ init_dict = {
     'weather_database_uri': weather_database_uri,
     'entsoe_database_uri': entsoe_database_uri,
     'real_prices': real_prices,
+    # market solver: gurobi, highs, glpk or cbc
+    'market_solver': os.getenv('MARKET_SOLVER', 'gurobi'),
+    # market prices: max_price or dual
+    'market_pricing': os.getenv('MARKET_PRICING', 'max_price'),
+    # use the accepted blocks of the last clearing as mip start
+    'market_warm_start': os.getenv('MARKET_WARM_START', 'False').lower() == 'true',
+    # clear hourly asks with equal hour, price and side as one order
+    'market_presolve': os.getenv('MARKET_PRESOLVE', 'False').lower() == 'true',
+    # power plant unit commitment: milp solver (highs, glpk, cbc or gurobi) or dp (dynamic programming)
+    'pwp_solver': os.getenv('PWP_SOLVER', 'highs'),
+    # solve all price steps of a power plant in one milp
+    'pwp_batch_steps': os.getenv('PWP_BATCH_STEPS', 'False').lower() == 'true',
+    # number of cached power plant optimizations, 0 disables the cache
+    'pwp_cache_size': int(os.getenv('PWP_CACHE_SIZE', 0)),
+    # number of worker processes of a power plant agent, 0 optimizes in the agent process
+    'pwp_workers': int(os.getenv('PWP_WORKERS', 0)),
+    # number of representative plants of a power plant agent, 0 optimizes each plant
+    'pwp_clusters': int(os.getenv('PWP_CLUSTERS', 0)),
+    # solve the price functions of all storages of a storage agent in one lp
+    'str_batch': os.getenv('STR_BATCH', 'False').lower() == 'true',
 }
 
 type_mapping = {
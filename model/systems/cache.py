@@ -0,0 +1,51 @@
+# third party modules
+from collections import OrderedDict
+import hashlib
+
+import numpy as np
+
+
+def get_array_hash(*arrays: np.array) -> str:
+    """
+    content hash of the arrays, used as part of a cache key
+    """
+    digest = hashlib.sha1()
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class LRUCache:
+
+    def __init__(self, max_size: int = 4096):
+        """
+        least recently used cache, which counts its hits and misses
+        """
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.hits, self.misses = 0, 0
+
+    def get(self, key):
+        if key in self.data:
+            self.data.move_to_end(key)
+            self.hits += 1
+            return self.data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value) -> None:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests > 0 else 0
+
+    def reset_statistics(self) -> None:
+        self.hits, self.misses = 0, 0
+
+    def __len__(self):
+        return len(self.data)
@@ -1,17 +1,29 @@
 import numpy as np
 import pandas as pd
-from pyomo.environ import Var, Objective, SolverFactory, ConcreteModel, NonNegativeReals, Reals, Binary, \
-    minimize, quicksum, ConstraintList
-from pyomo.environ import value as get_real_number
+from pyomo.environ import Var, Objective, ConcreteModel, NonNegativeReals, Reals, Binary, \
+    minimize, quicksum, ConstraintList, Suffix
 import time
 import logging
 from collections import defaultdict
 
+from systems.market_matrix import MatrixMarketModel, get_order_arrays, get_group_ids
+from systems.solver import get_solver, solve
 
-class DayAheadMarket:
 
-    def __init__(self, solver_type: str = 'gurobi', T: int = 24):
+class DayAheadMarket:
 
+    def __init__(self, solver_type: str = 'gurobi', T: int = 24, backend: str = 'pyomo', warm_start: bool = False,
+                 presolve: bool = False, pricing: str = 'max_price'):
+        """
+        Clears the day ahead market with hourly, linked and exclusive orders.
+        The clearing model is either built with pyomo (backend='pyomo')
+        or assembled as sparse matrices and passed in bulk to the solver (backend='matrix').
+        The solver (gurobi, highs, glpk or cbc) is set by solver_type.
+        With warm_start the accepted mother and exclusive blocks of the last clearing are used as MIP start.
+        With presolve hourly asks with equal hour, price and side are cleared as one order.
+        The price of each hour is the price of the most expensive used order (pricing='max_price')
+        or the dual of the balance constraint after fixing the block decisions (pricing='dual').
+        """
         self.logger = logging.getLogger('market')
         self._order_types = ['single_ask',
                              'single_bid', 'linked_ask', 'exclusive_ask']
@@ -23,38 +35,66 @@ class DayAheadMarket:
             self.orders[f'{order_type}_index'] = {t: [] for t in self.t}
 
         self.parent_blocks = {}
-        self.start_block = []
+        self.start_block = set()
 
-        self.model = ConcreteModel()
-        if solver_type == 'gurobi':
-            self.opt = SolverFactory(solver_type, solver_io='python')
-        else:
-            self.opt = SolverFactory(solver_type)
+        self.backend = backend
+        self.values = {}
+        # -> seconds spent in the steps of the last clearing
+        self.timings = dict(build=0, solve=0, extraction=0)
 
-    def set_parameter(self, hourly_ask: dict, hourly_bid: dict, linked_orders: dict, exclusive_orders: dict):
+        self.warm_start = warm_start
+        self.presolve = presolve
+        self.pricing = pricing
+        # -> hourly prices from the duals of the balance constraints
+        self.dual_prices = None
+        # -> last solution of the block decisions keyed by (block, agent)
+        self.last_solution = dict(mother_order={}, exclusive_ask={})
 
-        self.orders['single_ask'].update(hourly_ask)
-        self.orders['single_bid'].update(hourly_bid)
-        self.orders['linked_ask'].update(linked_orders)
-        self.orders['exclusive_ask'].update(exclusive_orders)
+        self.model = ConcreteModel()
+        # -> falls back to highs, glpk or cbc if the solver is not available
+        self.solver_type, self.opt = get_solver(solver_type)
 
-        for order_type in self._order_types:
-            for t in self.t:
-                for key_tuple in self.orders[order_type].keys():
-                    block, hour, name = key_tuple
-                    if hour == t:
-                        self.orders[f'{order_type}_index'][t] += [
-                            (block, name)]
-
-        for key_tuple, val in self.orders['linked_ask'].items():
-            block, _, agent = key_tuple
-            _, _, parent_id = val
-            child_key = (block, agent)
-            self.parent_blocks[child_key] = parent_id
-            if parent_id == -1:
-                self.start_block.append((block, agent))
-
-        self.start_block = set(self.start_block)
+    def set_parameter(self, hourly_ask: dict, hourly_bid: dict, linked_orders: dict, exclusive_orders: dict):
+        """
+        adds the orders for the next clearing, each order type is either a dict
+        {(block, hour, name): (price, volume[, link])} or a DataFrame indexed by (block_id, hour, name)
+        """
+        for order_type, orders in zip(self._order_types, [hourly_ask, hourly_bid, linked_orders, exclusive_orders]):
+            if isinstance(orders, pd.DataFrame):
+                self._add_order_frame(order_type, orders)
+            else:
+                self._add_order_dict(order_type, orders)
+
+    def _add_order_dict(self, order_type: str, orders: dict) -> None:
+        self.orders[order_type].update(orders)
+        # -> build the hourly index in one pass over the new orders
+        index = self.orders[f'{order_type}_index']
+        for block, hour, name in orders.keys():
+            if hour in index:
+                index[hour].append((block, name))
+
+        if order_type == 'linked_ask':
+            for (block, _, agent), (_, _, parent_id) in orders.items():
+                self.parent_blocks[(block, agent)] = parent_id
+                if parent_id == -1:
+                    self.start_block.add((block, agent))
+
+    def _add_order_frame(self, order_type: str, orders: pd.DataFrame) -> None:
+        # -> the clearing models read the orders from the order dict, the index and blocks are grouped
+        if orders.empty:
+            return
+        columns = ['price', 'volume', 'link'] if order_type == 'linked_ask' else ['price', 'volume']
+        self.orders[order_type].update(zip(orders.index.to_list(), orders[columns].itertuples(index=False, name=None)))
+        keys = orders.index.to_frame(index=False, name=['block', 'hour', 'name'])
+        index = self.orders[f'{order_type}_index']
+        for hour, blocks in keys.loc[keys['hour'].isin(self.t)].groupby('hour'):
+            index[hour] += list(zip(blocks['block'].to_list(), blocks['name'].to_list()))
+
+        if order_type == 'linked_ask':
+            keys['link'] = orders['link'].values
+            parents = keys.groupby(['block', 'name'], sort=False)['link'].last()
+            self.parent_blocks.update(zip(parents.index.to_list(), parents.to_list()))
+            self.start_block.update(parents.index[parents == -1].to_list())
 
     def _reset_parameter(self):
         self.orders = {}
@@ -64,27 +104,82 @@ class DayAheadMarket:
             self.orders[f'{order_type}_index'] = {t: [] for t in self.t}
 
         self.parent_blocks = {}
-        self.start_block = []
+        self.start_block = set()
+        self.dual_prices = None
 
-    def optimize(self):
+    def _optimize_matrix(self) -> dict:
+        self.logger.info('start building model')
+        t1 = time.time()
+        model = MatrixMarketModel(self.orders, self.parent_blocks, self.start_block, self.t)
+        model.build()
+        self.timings['build'] = time.time() - t1
+        self.logger.info(f'built model in {self.timings["build"]:.2f} seconds')
+        self.logger.info('start optimization/market clearing')
+        t1 = time.time()
+        start = self._get_warm_start(model.start_block, model.exclusive_blocks)
+        try:
+            x = model.solve(self.solver_type, mip_gap=0.1, time_limit=60, start=start)
+        except Exception as e:
+            self.logger.exception('error solving optimization problem')
+            self.logger.error(f'{repr(e)}')
+            x = np.zeros(model.num_columns)
+        self.timings['solve'] = time.time() - t1
+        self.logger.info(f'cleared market in {self.timings["solve"]:.2f} seconds')
+        if self.pricing == 'dual':
+            try:
+                self.dual_prices = model.get_dual_prices(x, self.solver_type)
+            except Exception as e:
+                self.logger.exception('error solving pricing problem - using max prices')
+                self.logger.error(f'{repr(e)}')
+
+        self._set_last_solution(start, model.get_block_values(x))
+        return model.get_values(x)
+
+    def _get_warm_start(self, mother_blocks: list, exclusive_blocks: list) -> dict:
+        """
+        returns the block decisions of the last clearing, which are known for the current blocks
+        """
+        if not self.warm_start:
+            return dict(mother_order={}, exclusive_ask={})
+        start = {}
+        for type_, blocks in [('mother_order', mother_blocks), ('exclusive_ask', exclusive_blocks)]:
+            last = self.last_solution[type_]
+            start[type_] = {block: last[block] for block in blocks if block in last}
+        return start
+
+    def _set_last_solution(self, start: dict, solution: dict) -> None:
+        """
+        stores the block decisions and logs how far the warm start was from the final solution
+        """
+        if self.warm_start:
+            total, known, changed = 0, 0, 0
+            for type_, values in solution.items():
+                total += len(values)
+                for block, value in start[type_].items():
+                    known += 1
+                    changed += int(round(value or 0) != round(values[block] or 0))
+            self.logger.info(f'warm start with {known} of {total} block decisions, '
+                             f'{changed} of them changed in the final solution')
+        self.last_solution = solution
+
+    def _optimize_pyomo(self) -> dict:
 
         self.model.clear()
         self.logger.info('start building model')
         t1 = time.time()
         # Step 1 initialize binary variables for hourly ask block per agent and id
-        self.model.use_hourly_ask = Var(set((block, hour, agent) for block, hour, agent
-                                            in self.orders['single_ask'].keys()), within=Reals, bounds=(0, 1))
+        self.model.use_hourly_ask = Var(list(self.orders['single_ask'].keys()), within=Reals, bounds=(0, 1))
         self.model_vars['single_ask'] = self.model.use_hourly_ask
         # Step 3 initialize binary variables for ask order in block per agent
-        self.model.use_linked_order = Var(set([(block, hour, agent) for block, hour, agent
-                                               in self.orders['linked_ask'].keys()]), within=Reals, bounds=(0, 1))
+        self.model.use_linked_order = Var(list(self.orders['linked_ask'].keys()), within=Reals, bounds=(0, 1))
         self.model_vars['linked_ask'] = self.model.use_linked_order
 
         self.model.use_mother_order = Var(self.start_block, within=Binary)
 
         # Step 4 initialize binary variables for exclusive block and agent
-        self.model.use_exclusive_block = Var(set([(block, agent) for block, _, agent
-                                                  in self.orders['exclusive_ask'].keys()]), within=Binary)
+        exclusive_group, exclusive_blocks = get_group_ids([(block, agent) for block, _, agent
+                                                           in self.orders['exclusive_ask'].keys()])
+        self.model.use_exclusive_block = Var(exclusive_blocks, within=Binary)
         self.model_vars['exclusive_ask'] = self.model.use_exclusive_block
 
         self.model.sink = Var(self.t, within=NonNegativeReals)
@@ -168,6 +263,7 @@ class DayAheadMarket:
 
         # generation must be smaller than demand
         self.model.gen_dem = ConstraintList()
+        balance_hours = []
         for t in self.t:
             if not self.orders['single_bid_index'][t]:
                 self.logger.error(f'no hourly_bids available at hour {t}')
@@ -177,6 +273,7 @@ class DayAheadMarket:
             else:
                 self.model.gen_dem.add(
                     magic_source[t] == self.model.source[t] - self.model.sink[t])
+                balance_hours.append(t)
 
         # Step 9 set constraint: Cost for each hour
         generation_cost = quicksum(quicksum(get_cost(type_=order_type, hour=t) for order_type in self._order_types
@@ -184,138 +281,213 @@ class DayAheadMarket:
                                    + (self.model.source[t] + self.model.sink[t]) * 1e12 for t in self.t)
 
         self.model.obj = Objective(expr=generation_cost, sense=minimize)
-        self.logger.info(f'built model in {time.time() - t1:.2f} seconds')
+        self.timings['build'] = time.time() - t1
+        self.logger.info(f'built model in {self.timings["build"]:.2f} seconds')
         self.logger.info('start optimization/market clearing')
         t1 = time.time()
+        start = self._get_warm_start(list(self.model.use_mother_order.keys()),
+                                     list(self.model.use_exclusive_block.keys()))
+        for block, value in start['mother_order'].items():
+            self.model.use_mother_order[block].value = value
+        for block, value in start['exclusive_ask'].items():
+            self.model.use_exclusive_block[block].value = value
+        use_start = self.warm_start and self.opt.warm_start_capable()
         try:
-            r = self.opt.solve(self.model, options={
-                'MIPGap': 0.1, 'TimeLimit': 60})
+            r = solve(self.opt, self.model, self.solver_type, mip_gap=0.1, time_limit=60,
+                      **(dict(warmstart=True) if use_start else {}))
             print(r)
         except Exception as e:
             self.logger.exception('error solving optimization problem')
             self.logger.error(f'Model: {self.model}')
             self.logger.error(f'{repr(e)}')
-        self.logger.info(f'cleared market in {time.time() - t1:.2f} seconds')
+        self.timings['solve'] = time.time() - t1
+        self.logger.info(f'cleared market in {self.timings["solve"]:.2f} seconds')
+
+        self._set_last_solution(start, dict(mother_order=self.model.use_mother_order.extract_values(),
+                                            exclusive_ask=self.model.use_exclusive_block.extract_values()))
+        if self.pricing == 'dual':
+            try:
+                self.dual_prices = self._get_dual_prices(balance_hours)
+            except Exception as e:
+                self.logger.exception('error solving pricing problem - using max prices')
+                self.logger.error(f'{repr(e)}')
+        # -> the variables are indexed in the order of the order dicts
+        values = {type_: np.asarray(list(var.extract_values().values()), dtype=float)
+                  for type_, var in self.model_vars.items()}
+        values['exclusive_ask'] = values['exclusive_ask'][exclusive_group]
+        return values
+
+    def _get_dual_prices(self, balance_hours: list) -> np.array:
+        """
+        fixes the block decisions of the pyomo model, solves the remaining LP
+        and returns the price of each hour from the duals of the balance constraints
+        """
+        for var in [self.model.use_mother_order, self.model.use_exclusive_block]:
+            for data in var.values():
+                # -> relaxed, otherwise the solver treats the model as MIP without duals
+                data.domain = NonNegativeReals
+                data.fix(round(data.value or 0))
+        self.model.dual = Suffix(direction=Suffix.IMPORT)
+        solve(self.opt, self.model, self.solver_type, time_limit=60)
+        prices = np.full(len(self.t), np.nan)
+        for constraint, t in zip(self.model.gen_dem.values(), balance_hours):
+            # -> an additional demand lowers the constant of the balance constraint
+            prices[t] = -self.model.dual[constraint]
+        return prices
+
+    def _presolve(self) -> (dict, np.array):
+        """
+        replaces the hourly asks by one order per hour, price and side,
+        returns the original orders and the merged order of each original order
+        """
+        orders = self.orders['single_ask']
+        hour_price_side = [(hour, price, volume > 0) for (_, hour, _), (price, volume) in orders.items()]
+        group, merged = get_group_ids(hour_price_side)
+        volume = np.bincount(group, weights=[volume for _, volume in orders.values()], minlength=len(merged))
+
+        self.orders['single_ask'] = {(block, hour, 'presolve'): (price, vol)
+                                     for block, ((hour, price, _), vol) in enumerate(zip(merged, volume))}
+        self.orders['single_ask_index'] = {t: [] for t in self.t}
+        for block, hour, name in self.orders['single_ask'].keys():
+            if hour in self.orders['single_ask_index']:
+                self.orders['single_ask_index'][hour].append((block, name))
+        self.logger.info(f'presolve merged {len(orders)} hourly asks into {len(merged)}')
+        return orders, group
+
+    def _postsolve(self, orders: dict, group: np.array) -> None:
+        """
+        restores the original hourly asks, each gets the accepted share of its merged order
+        """
+        self.orders['single_ask'] = {}
+        self.orders['single_ask_index'] = {t: [] for t in self.t}
+        self.set_parameter(orders, {}, {}, {})
+        self.values['single_ask'] = np.asarray(self.values['single_ask'])[group]
 
-        # -> determine price at each hour
-        prices = []
-        for t in self.t:
-            max_price = - 1000
-            for type_ in self.model_vars.keys():
-                for block, name in self.orders[f'{type_}_index'][t]:
-                    if type_ == 'exclusive_ask':
-                        order_used = self.model_vars[type_][block, name].value
-                        # -> disable price by storage if the storage is on the demand side
-                        if order_used and self.orders[type_][block, t, name][1] > 0:
-                            order_used = True
-                        else:
-                            order_used = False
-                    else:
-                        order_used = self.model_vars[type_][block, t, name].value
-                    if order_used:
-                        price = self.orders[type_][block, t, name][0]
-                    else:
-                        price = - 1000
-                    if price > max_price:
-                        max_price = price
-            prices += [max_price]
-        prices = pd.DataFrame(data=dict(price=prices))
-        # -> determine volume at each hour
-        volumes = []
-        sum_magic_source = 0
-        for t in self.t:
-            sum_magic_source += get_real_number(magic_source[t])
-            volume = 0
-            for block, name in self.orders['single_bid_index'][t]:
-                volume += (-1) * self.orders['single_bid'][block, t, name][1]
-            for block, name in self.orders['exclusive_ask_index'][t]:
-                if self.model.use_exclusive_block[block, name].value \
-                        and self.orders['exclusive_ask'][block, t, name][1] < 0:
-                    volume += (-1) * self.orders['exclusive_ask'][block, t, name][1]
-            volumes.append(volume)
-        self.logger.info(f'Got {sum_magic_source:.2f} kWh from Magic source')
-        # -> determine used ask orders
-        used_orders = {type_: {} for type_ in self.model_vars.keys()}
-        for type_ in self.model_vars.keys():
-            for t in self.t:
-                for block, name in self.orders[f'{type_}_index'][t]:
-                    if type_ in ['single_ask', 'linked_ask']:
-                        if self.model_vars[type_][block, t, name].value:
-                            f = self.model_vars[type_][block, t, name].value
-                            if 'linked' in type_:
-                                prc, vol, link = self.orders[type_][block, t, name]
-                                vol *= f
-                                p = (prc, vol, link)
-                            else:
-                                prc, vol = self.orders[type_][block, t, name]
-                                vol *= f
-                                p = (prc, vol)
-                            used_orders[type_][(block, t, name)] = p
-                    elif type_ == 'exclusive_ask':
-                        if self.model_vars[type_][block, name].value:
-                            prc, vol = self.orders[type_][block, t, name]
-                            used_orders[type_][(block, t, name)] = (prc, vol)
-
-        # -> build dataframe
-        for type_ in self.model_vars.keys():
-            orders = pd.DataFrame.from_dict(used_orders[type_], orient='index')
-            orders.index = pd.MultiIndex.from_tuples(
-                orders.index, names=['block_id', 'hour', 'name'])
-
-            if 'linked' in type_ and orders.empty:
-                orders['price'] = []
-                orders['volume'] = []
-                orders['link'] = []
-            elif orders.empty:
-                orders['price'] = []
-                orders['volume'] = []
-            elif 'linked' in type_:
-                orders.columns = ['price', 'volume', 'link']
-            else:
-                orders.columns = ['price', 'volume']
+    def optimize(self):
 
-            used_orders[type_] = orders.copy()
-        # -> return all bid orders
-        used_bid_orders = pd.DataFrame.from_dict(
-            self.orders['single_bid'], orient='index')
-        used_bid_orders.index = pd.MultiIndex.from_tuples(used_bid_orders.index,
-                                                          names=['block_id', 'hour', 'name'])
-        if used_bid_orders.empty:
-            used_bid_orders['price'] = []
-            used_bid_orders['volume'] = []
+        if self.presolve:
+            orders, group = self._presolve()
+        if self.backend == 'matrix':
+            self.values = self._optimize_matrix()
         else:
-            used_bid_orders.columns = ['price', 'volume']
-
-        prices['volume'] = volumes
-        prices['magic_source'] = [get_real_number(m) for m in magic_source]
-
-        # -> build merit order
-        merit_order = {hour: dict(price=[], volume=[], type=[]) for hour in range(24)}
-
-        def add_to_merit_order(hour, price, volume, type):
-            merit_order[hour]['price'].append(price)
-            merit_order[hour]['volume'].append(volume)
-            merit_order[hour]['type'].append(type)
-
-        for index, values in self.orders['linked_ask'].items():
-            price, volume, _ = values
-            _, hour, _ = index
-            add_to_merit_order(hour, price, volume, 'ask')
-        for index, values in self.orders['exclusive_ask'].items():
-            price, volume = values
-            _, hour, _ = index
-            if volume > 0:
-                add_to_merit_order(hour, price, volume, 'ask')
-            else:
-                add_to_merit_order(hour, price, -volume, 'bid')
-        for index, values in self.orders['single_ask'].items():
-            price, volume = values
-            _, hour, _ = index
-            add_to_merit_order(hour, price, volume, 'ask')
-        for index, values in self.orders['single_bid'].items():
-            price, volume = values
-            _, hour, _ = index
-            add_to_merit_order(hour, price, -volume, 'bid')
+            self.values = self._optimize_pyomo()
+        if self.presolve:
+            self._postsolve(orders, group)
+
+        return self._get_results()
+
+    def only_hourly_orders(self) -> bool:
+        """
+        the order book can be cleared by merit order, if it has no block orders and no negative hourly asks
+        """
+        no_blocks = not (self.orders['linked_ask'] or self.orders['exclusive_ask'])
+        return no_blocks and all(volume >= 0 for _, volume in self.orders['single_ask'].values())
+
+    def clear_merit_order(self):
+        """
+        clears an order book with only hourly orders by intersecting the sorted ask curve with the demand
+        and returns the same results as optimize
+        """
+        t1 = time.time()
+        keys = list(self.orders['single_ask'].keys())
+        asks = np.asarray([(hour, price, volume) for (_, hour, _), (price, volume)
+                           in self.orders['single_ask'].items()], dtype=float).reshape((-1, 3))
+        bids = np.asarray([(hour, volume) for (_, hour, _), (_, volume)
+                           in self.orders['single_bid'].items()], dtype=float).reshape((-1, 2))
+        hour, price, volume = asks[:, 0].astype(int), asks[:, 1], asks[:, 2]
+        has_bid = np.bincount(bids[:, 0].astype(int), minlength=len(self.t)) > 0
+        demand = -np.bincount(bids[:, 0].astype(int), weights=bids[:, 1], minlength=len(self.t))
+
+        # -> asks with equal price in the same hour form one step of the merit order and share it pro rata
+        steps, step_index = np.unique(np.column_stack([hour, price]), axis=0, return_inverse=True)
+        step_index = step_index.reshape(-1)
+        step_hour = steps[:, 0].astype(int)
+        step_volume = np.bincount(step_index, weights=volume, minlength=len(steps))
+        # -> cumulated volume per hour of all cheaper steps (steps are sorted by hour and price)
+        cumulated = np.cumsum(step_volume)
+        hour_start = np.searchsorted(step_hour, step_hour)
+        cheaper_volume = cumulated - step_volume - (cumulated - step_volume)[hour_start]
+        accepted = np.clip(demand[step_hour] - cheaper_volume, 0, step_volume)
+        # -> without any demand only orders with negative costs are used
+        no_bid = ~has_bid[step_hour]
+        accepted[no_bid] = np.where(steps[no_bid, 1] < 0, step_volume[no_bid], 0)
+        share = np.divide(accepted, step_volume, out=np.zeros(len(steps)), where=step_volume > 0)
+
+        self.values = {'single_ask': share[step_index], 'linked_ask': np.zeros(0), 'exclusive_ask': np.zeros(0)}
+        self.timings['build'], self.timings['solve'] = 0, time.time() - t1
+        self.logger.info(f'cleared market by merit order in {self.timings["solve"]:.2f} seconds')
+
+        return self._get_results()
+
+    def _get_results(self):
+        """
+        computes prices, volumes and the used orders from the order acceptance in self.values,
+        which holds one array per order type aligned with the order dicts
+        """
+        t1 = time.time()
+        T = len(self.t)
+        orders = {type_: get_order_arrays(self.orders[type_]) for type_ in self._order_types}
+        # -> unsolved variables count as not used
+        used = {type_: np.nan_to_num(np.asarray(self.values.get(type_, np.zeros(len(orders[type_]['keys']))),
+                                                dtype=float))
+                for type_ in ['single_ask', 'linked_ask', 'exclusive_ask']}
+
+        # -> determine magic source, price and volume at each hour
+        magic_source = -np.bincount(orders['single_bid']['hour'], weights=orders['single_bid']['volume'],
+                                    minlength=T)[:T]
+        for type_, acceptance in used.items():
+            magic_source -= np.bincount(orders[type_]['hour'], weights=orders[type_]['volume'] * acceptance,
+                                        minlength=T)[:T]
+        if self.dual_prices is None:
+            prices = self._get_max_prices(orders, used)
+        else:
+            # -> hours without balance or with magic source keep the price of the most expensive used order
+            prices = self.dual_prices.copy()
+            fallback = np.isnan(prices) | (np.abs(magic_source) > 1e-3)
+            if fallback.any():
+                prices[fallback] = self._get_max_prices(orders, used)[fallback]
+
+        exclusive = orders['exclusive_ask']
+        storage_demand = (used['exclusive_ask'] != 0) & (exclusive['volume'] < 0)
+        volumes = -np.bincount(orders['single_bid']['hour'], weights=orders['single_bid']['volume'],
+                               minlength=T)[:T]
+        volumes -= np.bincount(exclusive['hour'][storage_demand], weights=exclusive['volume'][storage_demand],
+                               minlength=T)[:T]
+        self.logger.info(f'Got {magic_source.sum():.2f} kWh from Magic source')
+
+        prices = pd.DataFrame(data=dict(price=prices, volume=volumes, magic_source=magic_source))
+
+        # -> determine used ask orders, hourly and linked orders are used partially
+        used_orders = {}
+        for type_, acceptance in used.items():
+            order_used = acceptance != 0
+            volume = orders[type_]['volume'][order_used]
+            if type_ != 'exclusive_ask':
+                volume = volume * acceptance[order_used]
+            columns = dict(price=orders[type_]['price'][order_used], volume=volume)
+            if type_ == 'linked_ask':
+                columns['link'] = orders[type_].get('link', np.zeros(0, dtype=int))[order_used]
+            used_orders[type_] = self._get_order_frame(orders[type_], order_used, columns)
+        # -> return all bid orders
+        bids = orders['single_bid']
+        all_bids = np.ones(len(bids['keys']), dtype=bool)
+        used_bid_orders = self._get_order_frame(bids, all_bids, dict(price=bids['price'], volume=bids['volume']))
+
+        # -> build merit order, exclusive orders with negative volume are on the demand side
+        linked, single = orders['linked_ask'], orders['single_ask']
+        hour = np.concatenate([linked['hour'], exclusive['hour'], single['hour'], bids['hour']])
+        price = np.concatenate([linked['price'], exclusive['price'], single['price'], bids['price']])
+        volume = np.concatenate([linked['volume'], np.abs(exclusive['volume']), single['volume'], -bids['volume']])
+        side = np.concatenate([np.full(len(linked['hour']), 'ask'), np.where(exclusive['volume'] > 0, 'ask', 'bid'),
+                               np.full(len(single['hour']), 'ask'), np.full(len(bids['hour']), 'bid')])
+        order = np.argsort(hour, kind='stable')
+        bounds = np.searchsorted(hour[order], [self.t[0]] + [t + 1 for t in self.t])
+        merit_order = {t: dict(price=price[order[start:end]].tolist(),
+                               volume=volume[order[start:end]].tolist(),
+                               type=side[order[start:end]].tolist())
+                       for t, start, end in zip(self.t, bounds[:-1], bounds[1:])}
+        self.timings['extraction'] = time.time() - t1
+        self.logger.info(f'extracted results in {self.timings["extraction"]:.2f} seconds')
 
         self._reset_parameter()
         return (prices, used_orders['single_ask'],
@@ -324,46 +496,23 @@ class DayAheadMarket:
                 used_bid_orders,
                 merit_order)
 
-
-if __name__ == "__main__":
-    from systems.powerPlant import PowerPlant
-    from systems.storage_hydroPlant import Storage
-    from systems.utils import get_test_prices, get_test_storage, get_test_power_plant, get_test_demand_orders
-
-    market = DayAheadMarket()
-
-    power_plant = get_test_power_plant()
-    power_plant['runTime'], power_plant['stopTime'] = 4, 4
-    power_plant = PowerPlant(T=24, steps=(0, 1, 100), **power_plant)
-    pwp_prices = get_test_prices(num=48)
-    pwp_prices['power'] /= 10
-    pwp_prices['power'][8:12] = -100
-    pwp_prices['power'][22:24] = -10
-    power_plant.optimize(date=pd.Timestamp(2018, 1, 1), prices=pwp_prices, weather=pd.DataFrame())
-    pwp_orders = power_plant.get_ask_orders()
-
-    storage = get_test_storage()
-    storage = Storage(T=24, **storage)
-    storage_prices = get_test_prices(num=24)
-    storage_prices['power'][:8] = 100
-    storage_prices['power'] /= 1e4
-    storage.optimize(date=pd.Timestamp(2018, 1, 1), prices=storage_prices, weather=pd.DataFrame())
-    storage_orders = storage.get_exclusive_orders()
-
-    bid_orders = get_test_demand_orders(4000 * np.ones(24))
-
-    hourly_bid = {}
-    for key, value in bid_orders.to_dict(orient='index').items():
-        hourly_bid[key] = (value['price'], value['volume'])
-
-    linked_orders = {}
-    for key, value in pwp_orders.to_dict(orient='index').items():
-        linked_orders[key] = (value['price'], value['volume'], value['link'])
-
-    exclusive_orders = {}
-    for key, value in storage_orders.to_dict(orient='index').items():
-        exclusive_orders.update({key: (value['price'], value['volume'])})
-
-    market.set_parameter({}, hourly_bid, linked_orders, exclusive_orders)
-    result = market.optimize()
-    prices_market, used_ask_orders, used_linked_orders, used_exclusive_orders, used_bid_orders, merit_order = result
+    def _get_max_prices(self, orders: dict, used: dict) -> np.array:
+        """
+        returns the price of the most expensive used order in each hour
+        """
+        prices = np.full(len(self.t), -1000.0)
+        for type_, acceptance in used.items():
+            hour, price, volume = orders[type_]['hour'], orders[type_]['price'], orders[type_]['volume']
+            # -> orders outside of the hours of the market do not set a price
+            order_used = (acceptance != 0) & (hour >= 0) & (hour < len(self.t))
+            if type_ == 'exclusive_ask':
+                # -> disable price by storage if the storage is on the demand side
+                order_used &= volume > 0
+            np.maximum.at(prices, hour[order_used], price[order_used])
+        return prices
+
+    @staticmethod
+    def _get_order_frame(orders: dict, mask: np.array, columns: dict) -> pd.DataFrame:
+        index = pd.MultiIndex.from_arrays([orders['block'][mask], orders['hour'][mask], orders['name'][mask]],
+                                          names=['block_id', 'hour', 'name'])
+        return pd.DataFrame(data=columns, index=index)
@@ -0,0 +1,314 @@
+# third party modules
+import logging
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+
+log = logging.getLogger('market')
+
+# -> solvers, to which the matrices are passed in bulk, other solvers are solved with highs
+MATRIX_SOLVERS = ['gurobi', 'highs']
+
+
+def get_order_arrays(orders: dict) -> dict:
+    """
+    converts an order dict {(block, hour, name): (price, volume, ...)} into aligned arrays
+    """
+    keys = list(orders.keys())
+    values = list(orders.values())
+    arrays = dict(keys=keys,
+                  block=np.asarray([key[0] for key in keys], dtype=int),
+                  hour=np.asarray([key[1] for key in keys], dtype=int),
+                  name=np.asarray([key[2] for key in keys], dtype=object),
+                  price=np.asarray([value[0] for value in values], dtype=float),
+                  volume=np.asarray([value[1] for value in values], dtype=float))
+    if values and len(values[0]) > 2:
+        arrays['link'] = np.asarray([value[2] for value in values], dtype=int)
+    return arrays
+
+
+def get_group_ids(keys: list) -> (np.array, list):
+    """
+    maps each key to the position of its first occurrence
+    """
+    groups = {}
+    ids = np.asarray([groups.setdefault(key, len(groups)) for key in keys], dtype=int)
+    return ids, list(groups.keys())
+
+
+class MatrixMarketModel:
+
+    def __init__(self, orders: dict, parent_blocks: dict, start_block: set, t: np.array):
+        """
+        Clearing model of the DayAheadMarket assembled as sparse matrices.
+        The columns are ordered as single asks, linked asks, mother blocks, exclusive blocks, source and sink,
+        each row is one constraint of the pyomo model in DayAheadMarket.optimize.
+        """
+        self.t = t
+        self.T = len(t)
+
+        self.single_ask = get_order_arrays(orders['single_ask'])
+        self.single_bid = get_order_arrays(orders['single_bid'])
+        self.linked_ask = get_order_arrays(orders['linked_ask'])
+        self.exclusive_ask = get_order_arrays(orders['exclusive_ask'])
+
+        self.parent_blocks = parent_blocks
+        self.start_block = list(start_block)
+
+        # -> (block, agent) groups of the linked and exclusive orders
+        linked_keys = [(block, name) for block, _, name in self.linked_ask['keys']]
+        self.linked_group, self.linked_blocks = get_group_ids(linked_keys)
+        exclusive_keys = [(block, name) for block, _, name in self.exclusive_ask['keys']]
+        self.exclusive_group, self.exclusive_blocks = get_group_ids(exclusive_keys)
+
+        # -> column offsets
+        sizes = [len(self.single_ask['keys']), len(self.linked_ask['keys']), len(self.start_block),
+                 len(self.exclusive_blocks), self.T, self.T]
+        offsets = np.cumsum([0] + sizes)
+        self.columns = dict(single_ask=slice(offsets[0], offsets[1]),
+                            linked_ask=slice(offsets[1], offsets[2]),
+                            mother_order=slice(offsets[2], offsets[3]),
+                            exclusive_ask=slice(offsets[3], offsets[4]),
+                            source=slice(offsets[4], offsets[5]),
+                            sink=slice(offsets[5], offsets[6]))
+        self.num_columns = offsets[-1]
+
+        self.c = np.zeros(self.num_columns)
+        self.lb = np.zeros(self.num_columns)
+        self.ub = np.ones(self.num_columns)
+        self.integrality = np.zeros(self.num_columns, dtype=int)
+
+        self.A = csr_matrix((0, self.num_columns))
+        self.sense = np.asarray([], dtype='<U1')
+        self.rhs = np.asarray([], dtype=float)
+        self.gen_dem_rows = {}
+
+    def build(self) -> None:
+        cols = self.columns
+        rows, entries, columns, sense, rhs = [], [], [], [], []
+
+        def add_rows(row_ids, col_ids, values, row_sense, row_rhs):
+            offset = len(sense)
+            rows.append(np.asarray(row_ids, dtype=int) + offset)
+            columns.append(np.asarray(col_ids, dtype=int))
+            entries.append(np.asarray(values, dtype=float))
+            sense.extend(row_sense)
+            rhs.extend(row_rhs)
+
+        # -> bounds and integrality
+        self.ub[cols['source']] = np.inf
+        self.ub[cols['sink']] = np.inf
+        self.integrality[cols['mother_order']] = 1
+        self.integrality[cols['exclusive_ask']] = 1
+
+        # -> objective: generation cost of all asks and penalty for the magic source and sink
+        linked, single, exclusive = self.linked_ask, self.single_ask, self.exclusive_ask
+        self.c[cols['single_ask']] = single['price'] * single['volume']
+        self.c[cols['linked_ask']] = linked['price'] * linked['volume']
+        exclusive_cost = np.where(exclusive['volume'] > 0, exclusive['price'] * exclusive['volume'], 0)
+        self.c[cols['exclusive_ask']] = np.bincount(self.exclusive_group, weights=exclusive_cost,
+                                                    minlength=len(self.exclusive_blocks))
+        self.c[cols['source']] = 1e12
+        self.c[cols['sink']] = 1e12
+
+        # -> linked orders: child blocks are enabled by their parent, mother blocks are used completely or not
+        num_blocks = len(self.linked_blocks)
+        order = np.argsort(self.linked_group, kind='stable')
+        counts = np.bincount(self.linked_group, minlength=num_blocks)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(int)
+        block_index = {block: i for i, block in enumerate(self.linked_blocks)}
+
+        child, parent = [], []
+        for (block, agent), i in block_index.items():
+            parent_id = self.parent_blocks[block, agent]
+            if parent_id == -1:
+                continue
+            if (parent_id, agent) in block_index:
+                child.append(i)
+                parent.append(block_index[parent_id, agent])
+            else:
+                log.warning(f'Agent {agent} send invalid linked orders '
+                            f'- block {block} has no parent_id {parent_id}')
+        child, parent = np.asarray(child, dtype=int), np.asarray(parent, dtype=int)
+        child_row = np.full(num_blocks, -1)
+        child_row[child] = np.arange(len(child))
+        # sum(child) - 2 * sum(parent) <= 0
+        is_child = child_row[self.linked_group] >= 0
+        # -> positions of all rows of the parent block, repeated for each child
+        parent_counts = counts[parent]
+        parent_rows = np.repeat(np.arange(len(child)), parent_counts)
+        position = np.arange(parent_counts.sum()) - np.repeat(np.cumsum(parent_counts) - parent_counts, parent_counts)
+        parent_cols = order[np.repeat(starts[parent], parent_counts) + position]
+        add_rows(np.concatenate([child_row[self.linked_group][is_child], parent_rows]),
+                 np.concatenate([np.flatnonzero(is_child), parent_cols]) + cols['linked_ask'].start,
+                 np.concatenate([np.ones(is_child.sum()), -2 * np.ones(len(parent_cols))]),
+                 ['<'] * len(child), [0] * len(child))
+
+        # sum(mother) - count * use_mother_order == 0
+        mother = np.asarray([block_index[block] for block in self.start_block], dtype=int)
+        mother_row = np.full(num_blocks, -1)
+        mother_row[mother] = np.arange(len(mother))
+        is_mother = mother_row[self.linked_group] >= 0
+        add_rows(np.concatenate([mother_row[self.linked_group][is_mother], np.arange(len(mother))]),
+                 np.concatenate([np.flatnonzero(is_mother) + cols['linked_ask'].start,
+                                 np.arange(len(mother)) + cols['mother_order'].start]),
+                 np.concatenate([np.ones(is_mother.sum()), -counts[mother]]),
+                 ['='] * len(mother), [0] * len(mother))
+
+        # -> exclusive orders: only one schedule per agent can be used
+        agent_row, agents = get_group_ids([agent for _, agent in self.exclusive_blocks])
+        add_rows(agent_row, np.arange(len(self.exclusive_blocks)) + cols['exclusive_ask'].start,
+                 np.ones(len(self.exclusive_blocks)), ['<'] * len(agents), [1] * len(agents))
+
+        # -> generation must be equal to demand: -asks - source + sink == bids
+        has_bid = np.bincount(self.single_bid['hour'], minlength=self.T) > 0
+        has_ask = (np.bincount(single['hour'], minlength=self.T) + np.bincount(linked['hour'], minlength=self.T)) > 0
+        for t in self.t[~has_bid]:
+            log.error(f'no hourly_bids available at hour {t}')
+        for t in self.t[has_bid & ~has_ask]:
+            # constraints with 0 <= 0 are not valid
+            log.error(f'no hourly_asks available at hour {t}')
+        balance_hours = self.t[has_bid & has_ask]
+        balance_row = np.full(self.T, -1)
+        balance_row[balance_hours] = np.arange(len(balance_hours))
+        self.gen_dem_rows = {t: len(sense) + i for i, t in enumerate(balance_hours)}
+
+        row_ids, col_ids, values = [], [], []
+        for type_, arrays, col in [('single_ask', single, np.arange(len(single['keys']))),
+                                   ('linked_ask', linked, np.arange(len(linked['keys']))),
+                                   ('exclusive_ask', exclusive, self.exclusive_group)]:
+            row = balance_row[arrays['hour']]
+            use = row >= 0
+            row_ids.append(row[use])
+            col_ids.append(col[use] + cols[type_].start)
+            values.append(-arrays['volume'][use])
+        row_ids += [np.arange(len(balance_hours))] * 2
+        col_ids += [balance_hours + cols['source'].start, balance_hours + cols['sink'].start]
+        values += [-np.ones(len(balance_hours)), np.ones(len(balance_hours))]
+        bids = np.bincount(self.single_bid['hour'], weights=self.single_bid['volume'], minlength=self.T)
+        add_rows(np.concatenate(row_ids), np.concatenate(col_ids), np.concatenate(values),
+                 ['='] * len(balance_hours), bids[balance_hours])
+
+        self.A = coo_matrix((np.concatenate(entries), (np.concatenate(rows), np.concatenate(columns))),
+                            shape=(len(sense), self.num_columns)).tocsr()
+        self.sense = np.asarray(sense, dtype='<U1')
+        self.rhs = np.asarray(rhs, dtype=float)
+
+    def get_start_vector(self, start: dict) -> np.array:
+        """
+        maps known block decisions to their columns, all other columns are nan
+        """
+        x = np.full(self.num_columns, np.nan)
+        cols = self.columns
+        for type_, blocks in [('mother_order', self.start_block), ('exclusive_ask', self.exclusive_blocks)]:
+            values = start.get(type_, {})
+            known = [i for i, block in enumerate(blocks) if block in values]
+            x[cols[type_].start + np.asarray(known, dtype=int)] = [values[blocks[i]] for i in known]
+        return x
+
+    def _get_bounds(self, fixed: np.array = None) -> (np.array, np.array, np.array):
+        """
+        returns lower bounds, upper bounds and integrality, with fixed the integer columns are fixed at its values
+        """
+        if fixed is None:
+            return self.lb, self.ub, self.integrality
+        integer = self.integrality > 0
+        lb, ub = self.lb.copy(), self.ub.copy()
+        lb[integer] = ub[integer] = fixed[integer]
+        return lb, ub, np.zeros_like(self.integrality)
+
+    def _solve_gurobi(self, mip_gap: float, time_limit: float, start: np.array,
+                      fixed: np.array = None) -> (np.array, np.array):
+        import gurobipy as gp
+
+        lb, ub, integrality = self._get_bounds(fixed)
+        model = gp.Model('market')
+        model.Params.MIPGap = mip_gap
+        model.Params.TimeLimit = time_limit
+        v_types = np.where(integrality > 0, gp.GRB.BINARY, gp.GRB.CONTINUOUS)
+        x = model.addMVar(self.num_columns, lb=lb, ub=ub, obj=self.c, vtype=v_types)
+        rows = model.addMConstr(self.A, x, self.sense, self.rhs)
+        if start is not None:
+            x.Start = np.where(np.isnan(start), gp.GRB.UNDEFINED, start)
+        model.optimize()
+        duals = np.asarray(rows.Pi) if fixed is not None else None
+        return np.asarray(x.X), duals
+
+    def _solve_highs(self, mip_gap: float, time_limit: float, start: np.array,
+                     fixed: np.array = None) -> (np.array, np.array):
+        import highspy
+
+        lb, ub, integrality = self._get_bounds(fixed)
+        lp = highspy.HighsLp()
+        lp.num_col_, lp.num_row_ = self.num_columns, len(self.rhs)
+        lp.col_cost_, lp.col_lower_, lp.col_upper_ = self.c, lb, ub
+        lp.row_lower_ = np.where(self.sense == '<', -np.inf, self.rhs)
+        lp.row_upper_ = np.where(self.sense == '>', np.inf, self.rhs)
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+        lp.a_matrix_.start_, lp.a_matrix_.index_, lp.a_matrix_.value_ = self.A.indptr, self.A.indices, self.A.data
+        lp.integrality_ = [highspy.HighsVarType.kInteger if integer else highspy.HighsVarType.kContinuous
+                           for integer in integrality]
+
+        model = highspy.Highs()
+        model.setOptionValue('output_flag', False)
+        model.setOptionValue('mip_rel_gap', mip_gap)
+        model.setOptionValue('time_limit', float(time_limit))
+        model.passModel(lp)
+        if start is not None:
+            # -> partial solution, highs completes the unknown columns
+            known = np.flatnonzero(~np.isnan(start)).astype(np.int32)
+            model.setSolution(len(known), known, start[known])
+        model.run()
+        status = model.modelStatusToString(model.getModelStatus())
+        log.info(f'solver message: {status}')
+        solution = model.getSolution()
+        if not solution.value_valid:
+            raise RuntimeError(f'no solution found: {status}')
+        duals = np.asarray(solution.row_dual) if fixed is not None else None
+        return np.asarray(solution.col_value), duals
+
+    def solve(self, solver_type: str = 'gurobi', mip_gap: float = 0.1, time_limit: float = 60,
+              start: dict = None) -> np.array:
+        """
+        passes the matrices in bulk to the solver and returns the solution vector,
+        known block decisions in start are used as MIP start
+        """
+        has_start = start is not None and any(start.values())
+        start = self.get_start_vector(start) if has_start else None
+        if solver_type == 'gurobi':
+            x, _ = self._solve_gurobi(mip_gap, time_limit, start)
+        else:
+            if solver_type not in MATRIX_SOLVERS:
+                log.warning(f'{solver_type} is not supported by the matrix backend - solving with highs')
+            x, _ = self._solve_highs(mip_gap, time_limit, start)
+        x[self.integrality > 0] = np.round(x[self.integrality > 0])
+        return x
+
+    def get_dual_prices(self, x: np.array, solver_type: str = 'gurobi', time_limit: float = 60) -> np.array:
+        """
+        fixes the block decisions of x, solves the remaining LP and returns the price of each hour
+        from the duals of the balance rows, hours without balance row are nan
+        """
+        solve = self._solve_gurobi if solver_type == 'gurobi' else self._solve_highs
+        _, duals = solve(0, time_limit, None, fixed=x)
+        prices = np.full(self.T, np.nan)
+        hours, rows = list(self.gen_dem_rows.keys()), list(self.gen_dem_rows.values())
+        # -> the balance rows are written as -asks - source + sink == bids, an additional demand lowers the rhs
+        prices[hours] = -duals[rows]
+        return prices
+
+    def get_block_values(self, x: np.array) -> dict:
+        """
+        returns the decisions for the mother and exclusive blocks keyed by (block, agent)
+        """
+        cols = self.columns
+        return dict(mother_order=dict(zip(self.start_block, x[cols['mother_order']])),
+                    exclusive_ask=dict(zip(self.exclusive_blocks, x[cols['exclusive_ask']])))
+
+    def get_values(self, x: np.array) -> dict:
+        """
+        returns the acceptance of each order aligned with the order arrays of each type
+        """
+        cols = self.columns
+        return {'single_ask': x[cols['single_ask']],
+                'linked_ask': x[cols['linked_ask']],
+                'exclusive_ask': x[cols['exclusive_ask']][self.exclusive_group]}
@@ -4,21 +4,28 @@ from datetime import timedelta as td
 import numpy as np
 import pandas as pd
 from pyomo.environ import (Binary, ConcreteModel, Constraint, ConstraintList,
-                           NonNegativeReals, Objective, Reals, SolverFactory,
+                           NonNegativeReals, Objective, Param, Reals,
                            Var, maximize, quicksum, value)
 from pyomo.opt import SolverStatus, TerminationCondition
 
 # model modules
 from systems.basic_system import EnergySystem
+from systems.cache import LRUCache, get_array_hash
+from systems.solver import get_solver, solve
+from systems.unit_commitment import solve_unit_commitment
 
 log = logging.getLogger('powerplant')
 
+# -> link of an order, whose parent hour has no block, -1 marks a mother block
+NO_LINK = -2
+
 
 class PowerPlant(EnergySystem):
 
     def __init__(self, T, steps: tuple, unitID: str, fuel: str, maxPower: float, minPower: float,
                  eta: float, P0: float, chi: float, stopTime: int, runTime: int, gradP: float, gradM: float,
-                 on: int, off: int, startCost: float, *args, **kwargs):
+                 on: int, off: int, startCost: float, solver_type: str = 'highs', batch_steps: bool = False,
+                 cache: LRUCache = None, *args, **kwargs):
         super().__init__(T=T, fuel_type=fuel)
 
         self.name = unitID
@@ -30,7 +37,15 @@ class PowerPlant(EnergySystem):
         self.start_cost = startCost
 
         self.model = ConcreteModel()
-        self.opt = SolverFactory('glpk')
+        # -> one model per horizon length, built once and updated before each solve
+        self.models = {}
+        # -> dp solves the dynamic programming in systems.unit_commitment, any other solver type the milp,
+        #    highs runs in process and falls back to glpk or cbc if it is not available
+        self.solver_type, self.opt = (solver_type, None) if solver_type == 'dp' else get_solver(solver_type)
+        # -> solve the milp of all price steps in one block diagonal model
+        self.batch_steps = batch_steps
+        # -> results of identical plants (scaled by maxPower) with identical prices, shared in the portfolio
+        self.cache = cache
 
         self.steps = steps
         self.opt_results = {step: dict(power=np.zeros(self.T, float),
@@ -42,6 +57,8 @@ class PowerPlant(EnergySystem):
 
         self.prevented_start = dict(prevent=False, hours=np.zeros(self.T, float), delta=0)
         self.reduction_next_day = dict()
+        # -> day ahead solutions (power, on, start) of the steps, used in the post market optimization
+        self.solutions = {}
 
 
     def set_parameter(self, date: pd.Timestamp, weather: pd.DataFrame = None, prices: pd.DataFrame = None) -> None:
@@ -49,112 +66,292 @@ class PowerPlant(EnergySystem):
         self.base_price = prices.copy()
 
     def build_model(self, committed_power: np.array = None) -> None:
+        """
+        builds the model once per horizon and updates its parameters (prices, P0, on/off and committed power)
+        """
+        T = len(self.t)
+        if T not in self.models:
+            self.models[T] = self._build_model(T)
+        self.model = self.models[T]
+        self._update_model(committed_power)
+
+    def _build_model(self, T: int) -> ConcreteModel:
         pwp = self.generation_system
-
-        self.model.clear()
+        model = ConcreteModel()
+        t_range = range(T)
 
         delta = pwp['maxPower'] - pwp['minPower']
 
-        self.model.p_out = Var(self.t, bounds=(0, pwp['maxPower']), within=Reals)
-        self.model.p_model = Var(self.t, bounds=(0, delta), within=Reals)
+        # -> mutable parameters, which are updated before each solve
+        model.power_price = Param(t_range, initialize=0, mutable=True)
+        model.fuel_price = Param(t_range, initialize=0, mutable=True)
+        model.emission_price = Param(t_range, initialize=0, mutable=True)
+        model.P0 = Param(initialize=0, mutable=True)
+        model.must_on = Param(t_range, initialize=0, mutable=True)
+        model.must_off = Param(t_range, initialize=0, mutable=True)
+        model.committed_power = Param(t_range, initialize=0, mutable=True)
+        model.difference_price = Param(t_range, initialize=0, mutable=True)
+
+        model.p_out = Var(t_range, bounds=(0, pwp['maxPower']), within=Reals)
+        model.p_model = Var(t_range, bounds=(0, delta), within=Reals)
 
         # states (on, ramp up, ramp down)
-        self.model.z = Var(self.t, within=Binary)
-        self.model.v = Var(self.t, within=Binary)
-        self.model.w = Var(self.t, within=Binary)
+        model.z = Var(t_range, within=Binary)
+        model.v = Var(t_range, within=Binary)
+        model.w = Var(t_range, within=Binary)
 
         # define constraint for output power
-        self.model.real_power = ConstraintList()
-        self.model.real_max = ConstraintList()
+        model.real_power = ConstraintList()
+        model.real_max = ConstraintList()
         # define constraint for model power
-        self.model.model_min = ConstraintList()
-        self.model.model_max = ConstraintList()
+        model.model_min = ConstraintList()
+        model.model_max = ConstraintList()
         # define constraint ramping
-        self.model.ramping_up = ConstraintList()
-        self.model.ramping_down = ConstraintList()
+        model.ramping_up = ConstraintList()
+        model.ramping_down = ConstraintList()
         # define constraint for run- and stop-time
-        self.model.stop_time = ConstraintList()
-        self.model.run_time = ConstraintList()
-        self.model.states = ConstraintList()
-        self.model.initial_on = ConstraintList()
-        self.model.initial_off = ConstraintList()
+        model.stop_time = ConstraintList()
+        model.run_time = ConstraintList()
+        model.states = ConstraintList()
+        model.initial_on = ConstraintList()
+        model.initial_off = ConstraintList()
 
-        try:
-            fuel_prices = self.prices[str(pwp['fuel']).replace('_combined', '')].values
-            emission_prices = self.prices['co'].values
-            power_prices = self.prices['power'].values
-        except KeyError:
-            log.error(f'prices were: {self.prices}')
-            raise Exception(f"No Fuel prices given for fuel {pwp['fuel']}")
-
-        for t in self.t:
+        for t in t_range:
             # output power of the plant
-            self.model.real_power.add(self.model.p_out[t] == self.model.p_model[t] + self.model.z[t] * pwp['minPower'])
+            model.real_power.add(model.p_out[t] == model.p_model[t] + model.z[t] * pwp['minPower'])
             if t < 23:  # only the next day
-                self.model.real_max.add(self.model.p_out[t] <= pwp['minPower']
-                                        * (self.model.z[t] + self.model.v[t + 1] + self.model.p_model[t]))
+                model.real_max.add(model.p_out[t] <= pwp['minPower'] * (model.z[t] + model.v[t + 1] + model.p_model[t]))
             # model power for optimization
-            self.model.model_min.add(0 <= self.model.p_model[t])
-            self.model.model_max.add(self.model.z[t] * delta >= self.model.p_model[t])
+            model.model_min.add(0 <= model.p_model[t])
+            model.model_max.add(model.z[t] * delta >= model.p_model[t])
             # ramping (gradients)
             if t == 0:
-                self.model.ramping_up_0 = Constraint(expr=self.model.p_out[0] <= pwp['P0'] + pwp['gradP'])
-                self.model.ramping_down_0 = Constraint(expr=self.model.p_out[0] >= pwp['P0'] - pwp['gradM'])
+                model.ramping_up_0 = Constraint(expr=model.p_out[0] <= model.P0 + pwp['gradP'])
+                model.ramping_down_0 = Constraint(expr=model.p_out[0] >= model.P0 - pwp['gradM'])
             else:
-                self.model.ramping_up.add(self.model.p_model[t] - self.model.p_model[t - 1]
-                                          <= pwp['gradP'] * self.model.z[t - 1])
-                self.model.ramping_down.add(self.model.p_model[t - 1] - self.model.p_model[t]
-                                            <= pwp['gradM'] * self.model.z[t])
+                model.ramping_up.add(model.p_model[t] - model.p_model[t - 1] <= pwp['gradP'] * model.z[t - 1])
+                model.ramping_down.add(model.p_model[t - 1] - model.p_model[t] <= pwp['gradM'] * model.z[t])
             # minimal run and stop time
             if t > pwp['stopTime']:
-                self.model.stop_time.add(1 - self.model.z[t]
-                                         >= quicksum(self.model.w[k] for k in range(t - pwp['stopTime'], t)))
+                model.stop_time.add(1 - model.z[t] >= quicksum(model.w[k] for k in range(t - pwp['stopTime'], t)))
             if t > pwp['runTime']:
-                self.model.run_time.add(self.model.z[t]
-                                        >= quicksum(self.model.v[k] for k in range(t - pwp['runTime'], t)))
+                model.run_time.add(model.z[t] >= quicksum(model.v[k] for k in range(t - pwp['runTime'], t)))
             if t > 0:
-                self.model.states.add(self.model.z[t - 1] - self.model.z[t] + self.model.v[t] - self.model.w[t] == 0)
-
-            if pwp['on'] > 0 and t < pwp['runTime'] - pwp['on']:
-                self.model.initial_on.add(self.model.z[t] == 1)
-            elif pwp['off'] > 0 and t < pwp['stopTime'] - pwp['off']:
-                self.model.initial_off.add(self.model.z[t] == 0)
-
-        # -> fuel costs
-        fuel_cost = [(self.model.p_out[t] / pwp['eta']) * fuel_prices[t] for t in self.t]
-        # -> emission costs
-        emission_cost = [(self.model.p_out[t] / pwp['eta'] * pwp['chi']) * emission_prices[t]
-                         for t in self.t]
-        # -> start costs
-        start_cost = [self.model.v[t] * self.start_cost for t in self.t]
-
-        # -> profit and resulting cashflow
-        profit = [self.model.p_out[t] * power_prices[t] for t in self.t]
-        cashflow = [profit[t] - (fuel_cost[t] + emission_cost[t] + start_cost[t]) for t in self.t]
-
-        # if no day ahead power known run standard optimization
-        if committed_power is None:
-            self.model.obj = Objective(expr=quicksum(cashflow), sense=maximize)
-        # if day ahead power is known minimize the difference
-        else:
-            self.model.power_difference = Var(self.t, within=NonNegativeReals)
-            self.model.minus = Var(self.t, within=NonNegativeReals)
-            self.model.plus = Var(self.t, within=NonNegativeReals)
+                model.states.add(model.z[t - 1] - model.z[t] + model.v[t] - model.w[t] == 0)
+            # initial state, enabled by must_on and must_off
+            if t < pwp['runTime']:
+                model.initial_on.add(model.z[t] >= model.must_on[t])
+            if t < pwp['stopTime']:
+                model.initial_off.add(model.z[t] <= 1 - model.must_off[t])
+
+        # -> difference to the day ahead power, only priced if committed power is known
+        model.minus = Var(t_range, within=NonNegativeReals)
+        model.plus = Var(t_range, within=NonNegativeReals)
+        model.difference = ConstraintList()
+        for t in t_range:
+            model.difference.add(model.committed_power[t] - model.p_out[t] == -model.minus[t] + model.plus[t])
+
+        # -> profit - (fuel costs + emission costs + start costs) - difference costs
+        cashflow = [model.p_out[t] * model.power_price[t]
+                    - (model.p_out[t] / pwp['eta']) * model.fuel_price[t]
+                    - (model.p_out[t] / pwp['eta'] * pwp['chi']) * model.emission_price[t]
+                    - model.v[t] * self.start_cost
+                    - (model.minus[t] + model.plus[t]) * model.difference_price[t] for t in t_range]
+        model.obj = Objective(expr=quicksum(cashflow), sense=maximize)
+
+        return model
+
+    def _get_prices(self) -> (np.array, np.array, np.array):
+        pwp = self.generation_system
+        try:
+            power_prices = self.prices['power'].values[:len(self.t)]
+            fuel_prices = self.prices[str(pwp['fuel']).replace('_combined', '')].values[:len(self.t)]
+            emission_prices = self.prices['co'].values[:len(self.t)]
+        except KeyError:
+            log.error(f'prices were: {self.prices}')
+            raise Exception(f"No Fuel prices given for fuel {pwp['fuel']}")
+        return power_prices, fuel_prices, emission_prices
+
+    def _build_batch_model(self, T: int, steps: tuple) -> ConcreteModel:
+        # -> one block of the single model per step, the objective is the sum of the block objectives
+        model = ConcreteModel()
+        for i, step in enumerate(steps):
+            block = self._build_model(T)
+            block.obj.deactivate()
+            model.add_component(f'step_{i}', block)
+        model.obj = Objective(expr=quicksum(model.component(f'step_{i}').obj.expr for i in range(len(steps))),
+                              sense=maximize)
+        return model
+
+    def _update_model(self, committed_power: np.array = None, model: ConcreteModel = None) -> None:
+        pwp = self.generation_system
+        model = self.model if model is None else model
+        power_prices, fuel_prices, emission_prices = self._get_prices()
 
-            difference = [self.model.minus[t] + self.model.plus[t] for t in self.t]
-            self.model.difference = ConstraintList()
-            for t in self.t:
-                self.model.difference.add(committed_power[t] - self.model.p_out[t]
-                                          == -self.model.minus[t] + self.model.plus[t])
-            difference_cost = [difference[t] * np.abs(self.prices['power'].iloc[t] * 2) for t in self.t]
+        model.P0 = pwp['P0']
+        for t in self.t:
+            model.power_price[t] = power_prices[t]
+            model.fuel_price[t] = fuel_prices[t]
+            model.emission_price[t] = emission_prices[t]
+            must_on = pwp['on'] > 0 and t < pwp['runTime'] - pwp['on']
+            model.must_on[t] = int(must_on)
+            model.must_off[t] = int(not must_on and pwp['off'] > 0 and t < pwp['stopTime'] - pwp['off'])
+            # if day ahead power is known minimize the difference
+            if committed_power is None:
+                model.committed_power[t], model.difference_price[t] = 0, 0
+            else:
+                model.committed_power[t] = committed_power[t]
+                model.difference_price[t] = np.abs(power_prices[t] * 2)
+
+    def get_cache_key_parameters(self) -> tuple:
+        """
+        technical parameters normalized by maxPower, plants with the same parameters share their results,
+        real_max bounds p_out by minPower * p_model, which does not scale with maxPower for a minPower below 1
+        """
+        pwp = self.generation_system
+        technical = (pwp['minPower'], pwp['gradP'], pwp['gradM'], self.start_cost)
+        return (self.solver_type, str(pwp['fuel']).replace('_combined', ''), pwp['eta'], pwp['chi'],
+                pwp['runTime'], pwp['stopTime'], *np.round(np.asarray(technical, float) / pwp['maxPower'], 9),
+                round(min(pwp['minPower'], 1), 9))
 
-            # set new objective
-            self.model.obj = Objective(expr=quicksum(cashflow[t] - difference_cost[t] for t in self.t), sense=maximize)
+    def _get_cache_key(self, committed_power: np.array = None) -> tuple:
+        # -> normalized parameters and initial state, hash of the prices and committed power
+        pwp = self.generation_system
+        scale = pwp['maxPower']
+        arrays = list(self._get_prices())
+        if committed_power is not None:
+            arrays.append(np.asarray(committed_power, float)[:len(self.t)] / scale)
+        return (*self.get_cache_key_parameters(), round(pwp['P0'] / scale, 9), pwp['on'], pwp['off'],
+                committed_power is None, get_array_hash(*arrays))
+
+    def _scale_result(self, result: dict, scale: float) -> dict:
+        return dict(status=result['status'], power=result['power'] * scale, on=result['on'].copy(),
+                    start=result['start'].copy(), obj=result['obj'] * scale)
+
+    def _solve(self, committed_power: np.array = None, start: dict = None) -> dict:
+        """
+        solves the unit commitment for the current prices and horizon with the milp or the dp,
+        returns the status (optimal, infeasible or the solver message) and the power, on state, starts and objective,
+        a solution in start is used as warm start of the milp
+        """
+        if self.cache is None:
+            return self._solve_model(committed_power, start)
+        scale = self.generation_system['maxPower']
+        key = self._get_cache_key(committed_power)
+        result = self.cache.get(key)
+        if result is None:
+            result = self._solve_model(committed_power, start)
+            if result['status'] in ('optimal', 'infeasible'):
+                self.cache.put(key, self._scale_result(result, 1 / scale))
+            return result
+        return self._scale_result(result, scale)
+
+    def _solve_model(self, committed_power: np.array = None, start: dict = None) -> dict:
+        if self.solver_type == 'dp':
+            power_prices, fuel_prices, emission_prices = self._get_prices()
+            return solve_unit_commitment(power_prices, fuel_prices, emission_prices, self.generation_system,
+                                         self.start_cost, committed_power)
 
-    def _set_results(self, step: int) -> None:
+        self.build_model(committed_power)
+        warm_start = start is not None and self.opt.warm_start_capable()
+        if warm_start:
+            self._set_start(self.model, start, committed_power)
+        # -> glpk solves to optimality by default, the other solvers stop at a relative gap
+        r = solve(self.opt, self.model, self.solver_type, mip_gap=0, **(dict(warmstart=True) if warm_start else {}))
+        return self._get_result(r, self.model)
+
+    def _set_start(self, model: ConcreteModel, solution: dict, committed_power: np.array = None) -> None:
+        # -> sets the variables of the model to a solution as start for the milp
+        min_power, max_power = self.generation_system['minPower'], self.generation_system['maxPower']
+        committed_power = np.zeros(len(self.t)) if committed_power is None else committed_power
+        on = np.round(solution['on'])
+        power = np.clip(solution['power'], 0, max_power)
+        for t in self.t:
+            model.p_out[t].value = power[t]
+            model.p_model[t].value = min(max(power[t] - on[t] * min_power, 0), max_power - min_power)
+            model.z[t].value = on[t]
+            model.v[t].value = np.round(solution['start'][t])
+            model.w[t].value = max(on[t - 1] - on[t], 0) if t > 0 else 0
+            difference = committed_power[t] - power[t]
+            model.plus[t].value, model.minus[t].value = max(difference, 0), max(-difference, 0)
+
+    def _get_committed_result(self, committed_power: np.array) -> dict:
+        """
+        returns the day ahead solution of a step, which equals the committed power, if it is also optimal
+        for the post market optimization, otherwise None
+        """
+        pwp = self.generation_system
+        solution = next((solution for solution in self.solutions.values()
+                         if np.allclose(solution['power'], committed_power, rtol=0, atol=1e-3)), None)
+        if solution is None:
+            return None
+        power_prices, fuel_prices, emission_prices = self._get_prices()
+        marginal = (fuel_prices + emission_prices * pwp['chi']) / pwp['eta']
+        power, on, start = solution['power'], np.round(solution['on']), np.round(solution['start'])
+        # -> loss per kW of a deviation up or down from the committed power
+        loss_up = marginal - power_prices + 2 * np.abs(power_prices)
+        loss_down = power_prices - marginal + 2 * np.abs(power_prices)
+        if (loss_up < 0).any() or (loss_down[on > 0] < 0).any():
+            return None
+        # -> a start can only be saved by running through the hours before or by dropping the run,
+        #    both must cost more than the start
+        for hour in np.flatnonzero(start[1:] > 0) + 1:
+            on_hours = np.flatnonzero(on[:hour] > 0)
+            gap = slice(on_hours[-1] + 1 if len(on_hours) else 0, hour)
+            run_end = hour + np.argmin(np.append(on[hour:], 0) > 0)
+            run = slice(hour, run_end)
+            if min(np.sum(loss_up[gap]) * pwp['minPower'], np.sum(loss_down[run] * power[run])) < self.start_cost:
+                return None
+        obj = np.sum((power_prices - marginal) * power - 2 * np.abs(power_prices) * np.abs(committed_power - power))
+        obj -= np.sum(start) * self.start_cost
+        return dict(status='optimal', power=power.copy(), on=on, start=start, obj=obj)
+
+    def _get_closest_solution(self, committed_power: np.array) -> dict:
+        if not self.solutions or committed_power is None:
+            return None
+        return min(self.solutions.values(), key=lambda solution: np.abs(solution['power'] - committed_power).sum())
+
+    def _solve_steps(self, steps: tuple, prices: pd.DataFrame) -> dict:
+        """
+        solves the milp of all price steps in one solver call and returns the result of each step
+        """
+        T, steps = len(self.t), tuple(steps)
+        if (T, steps) not in self.models:
+            self.models[(T, steps)] = self._build_batch_model(T, steps)
+        model = self.models[(T, steps)]
+        self.prices = prices
+        keys, results = {}, {}
+        for i, step in enumerate(steps):
+            self.prices.loc[:, 'power'] = self.base_price.iloc[:T]['power'] + step
+            self._update_model(model=model.component(f'step_{i}'))
+            if self.cache is not None:
+                keys[step] = self._get_cache_key()
+                results[step] = self.cache.get(keys[step])
+        scale = self.generation_system['maxPower']
+        if keys and all(result is not None for result in results.values()):
+            return {step: self._scale_result(result, scale) for step, result in results.items()}
+
+        # -> without a gap, a relative mip gap of the sum would allow suboptimal steps next to the large ones
+        r = solve(self.opt, model, self.solver_type, mip_gap=0)
+        results = {step: self._get_result(r, model.component(f'step_{i}')) for i, step in enumerate(steps)}
+        for step, key in keys.items():
+            if results[step]['status'] in ('optimal', 'infeasible'):
+                self.cache.put(key, self._scale_result(results[step], 1 / scale))
+        return results
+
+    def _get_result(self, r, model: ConcreteModel) -> dict:
+        if (r.solver.status == SolverStatus.ok) & (r.solver.termination_condition == TerminationCondition.optimal):
+            return dict(status='optimal', power=np.asarray([model.p_out[t].value for t in self.t]),
+                        on=np.asarray([model.z[t].value for t in self.t]),
+                        start=np.asarray([model.v[t].value for t in self.t]), obj=value(model.obj))
+        status = 'infeasible' if r.solver.termination_condition == TerminationCondition.infeasible else r.solver
+        return dict(status=status, power=np.zeros(len(self.t)), on=np.zeros(len(self.t)),
+                    start=np.zeros(len(self.t)), obj=0)
+
+    def _set_results(self, step: int, result: dict) -> None:
         pwp = self.generation_system
         # -> output power
-        power = np.asarray([self.model.p_out[t].value for t in self.t])
+        power = np.asarray(result['power'], float)
         self.opt_results[step]['power'] = power
         self.opt_results[step]['power'][power < 0.1] = 0
 
@@ -165,12 +362,12 @@ class PowerPlant(EnergySystem):
         fl_prices = self.prices[str(pwp['fuel']).replace('_combined', '')].values
         self.opt_results[step]['fuel'] = power / pwp['eta'] * fl_prices
         # -> start costs
-        self.opt_results[step]['start'] = np.asarray([self.model.v[t].value * self.start_cost for t in self.t])
+        self.opt_results[step]['start'] = np.asarray(result['start'], float) * self.start_cost
         # -> profit
         pw_prices = self.prices['power'].values
         self.opt_results[step]['profit'] = pw_prices * power
         # -> sum cashflow
-        self.opt_results[step]['obj'] = value(self.model.obj)
+        self.opt_results[step]['obj'] = result['obj']
 
         if step == 0:
             self.cash_flow['fuel'] = self.opt_results[step]['fuel']
@@ -187,91 +384,127 @@ class PowerPlant(EnergySystem):
 
         self.set_parameter(date, weather, prices)
         self.prevented_start = dict(prevent=False, hours=np.zeros(self.T, float), delta=0)
+        self.solutions = {}
         steps = steps or self.steps
         prices_24h = self.base_price.iloc[:24, :].copy()
         prices_48h = self.base_price.iloc[:48, :].copy()
+        batch = self._solve_steps(steps, prices_24h) if self.batch_steps and self.solver_type != 'dp' else {}
 
         for step in steps:
             self.prices = prices_24h
             self.prices.loc[:, 'power'] = self.base_price.iloc[:24]['power'] + step
-            self.build_model()
-            r = self.opt.solve(self.model)
-            if (r.solver.status == SolverStatus.ok) & (r.solver.termination_condition == TerminationCondition.optimal):
+            result = batch[step] if step in batch else self._solve()
+            if result['status'] == 'optimal':
                 log.info(f'find optimal solution in step: {step}')
 
-                self._set_results(step=step)
+                self._set_results(step=step, result=result)
+                self.solutions[step] = result
 
                 if self.opt_results[step]['power'][-1] == 0 and step == 0:
-                    initial_p0 = self.generation_system['P0']
-                    initial_on = self.generation_system['on']
-                    initial_off = self.generation_system['off']
-                    all_off = np.argwhere(self.opt_results[step]['power'] == 0).flatten()
-                    last_on = np.argwhere(self.opt_results[step]['power'] > 0).flatten()
-                    last_on = last_on[-1] if len(last_on) > 0 else 0
-                    prevented_off_hours = list(all_off[all_off > last_on])
-                    self.prices.loc[:, 'power'] = self.base_price['power'].values[24:]
-
-                    self.generation_system['P0'] = 0
-                    self.generation_system['off'] = len(prevented_off_hours)
-                    self.generation_system['on'] = 0
-                    self.build_model()
-                    self.opt.solve(self.model)
-                    total_obj_single = self.opt_results[step]['obj'] + value(self.model.obj)
-                    power_day1 = list(self.opt_results[step]['power'])
-                    power_day2 = [self.model.p_out[t].value for t in self.t]
-                    total_single_power = np.asarray(power_day1 + power_day2)
-
-                    all_off = np.argwhere(total_single_power == 0).flatten()
-                    prevented_off_hours = np.asarray(list(all_off[all_off > last_on]))
-
-                    self.generation_system['P0'] = initial_p0
-                    self.generation_system['off'] = initial_off
-                    self.generation_system['on'] = initial_on
-
-                    self.t = np.arange(48)
-                    self.prices = prices_48h
-                    self.prices.loc[:, 'power'] = self.base_price.iloc[:48]['power']
-                    self.build_model()
-                    self.opt.solve(self.model)
-                    power_check = np.asarray([self.model.p_out[t].value for t in self.t])
-                    prevent_start = all(power_check[prevented_off_hours] > 0)
-                    delta = value(self.model.obj) - total_obj_single
-                    if prevent_start and delta > 0:
-                        delta /= sum(power_check[prevented_off_hours])
-                        prevent_start_today = prevented_off_hours[prevented_off_hours < self.T]
-                        self.prevented_start = dict(prevent=True, hours=prevent_start_today, delta=delta)
-                        prevent_start_tomorrow = prevented_off_hours[prevented_off_hours >= self.T] - self.T
-                        self.reduction_next_day[self.date.date()] = (delta, prevent_start_tomorrow)
-
-                    self.t = np.arange(self.T)
-
-            elif r.solver.termination_condition == TerminationCondition.infeasible:
+                    self._set_prevented_start(step, prices_48h)
+
+            elif result['status'] == 'infeasible':
                 log.error(f'infeasible model in step: {step}')
                 for key in ['power', 'emission', 'fuel', 'start', 'profit']:
                     self.opt_results[step][key] = np.zeros(self.T)
                 self.opt_results[step]['obj'] = 0
             else:
                 print(step)
-                log.error(r.solver)
+                log.error(result['status'])
                 for key in ['power', 'emission', 'fuel', 'start', 'profit']:
                     self.opt_results[step][key] = np.zeros(self.T)
                 self.opt_results[step]['obj'] = 0
 
         return self.power
 
+    def _get_run_through_value(self, on_hours: np.array) -> float:
+        """
+        objective of the best 48 hour schedule, which runs in the on_hours, solved by the dynamic programming
+        """
+        pwp = self.generation_system
+        prices = self.base_price.iloc[:48]
+        result = solve_unit_commitment(prices['power'].values, prices[str(pwp['fuel']).replace('_combined', '')].values,
+                                       prices['co'].values, pwp, self.start_cost, on_hours=on_hours)
+        return result['obj'] if result['status'] == 'optimal' else -np.inf
+
+    def _set_prevented_start(self, step: int, prices_48h: pd.DataFrame) -> None:
+        """
+        compares the day ahead schedule followed by a restart on the next day with the 48 hour schedule,
+        a start is prevented if the plant runs through the off hours and earns more than with the restart
+        """
+        try:
+            all_off = np.argwhere(self.opt_results[step]['power'] == 0).flatten()
+            last_on = np.argwhere(self.opt_results[step]['power'] > 0).flatten()
+            last_on = last_on[-1] if len(last_on) > 0 else 0
+            prevented_off_hours = all_off[all_off > last_on]
+
+            # -> a start is only prevented by a 48 hour schedule, which runs in the off hours, the next day earns
+            #    at least 0 by staying off, if running through can not earn more both solves are skipped
+            run_through = self._get_run_through_value(prevented_off_hours)
+            if run_through < self.opt_results[step]['obj'] - 1e-6 * max(1, abs(self.opt_results[step]['obj'])):
+                return
+
+            initial_p0 = self.generation_system['P0']
+            initial_on = self.generation_system['on']
+            initial_off = self.generation_system['off']
+            self.prices.loc[:, 'power'] = self.base_price['power'].values[24:]
+
+            self.generation_system['P0'] = 0
+            self.generation_system['off'] = len(prevented_off_hours)
+            self.generation_system['on'] = 0
+            result_day2 = self._solve()
+            total_obj_single = self.opt_results[step]['obj'] + result_day2['obj']
+            power_day1 = list(self.opt_results[step]['power'])
+            power_day2 = list(result_day2['power'])
+            total_single_power = np.asarray(power_day1 + power_day2)
+
+            all_off = np.argwhere(total_single_power == 0).flatten()
+            prevented_off_hours = np.asarray(list(all_off[all_off > last_on]))
+
+            self.generation_system['P0'] = initial_p0
+            self.generation_system['off'] = initial_off
+            self.generation_system['on'] = initial_on
+
+            # -> same check with the off hours of the next day
+            run_through = self._get_run_through_value(prevented_off_hours)
+            if run_through < total_obj_single - 1e-6 * max(1, abs(total_obj_single)):
+                return
+
+            self.t = np.arange(48)
+            self.prices = prices_48h
+            self.prices.loc[:, 'power'] = self.base_price.iloc[:48]['power']
+            result_48h = self._solve()
+            power_check = np.asarray(result_48h['power'])
+            prevent_start = all(power_check[prevented_off_hours] > 0)
+            delta = result_48h['obj'] - total_obj_single
+            if prevent_start and delta > 0:
+                delta /= sum(power_check[prevented_off_hours])
+                prevent_start_today = prevented_off_hours[prevented_off_hours < self.T]
+                self.prevented_start = dict(prevent=True, hours=prevent_start_today, delta=delta)
+                prevent_start_tomorrow = prevented_off_hours[prevented_off_hours >= self.T] - self.T
+                self.reduction_next_day[self.date.date()] = (delta, prevent_start_tomorrow)
+        finally:
+            # -> the 48 hour prices are left on every path as for the 48 hour solve
+            self.t = np.arange(self.T)
+            self.prices = prices_48h
+            self.prices.loc[:, 'power'] = self.base_price.iloc[:48]['power']
+
     def optimize_post_market(self, committed_power: np.array, power_prices: np.array = None) -> np.array:
         if power_prices is not None:
             self.prices['power'].values[:len(power_prices)] = power_prices
-        self.build_model(committed_power)
-        r = self.opt.solve(self.model)
+        # -> no solve if the committed power is a day ahead solution, which is still optimal,
+        #    otherwise the closest day ahead solution is the warm start of the milp
+        result = self._get_committed_result(committed_power) if committed_power is not None else None
+        if result is None:
+            result = self._solve(committed_power, start=self._get_closest_solution(committed_power))
 
-        if (r.solver.status == SolverStatus.ok) & (r.solver.termination_condition == TerminationCondition.optimal):
+        if result['status'] == 'optimal':
             log.info(f'find optimal solution in step: dayAhead adjustment')
-            self._set_results(step=0)
+            self._set_results(step=0, result=result)
             running_since, off_since = 0, 0
             for t in self.t:
                 # find count of last 1s and 0s
-                if self.model.z[t].value > 0:
+                if result['on'][t] > 0:
                     running_since += 1
                     off_since = 0
                 else:
@@ -280,12 +513,12 @@ class PowerPlant(EnergySystem):
 
             last_power = self.power[-1]
 
-        elif r.solver.termination_condition == TerminationCondition.infeasible:
+        elif result['status'] == 'infeasible':
             log.error(f'infeasible model in step: dayAhead adjustment')
             running_since, off_since = 1, 0
             last_power = self.generation_system['minPower']
         else:
-            log.error(r.solver)
+            log.error(result['status'])
             running_since, off_since = 1, 0
             last_power = self.generation_system['minPower']
 
@@ -295,38 +528,71 @@ class PowerPlant(EnergySystem):
 
         return self.power.copy()
 
+    def __getstate__(self):
+        # -> the in process solver can not be pickled, it is created again after unpickling
+        state = self.__dict__.copy()
+        state['opt'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.solver_type != 'dp':
+            self.solver_type, self.opt = get_solver(self.solver_type)
+
+    def get_state(self) -> dict:
+        """
+        returns the results and the state after an optimization as numpy arrays and numbers
+        """
+        return dict(opt_results=self.opt_results, prevented_start=self.prevented_start,
+                    reduction_next_day=self.reduction_next_day, generation_system=self.generation_system,
+                    generation=self.generation, demand=self.demand, cash_flow=self.cash_flow, power=self.power,
+                    prices=self.prices.to_numpy())
+
+    def set_state(self, state: dict) -> None:
+        """
+        sets the results and the state of an optimization, which was done by another process
+        """
+        for key in ['opt_results', 'prevented_start', 'reduction_next_day', 'generation_system',
+                    'generation', 'demand', 'cash_flow', 'power']:
+            setattr(self, key, state[key])
+        prices = state['prices']
+        self.prices = pd.DataFrame(prices, index=self.base_price.index[:len(prices)], columns=self.base_price.columns)
+
     def get_clean_spread(self, prices: pd.DataFrame = None) -> float:
         pwp, prices = self.generation_system, prices or self.prices
         return 1 / pwp['eta'] * (prices[pwp['fuel'].replace('_combined', '')].mean() + pwp['chi'] * prices['co'].mean())
 
-    def get_ask_orders(self, price: float = -0.5) -> pd.DataFrame:
-
-        def get_cost(p: float, t: int):
-            f = self.prices[self.generation_system['fuel'].replace('_combined', '')].values[t]
-            e = self.prices['co'].values[t]
-            return (p / self.generation_system['eta']) * (f + e * self.generation_system['chi'])
+    def _get_maximal_profit_hours(self) -> list:
+        # -> first window of runTime hours with the highest revenue at minPower
+        run_time, min_power = self.generation_system['runTime'], self.generation_system['minPower']
+        start_hour = 0
+        if 0 < run_time < self.T:
+            windows = np.lib.stride_tricks.sliding_window_view(self.base_price['power'].values[:self.T - 1], run_time)
+            profits = np.sum(min_power * windows, axis=1)
+            if profits.max() > 0:
+                start_hour = int(np.argmax(profits))
+        return [*range(start_hour, min(start_hour + run_time, self.T))]
+
+    def get_order_arrays(self) -> dict:
+        """
+        builds the linked orders from the optimization results of the steps,
+        returns numpy arrays of block_id, hour, price, volume and link (NO_LINK without a parent block)
+        """
+        pwp = self.generation_system
+        eta, min_power = pwp['eta'], pwp['minPower']
+        # -> fuel and emission costs per kW fuel input in each hour
+        costs = self.prices[pwp['fuel'].replace('_combined', '')].values + self.prices['co'].values * pwp['chi']
 
         def get_marginal(p0: float, p1: float, t: int):
             if p0 == p1:
                 return 1, 0
-            marginal = (get_cost(p=p0, t=t) - get_cost(p=p1, t=t)) / (p0-p1)
-            return marginal, p1-p0
-
-        def get_maximal_profit_hours():
-            max_profit, start_hour = 0, 0
-            run_time = self.generation_system['runTime']
-            for t in range(self.T - run_time):
-                p = np.sum(self.generation_system['minPower'] * self.base_price['power'][t:t + run_time])
-                if p > max_profit:
-                    max_profit = p
-                    start_hour = t
-            return [*range(start_hour, min(start_hour + run_time, self.T))]
+            return ((p0 / eta) * costs[t] - (p1 / eta) * costs[t]) / (p0 - p1), p1 - p0
 
+        # -> orders by (block_id, hour), a later order replaces an earlier one with the same key
         order_book, last_power, block_number = {}, np.zeros(self.T), 0
         links = {i: None for i in self.t}
 
-        min_power = self.generation_system['minPower']
-        max_hours = get_maximal_profit_hours()
+        max_hours = self._get_maximal_profit_hours()
         start_cost = self.start_cost / (min_power * min_power)
 
         yesterday = self.date.date() - td(days=1)
@@ -338,46 +604,43 @@ class PowerPlant(EnergySystem):
 
             # -> get optimization result for key (block) and step
             result = self.opt_results[step]
+            power = result['power']
             # if we are in hour 0
-            if any(result['power'] > 0) and block_number == 0:
+            if block_number == 0 and (power > 0).any():
                 # pwp is on and must runtime is reached
-                if result['power'][0] > 0 and self.generation_system['P0'] > 0:
+                if power[0] > 0 and pwp['P0'] > 0:
                     reduction = 0
-                    hours_needed_to_run = (self.generation_system['runTime'] - self.generation_system['on'])
+                    hours_needed_to_run = (pwp['runTime'] - pwp['on'])
                     hours = [*range(hours_needed_to_run)] if hours_needed_to_run > 0 else [0]
                     # -> a start is prevented
                     if yesterday in self.reduction_next_day.keys():
                         reduction, hours = self.reduction_next_day[yesterday]
                         self.reduction_next_day = dict()
-                elif self.generation_system['P0'] == 0:
-                    # pwp is off
-                    hours = max_hours
-                    reduction = -start_cost
                 else:
-                    # pwp was on but turned off in first hour
+                    # pwp is off or was on but turned off in first hour
                     hours = max_hours
                     reduction = -start_cost
 
                 for hour in hours:
-                    price, power = get_marginal(p0=last_power[hour], p1=min_power, t=hour)
-                    order_book.update({(block_number, hour, self.name): (price - reduction, power, -1)})
+                    price, volume = get_marginal(p0=last_power[hour], p1=min_power, t=hour)
+                    order_book[(block_number, hour)] = (price - reduction, volume, -1)
                     links[hour] = block_number
                     last_power[hour] += min_power
 
                 block_number += 1  # -> increment block number
 
             # -> stack on top
-            # XXX bitwise and operator
-            hours = np.argwhere((result['power'] - last_power > 0.1) & (last_power > 0)).flatten()
+            hours = np.flatnonzero((power - last_power > 0.1) & (last_power > 0))
             for hour in hours:
-                price, power = get_marginal(p0=last_power[hour], p1=result['power'][hour], t=hour)
-                order_book.update({(block_number, hour, self.name): (price, power, links[hour])})
-                last_power[hour] += power
+                price, volume = get_marginal(p0=last_power[hour], p1=power[hour], t=hour)
+                order_book[(block_number, hour)] = (price, volume, links[hour])
+                last_power[hour] += volume
                 links[hour] = block_number
                 block_number += 1
             # -> stack before
-            hours = np.argwhere((result['power'] - last_power > 0.1) & (last_power == 0)).flatten()
-            first_on_hour = np.argwhere(last_power == 0)[-1][0] + 1 if len(np.argwhere(last_power == 0)) else 0
+            hours = np.flatnonzero((power - last_power > 0.1) & (last_power == 0))
+            off_hours = np.flatnonzero(last_power == 0)
+            first_on_hour = off_hours[-1] + 1 if len(off_hours) else 0
             first_on_hour = 0 if first_on_hour > 23 else first_on_hour
             first_hours = list(hours[hours < first_on_hour])
             # -> no gap between current (mother) block and new block on the left side
@@ -387,10 +650,10 @@ class PowerPlant(EnergySystem):
                 if delta_hour == 1:
                     first_hours.reverse()
                     for hour in first_hours:
-                        if links[hour+1] is not None:
-                            price, power = get_marginal(p0=last_power[hour], p1=result['power'][hour], t=hour)
-                            order_book.update({(block_number, hour, self.name): (price, power, links[hour+1])})
-                            last_power[hour] += power
+                        if links[hour + 1] is not None:
+                            price, volume = get_marginal(p0=last_power[hour], p1=power[hour], t=hour)
+                            order_book[(block_number, hour)] = (price, volume, links[hour + 1])
+                            last_power[hour] += volume
                             links[hour] = block_number
                             block_number += 1
                             set_hours += [hour]
@@ -399,99 +662,93 @@ class PowerPlant(EnergySystem):
                 first_hours = list(set(first_hours) - set(set_hours))
                 if delta_hour > 1 or len(first_hours) > 0:
                     total_start_cost = result['start'][first_hours[0]]
-                    result['start'][first_hours] = total_start_cost / (self.generation_system['minPower'] *
-                                                                       len(first_hours))
+                    result['start'][first_hours] = total_start_cost / (min_power * len(first_hours))
                     # -> add new mother block before another mother block
                     # -> this means that a new start is added before a start in a previous step
                     for hour in first_hours:
-                        price, power = get_marginal(p0=last_power[hour], p1=self.generation_system['minPower'], t=hour)
-                        order_book.update({(block_number, hour, self.name): (price, power, -1)})
-                        last_power[hour] += self.generation_system['minPower']
+                        price, volume = get_marginal(p0=last_power[hour], p1=min_power, t=hour)
+                        order_book[(block_number, hour)] = (price, volume, -1)
+                        last_power[hour] += min_power
                         links[hour] = block_number
                     block_number += 1
 
                     for hour in first_hours:
-                        if result['power'][hour] > last_power[hour]:
-                            price, power = get_marginal(p0=last_power[hour], p1=result['power'][hour], t=hour)
-                            order_book.update({(block_number, hour, self.name): (price, power, links[hour - 1])})
-                            last_power[hour] += power
+                        if power[hour] > last_power[hour]:
+                            price, volume = get_marginal(p0=last_power[hour], p1=power[hour], t=hour)
+                            order_book[(block_number, hour)] = (price, volume, links[hour - 1])
+                            last_power[hour] += volume
                             links[hour] = block_number
                             block_number += 1
 
             # -> stack behind
-            last_on_hour = np.argwhere(last_power > 0)[-1][0] if len(np.argwhere(last_power > 0)) else self.t[-1]
-            last_on_hours = list(hours[hours > last_on_hour])
-            for hour in last_on_hours:
-                if links[hour-1] is None:
+            on_hours = np.flatnonzero(last_power > 0)
+            last_on_hour = on_hours[-1] if len(on_hours) else self.t[-1]
+            for hour in hours[hours > last_on_hour]:
+                if links[hour - 1] is None:
                     # we need to start mid day
-                    if all(result['power'][max_hours] > 0):
+                    if all(power[max_hours] > 0):
                         # pwp is on and must runtime is not reached or it is turned off and started later
                         for t in max_hours:
-                            price, power = get_marginal(p0=last_power[t], p1=min_power, t=t)
-                            order_book.update({(block_number, t, self.name): (price + start_cost, power, -1)})
+                            price, volume = get_marginal(p0=last_power[t], p1=min_power, t=t)
+                            order_book[(block_number, t)] = (price + start_cost, volume, -1)
                             links[t] = block_number
                             last_power[t] += min_power
                     block_number += 1
                     index -= 1
                     break
                 else:
-                    if result['power'][hour] > last_power[hour]:
-                        price, power = get_marginal(p0=last_power[hour], p1=result['power'][hour], t=hour)
-                        order_book.update({(block_number, hour, self.name): (price, power, links[hour-1])})
-                        last_power[hour] += power
+                    if power[hour] > last_power[hour]:
+                        price, volume = get_marginal(p0=last_power[hour], p1=power[hour], t=hour)
+                        order_book[(block_number, hour)] = (price, volume, links[hour - 1])
+                        last_power[hour] += volume
                         links[hour] = block_number
                         block_number += 1
             index += 1
-        if order_book:
-            df = pd.DataFrame.from_dict(order_book, orient='index')
-        else:
-            # if nothing in self.portfolio.energy_systems
-            df = pd.DataFrame(columns=['price', 'volume', 'link', 'type'])
 
-        df['type'] = 'generation'
-        df.columns = ['price', 'volume', 'link', 'type']
-        df.index = pd.MultiIndex.from_tuples(df.index, names=['block_id', 'hour', 'name'])
+        keys = np.array(list(order_book.keys()), dtype=int).reshape(-1, 2)
+        values = np.array([(price, volume, NO_LINK if link is None else link)
+                           for price, volume, link in order_book.values()], dtype=float).reshape(-1, 3)
+        orders = dict(block_id=keys[:, 0], hour=keys[:, 1], price=values[:, 0], volume=values[:, 1],
+                      link=values[:, 2].astype(int))
 
         if self.prevented_start['prevent']:
-            hours = self.prevented_start['hours']
-
-            def get_marginals(x):
-                return get_marginal(p0=0, p1=self.generation_system['minPower'], t=x)
-            min_price = np.mean([price for price, _ in map(get_marginals, hours)]) - self.prevented_start['delta']
-
-            # -> volume and price which is already in orderbook
-            normal_volume = df.loc[:, df.index.get_level_values('hour').isin(hours), :]['volume']
-            normal_price = df.loc[:, df.index.get_level_values('hour').isin(hours), :]['price']
-            # -> drop volume and price in these hours and build new orders
-            df = df.loc[~df.index.get_level_values('hour').isin(hours)]
-            # -> get last block to link on
-            last_block = max(df.index.get_level_values('block_id').values) if len(df) > 0 else -1
-
-            # -> build new orders
-            prev_order = {}
-            block_number = last_block + 1
-            # -> for each hour build one block with minPower
-            for hour in hours:
-                prev_order[(block_number, hour, self.name)] = (min_price, self.generation_system['minPower'],
-                                                               last_block, 'generation')
-            last_block = block_number
-            block_number += 1
-            for index in normal_volume.index:
-                vol = normal_volume.loc[index] - self.generation_system['minPower']
-                prc = normal_price.loc[index]
-                _, hour, _ = index
-                if vol > 0:
-                    prev_order[(block_number, hour, self.name)] = (prc, vol, last_block, 'generation')
-                    block_number += 1
-
-            df_prev = pd.DataFrame.from_dict(prev_order, orient='index')
-            df_prev.columns = ['price', 'volume', 'link', 'type']
-            df_prev.index = pd.MultiIndex.from_tuples(df_prev.index, names=['block_id', 'hour', 'name'])
-            # -> limit to market price range
-            df = pd.concat([df, df_prev], axis=0)
-            df.loc[df['price'] < -500/1e3, 'price'] = -500/1e3
+            orders = self._get_prevented_start_orders(orders, get_marginal)
+
+        return orders
+
+    def _get_prevented_start_orders(self, orders: dict, get_marginal) -> dict:
+        # -> replaces the orders in the hours of a prevented start with a block of minPower at the reduced price
+        #    and the remaining volume of each order linked to it
+        hours, min_power = self.prevented_start['hours'], self.generation_system['minPower']
+        min_price = np.mean([get_marginal(p0=0, p1=min_power, t=hour)[0] for hour in hours])
+        min_price -= self.prevented_start['delta']
+
+        prevented = np.isin(orders['hour'], hours)
+        kept = {key: values[~prevented] for key, values in orders.items()}
+        last_block = kept['block_id'].max() if len(kept['block_id']) > 0 else -1
+
+        volume = orders['volume'][prevented] - min_power
+        remaining = volume > 0
+        num_hours, num_remaining = len(hours), int(remaining.sum())
+        new = dict(block_id=np.concatenate([np.full(num_hours, last_block + 1),
+                                            last_block + 2 + np.arange(num_remaining)]),
+                   hour=np.concatenate([np.asarray(hours, dtype=int), orders['hour'][prevented][remaining]]),
+                   price=np.concatenate([np.full(num_hours, min_price), orders['price'][prevented][remaining]]),
+                   volume=np.concatenate([np.full(num_hours, min_power, dtype=float), volume[remaining]]),
+                   link=np.concatenate([np.full(num_hours, last_block),
+                                        np.full(num_remaining, last_block + 1)]).astype(int))
+        orders = {key: np.concatenate([kept[key], new[key]]) for key in kept}
+        # -> limit to market price range
+        orders['price'][orders['price'] < -500/1e3] = -500/1e3
+        return orders
 
-        return df
+    def get_ask_orders(self, price: float = -0.5) -> pd.DataFrame:
+        orders = self.get_order_arrays()
+        index = pd.MultiIndex.from_arrays([orders['block_id'], orders['hour'],
+                                           np.full(len(orders['hour']), self.name, dtype=object)],
+                                          names=['block_id', 'hour', 'name'])
+        return pd.DataFrame(dict(price=orders['price'], volume=orders['volume'], link=orders['link'],
+                                 type='generation'), index=index)
 
     def __str__(self):
         status = f'power plant: {self.generation_system}, \n\n' \
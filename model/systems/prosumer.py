@@ -1,6 +1,7 @@
 # third party modules
 import numpy as np
 import pandas as pd
+from numba import njit
 from pvlib.pvsystem import PVSystem
 # model modules
 from systems.basic_system import EnergySystem
@@ -13,6 +14,43 @@ def get_solar_generation(generation_system: PVSystem, weather: pd.DataFrame) ->
     return np.asarray(power).flatten()
 
 
+@njit(cache=True)
+def get_battery_use(residual: np.array, v0: np.array, v_max: np.array, efficiency: np.array) -> tuple:
+    """
+    simulates the home batteries of a fleet of prosumers with the residual (systems x T) in [kW],
+    returns the grid use and the volume (systems x T) and the volume at the end of the day of each battery
+    """
+    grid_use, volume = np.zeros(residual.shape), np.zeros(residual.shape)
+    vt = v0.astype(np.float64)
+    for i in range(residual.shape[0]):
+        eta, v = efficiency[i], vt[i]
+        for t in range(residual.shape[1]):
+            r = residual[i, t]
+            if r >= 0:
+                # -> storage is empty or its volume is smaller than the residual: use the rest volume
+                if v == 0 or v * eta <= r:
+                    grid_use[i, t] = r - v * eta
+                    v = 0.0
+                # -> storage volume covers the residual
+                else:
+                    v -= r / eta
+                    volume[i, t] = v
+            else:
+                # -> storage is full -> no usage
+                if v == v_max[i]:
+                    grid_use[i, t] = r
+                # -> surplus fits into the storage
+                elif v - r * eta <= v_max[i]:
+                    v -= r * eta
+                # -> surplus is larger than the free volume
+                else:
+                    grid_use[i, t] = r + (v_max[i] - v) / eta
+                    v = v_max[i]
+                volume[i, t] = v
+        vt[i] = v
+    return grid_use, volume, vt
+
+
 class Prosumer(EnergySystem):
 
     def __init__(self, T: int, maxPower: float, demandP: float = 0, azimuth: int = 180, tilt: int = 35,
@@ -21,13 +59,19 @@ class Prosumer(EnergySystem):
 
         self.generation_system = PVSystem(module_parameters=dict(pdc0=maxPower), surface_tilt=tilt,
                                           surface_azimuth=azimuth)
+        # -> set by the PVFleet of a portfolio, which computes the irradiance once per orientation
+        self.solar_generation = None
         self.storage_system = None
         if storage:
             self.storage_system = dict(v0=kwargs['V0'], v_max=kwargs['VMax'], vt=np.zeros(self.T),
-                                       efficiency=kwargs['eta'], maxPower=kwargs['powerPower'])
+                                       efficiency=kwargs['eta'], maxPower=kwargs['batPower'])
+        # -> in a DemandPortfolio the batteries of all prosumers are simulated at once
+        self.simulate_storage = True
 
     def _get_generation(self) -> np.array:
-        if self.fuel_type == 'solar':
+        if self.fuel_type == 'solar' and self.solar_generation is not None:
+            power = self.solar_generation
+        elif self.fuel_type == 'solar':
             power = get_solar_generation(self.generation_system, weather=self.weather)
         else:
             power = np.zeros(self.T)
@@ -40,55 +84,23 @@ class Prosumer(EnergySystem):
     def _use_storage(self) -> np.array:
 
         residual = self.demand['power'] - self.generation['solar']
+        grid_use, volume, vt = get_battery_use(residual.reshape((1, -1)), np.asarray([self.storage_system['v0']]),
+                                               np.asarray([self.storage_system['v_max']]),
+                                               np.asarray([self.storage_system['efficiency']]))
+        self.set_storage_result(grid_use[0], volume[0], vt[0])
 
-        vt = self.storage_system['v0']
-
-        grid_use, volume = [], []
-        for r in residual:
-            # ----- residual > 0 -----
-            # case 1: storage is empty -> no usage
-            if (r >= 0) & (vt == 0):
-                grid_use.append(r)
-                volume.append(0)
-                continue
-            # case 2: storage volume < residual -> use rest volume
-            if (r >= 0) & (vt * self.storage_system['efficiency'] <= r):
-                grid_use.append(r - vt * self.storage_system['efficiency'])
-                vt = 0
-                volume.append(0)
-                continue
-            # case 3: storage volume > residual -> use volume
-            if (r >= 0) & (vt * self.storage_system['efficiency'] >= r):
-                grid_use.append(0)
-                vt -= r / self.storage_system['efficiency']
-                volume.append(vt)
-                continue
-            # ----- residual < 0 -----
-            # case 4: storage volume = vmax -> no usage
-            if (r < 0) & (vt == self.storage_system['v_max']):
-                grid_use.append(r)
-                volume.append(self.storage_system['v_max'])
-                continue
-            # case 5: v_max - storage volume < residual -> use rest volume
-            if (r < 0) & (vt - r * self.storage_system['efficiency'] <= self.storage_system['v_max']):
-                grid_use.append(0)
-                vt -= r * self.storage_system['efficiency']
-                volume.append(vt)
-                continue
-            # case 6: v_max - storage volume > residual -> use volume
-            if (r < 0) & (vt - r * self.storage_system['efficiency'] >= self.storage_system['v_max']):
-                grid_use.append(r + (self.storage_system['v_max'] - vt) / self.storage_system['efficiency'])
-                vt = self.storage_system['v_max']
-                volume.append(vt)
-                continue
-
+    def set_storage_result(self, grid_use: np.array, volume: np.array, vt: float) -> None:
         # set battery parameter
         self.storage_system['v0'] = vt
-        self.storage_system['vt'] = np.asarray(volume)
+        self.storage_system['vt'] = volume
         self.volume = self.storage_system['vt']
 
+        # -> the battery covers (> 0) or stores (< 0) the difference of the residual and the grid usage
+        self.generation['storage'] = self.demand['power'] - self.generation['solar'] - grid_use
+        self.generation['total'] += self.generation['storage']
+
         # grid usage in [kW]
-        self.power = np.asarray(grid_use, float).reshape((-1,))
+        self.power = grid_use
 
     def optimize(self, date: pd.Timestamp = None, weather: pd.DataFrame = None, prices: pd.DataFrame = None,
                  steps=None) -> np.array:
@@ -101,7 +113,7 @@ class Prosumer(EnergySystem):
         self.demand['power'] = self._get_demand()
         self.generation['solar'] = self._get_generation()
         self._set_total_generation()
-        if self.storage_system is None:
+        if self.storage_system is None or not self.simulate_storage:
             self.power = self.demand['power'] - self.generation['solar']
         else:
             self._use_storage()
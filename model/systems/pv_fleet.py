@@ -0,0 +1,55 @@
+# third party modules
+import numpy as np
+import pandas as pd
+from pvlib.pvsystem import PVSystem
+
+
+class PVFleet:
+
+    def __init__(self, T: int = 24):
+        """
+        Photovoltaic systems of a portfolio, which share the weather.
+        The irradiance is computed once per orientation and scaled by the peak power of each system.
+        """
+        self.T = T
+        # -> (azimuth, tilt) of each orientation and its row in the irradiance
+        self.orientations = {}
+        self.generation_systems = []
+        # -> name, orientation and peak power of each system
+        self.rows = {}
+        self.orientation = []
+        self.pdc0 = []
+
+    def add_system(self, name, generation_system: PVSystem) -> None:
+        array = generation_system.arrays[0]
+        key = (array.mount.surface_azimuth, array.mount.surface_tilt)
+        if key not in self.orientations:
+            self.orientations[key] = len(self.generation_systems)
+            self.generation_systems.append(PVSystem(module_parameters=dict(pdc0=1), surface_tilt=key[1],
+                                                    surface_azimuth=key[0]))
+        self.rows[name] = len(self.pdc0)
+        self.orientation.append(self.orientations[key])
+        self.pdc0.append(array.module_parameters['pdc0'])
+
+    def get_irradiance(self, weather: pd.DataFrame) -> np.array:
+        # -> plane of array irradiance in [W/m²] of each orientation (orientations x T)
+        irradiance = [system.get_irradiance(solar_zenith=weather['zenith'], solar_azimuth=weather['azimuth'],
+                                            dni=weather['dni'], ghi=weather['ghi'], dhi=weather['dhi'])['poa_global']
+                      for system in self.generation_systems]
+        return np.asarray(irradiance, dtype=float).reshape((len(self.generation_systems), -1))
+
+    def get_generation(self, weather: pd.DataFrame) -> np.array:
+        """
+        :return: generation of each system in [kW] (systems x T)
+        """
+        if not self.pdc0:
+            return np.zeros((0, self.T))
+        irradiance = self.get_irradiance(weather)
+        return irradiance[np.asarray(self.orientation)] * np.asarray(self.pdc0, dtype=float)[:, None] / 1e3
+
+    def set_generation(self, models: list, weather: pd.DataFrame) -> None:
+        # -> the models look up their generation instead of computing their irradiance
+        generation = self.get_generation(weather)
+        for model in models:
+            if model.name in self.rows:
+                model.solar_generation = generation[self.rows[model.name]]
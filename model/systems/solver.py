@@ -0,0 +1,88 @@
+# third party modules
+import logging
+from functools import lru_cache
+from pyomo.environ import SolverFactory, minimize
+
+log = logging.getLogger('solver')
+
+# -> pyomo plugin names of the supported solvers, highs runs in process via highspy and the appsi interface,
+#    glpk and cbc write the model to a file and solve it in a subprocess
+SOLVER_NAMES = {'gurobi': 'gurobi', 'highs': 'appsi_highs', 'glpk': 'glpk', 'cbc': 'cbc'}
+# -> solver specific names of the mip gap and time limit option
+OPTION_NAMES = {'gurobi': dict(mip_gap='MIPGap', time_limit='TimeLimit'),
+                'highs': dict(mip_gap='mip_rel_gap', time_limit='time_limit'),
+                'glpk': dict(mip_gap='mipgap', time_limit='tmlim'),
+                'cbc': dict(mip_gap='ratioGap', time_limit='seconds')}
+FALLBACK_SOLVERS = ['highs', 'glpk', 'cbc']
+# -> solvers of the appsi interface, which keep the model in the solver and only update changed parameters
+APPSI_SOLVERS = ['highs']
+
+
+def get_solver_factory(solver_type: str):
+    if solver_type == 'gurobi':
+        return SolverFactory(SOLVER_NAMES[solver_type], solver_io='python')
+    return SolverFactory(SOLVER_NAMES[solver_type])
+
+
+@lru_cache(maxsize=None)
+def is_available(solver_type: str) -> bool:
+    try:
+        return bool(get_solver_factory(solver_type).available(exception_flag=False))
+    except Exception:
+        return False
+
+
+@lru_cache(maxsize=None)
+def get_available_solver(solver_type: str, fallbacks: tuple) -> str:
+    candidates = [solver_type] + [solver for solver in fallbacks if solver != solver_type]
+    for solver in candidates:
+        if solver not in SOLVER_NAMES:
+            log.error(f'unknown solver {solver} - use one of {list(SOLVER_NAMES.keys())}')
+        elif is_available(solver):
+            if solver != solver_type:
+                log.warning(f'solver {solver_type} is not available - using {solver} instead')
+            return solver
+    raise RuntimeError(f'none of the solvers {candidates} is available')
+
+
+def get_solver(solver_type: str = 'highs', fallbacks: list = None) -> (str, object):
+    """
+    returns the name and the pyomo solver of the first available solver,
+    starting with solver_type and followed by the fallbacks (highs, glpk and cbc by default)
+    """
+    fallbacks = FALLBACK_SOLVERS if fallbacks is None else fallbacks
+    solver = get_available_solver(solver_type, tuple(fallbacks))
+    return solver, get_solver_factory(solver)
+
+
+def solve(opt, model, solver_type: str, mip_gap: float = None, time_limit: float = None, **kwargs):
+    """
+    solves the model with the solver of get_solver and returns the pyomo results,
+    the solution (and the duals of a model with a dual suffix) is only loaded if one was found,
+    so that an infeasible model does not raise with the appsi solvers
+    """
+    options = get_solver_options(solver_type, mip_gap=mip_gap, time_limit=time_limit)
+    if solver_type not in APPSI_SOLVERS:
+        return opt.solve(model, options=options, **kwargs)
+    r = opt.solve(model, options=options, load_solutions=False, **kwargs)
+    # -> best feasible objective, None if no solution was found
+    objective = r.problem.upper_bound if r.problem.sense == minimize else r.problem.lower_bound
+    if objective is not None:
+        opt.load_vars()
+        if hasattr(model, 'dual') and model.dual.import_enabled():
+            for constraint, dual in opt.get_duals().items():
+                model.dual[constraint] = dual
+    return r
+
+
+def get_solver_options(solver_type: str, mip_gap: float = None, time_limit: float = None) -> dict:
+    """
+    translates the mip gap and time limit into the option names of the solver
+    """
+    names = OPTION_NAMES[solver_type]
+    options = {}
+    if mip_gap is not None:
+        options[names['mip_gap']] = mip_gap
+    if time_limit is not None:
+        options[names['time_limit']] = time_limit
+    return options
@@ -1,11 +1,13 @@
 # third party modules
 import numpy as np
 import pandas as pd
-from pyomo.environ import Constraint, Var, Objective, SolverFactory, ConcreteModel, \
+from pyomo.environ import Constraint, Var, Objective, ConcreteModel, \
     Reals, Binary, maximize, quicksum, ConstraintList, value
 
 # model modules
 from systems.basic_system import EnergySystem
+from systems.solver import get_solver, solve
+from systems.storage_matrix import solve_price_variants, get_exclusive_order_book
 
 
 def shift(prc, type_: str = 'first'):
@@ -44,7 +46,8 @@ PRICE_FUNCS = {'left': lambda prc: np.roll(prc, -1),
 class Storage(EnergySystem):
 
     def __init__(self, T: int, unitID: str, eta_plus: float, eta_minus: float,
-                 V0: float, VMin: float, VMax: float, PPlus_max: float, PMinus_max: float, *args, **kwargs):
+                 V0: float, VMin: float, VMax: float, PPlus_max: float, PMinus_max: float, solver_type: str = 'highs',
+                 batch_variants: bool = False, *args, **kwargs):
         super().__init__(T)
 
         self.name = unitID
@@ -54,7 +57,20 @@ class Storage(EnergySystem):
         self.opt_results = {key: np.zeros(self.T) for key in PRICE_FUNCS.keys()}
 
         self.model = ConcreteModel()
-        self.opt = SolverFactory('glpk')
+        # -> highs runs in process and falls back to glpk or cbc if it is not available
+        self.solver_type, self.opt = get_solver(solver_type)
+        # -> solve the lp of all price functions at once instead of one pyomo model per price function
+        self.batch_variants = batch_variants
+
+    def __getstate__(self):
+        # -> the in process solver can not be pickled, it is created again after unpickling
+        state = self.__dict__.copy()
+        state['opt'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.solver_type, self.opt = get_solver(self.solver_type)
 
     def build_model(self, committed_power: np.array = None):
 
@@ -99,17 +115,34 @@ class Storage(EnergySystem):
 
         self.model.obj = Objective(expr=quicksum(profit[t] for t in self.t), sense=maximize)
 
+    def _get_volume(self, power: np.array, tol: float = 1e-6) -> np.array:
+        # -> volume of the storage for the power, None if the power is not feasible in the model
+        storage = self.storage_system
+        volume = storage['V0'] + np.cumsum(power)
+        scale = tol * max(storage['VMax'], 1)
+        feasible = (np.all(power >= -storage['P-_Max'] / storage['eta-'] - scale)
+                    and np.all(power <= storage['P+_Max'] * storage['eta+'] + scale)
+                    and np.all(volume >= -scale) and np.all(volume <= storage['VMax'] + scale)
+                    and abs(volume[-1] - storage['VMax'] / 2) <= scale)
+        return volume if feasible else None
+
     def optimize_post_market(self, committed_power: np.array, power_prices: np.array = None) -> np.array:
         if power_prices is not None:
             self.prices['power'].values[:len(power_prices)] = power_prices
 
-        self.build_model(-committed_power)
-        r = self.opt.solve(self.model)
-        power = np.asarray([-self.model.p_minus[t].value/self.storage_system['eta-']
-                            + self.model.p_plus[t].value * self.storage_system['eta+'] for t in self.t])
+        # -> a feasible committed power is optimal, a deviation gains at most the price but costs twice the price
+        volume = self._get_volume(-committed_power)
+        if volume is not None:
+            power = -np.asarray(committed_power, float)
+        else:
+            self.build_model(-committed_power)
+            r = solve(self.opt, self.model, self.solver_type)
+            power = np.asarray([-self.model.p_minus[t].value/self.storage_system['eta-']
+                                + self.model.p_plus[t].value * self.storage_system['eta+'] for t in self.t])
+            volume = np.asarray([self.model.volume[t].value for t in self.t])
 
         self.power = power
-        self.volume = np.asarray([self.model.volume[t].value for t in self.t])
+        self.volume = volume
         self.generation['total'][self.power < 0] = - self.power[self.power < 0]
         self.demand['power'][self.power > 0] = self.power[self.power > 0]
         self.generation['storage'] = self.power
@@ -119,6 +152,20 @@ class Storage(EnergySystem):
 
         return self.power
 
+    def get_price_variants(self, base_power: np.array) -> dict:
+        # -> prices of each price function, each function is applied to the base prices
+        return {key: np.array(func(base_power)[:self.T], dtype=float) for key, func in PRICE_FUNCS.items()}
+
+    def set_variant_result(self, key: str, p_plus: np.array, p_minus: np.array, volume: np.array) -> None:
+        power = -p_minus * self.storage_system['eta-'] + p_plus
+        self.opt_results[key] = power
+        if key == 'normal':
+            self.power = power
+            self.volume = np.asarray(volume)
+            self.generation['total'][self.power < 0] = - self.power[self.power < 0]
+            self.demand['power'][self.power > 0] = self.power[self.power > 0]
+            self.generation['storage'] = self.power
+
     def optimize(self, date: pd.Timestamp = None, weather: pd.DataFrame = None, prices: pd.DataFrame = None,
                  steps: tuple = None):
 
@@ -127,55 +174,24 @@ class Storage(EnergySystem):
 
         base_price = self.prices.copy()
 
+        if self.batch_variants and solve_price_variants([self], [self.get_price_variants(base_price['power'].values)]):
+            self.prices['power'] = base_price['power'].values
+            return self.power
+
         for key, func in PRICE_FUNCS.items():
             self.prices['power'] = func(base_price['power'].values)
             self.build_model()
-            r = self.opt.solve(self.model)
-            power = np.asarray([-self.model.p_minus[t].value * self.storage_system['eta-']
-                                + self.model.p_plus[t].value for t in self.t])
-            self.opt_results[key] = power
-            if key == 'normal':
-                self.power = power
-                self.volume = np.asarray([self.model.volume[t].value for t in self.t])
-                self.generation['total'][self.power < 0] = - self.power[self.power < 0]
-                self.demand['power'][self.power > 0] = self.power[self.power > 0]
-                self.generation['storage'] = self.power
+            r = solve(self.opt, self.model, self.solver_type)
+            self.set_variant_result(key, p_plus=np.asarray([self.model.p_plus[t].value for t in self.t]),
+                                    p_minus=np.asarray([self.model.p_minus[t].value for t in self.t]),
+                                    volume=np.asarray([self.model.volume[t].value for t in self.t]))
 
         self.prices['power'] = base_price['power'].values
 
         return self.power
 
     def get_exclusive_orders(self) -> pd.DataFrame:
-        total_orders = {}
-        block_id = 0
-        power_prices = self.prices['power'].copy()
-        for key, power in self.opt_results.items():
-            prc = np.zeros(self.T)
-            bid_hours = np.argwhere(power < 0).flatten()
-            ask_hours = np.argwhere(power > 0).flatten()
-            max_charging_price = power_prices.values[bid_hours].max()
-            min_discharging_price = max_charging_price / (self.storage_system['eta+'] * self.storage_system['eta-'])
-            prc[ask_hours] = (power_prices.iloc[ask_hours] + min_discharging_price) / 2
-            prc[bid_hours] = power_prices.values[bid_hours]
-            add = True
-            for orders in total_orders.values():
-                if any(prc != orders['price']) or any(power != orders['volume']):
-                    add = False
-            if add:
-                total_orders[block_id] = dict(price=prc, volume=power)
-                block_id += 1
-        dfs = []
-        for key, values in total_orders.items():
-            df = pd.DataFrame(data=values)
-            df['name'] = self.name
-            df['block_id'] = key
-            df['hour'] = self.t
-            df = df.set_index(['block_id', 'hour', 'name'])
-            dfs.append(df)
-
-        df = pd.concat(dfs)
-
-        return df
+        return get_exclusive_order_book([self])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+# third party modules
+import logging
+import numpy as np
+import pandas as pd
+from scipy.optimize import linprog
+from scipy.sparse import coo_matrix
+
+log = logging.getLogger('storage')
+
+
+def get_block_template(T: int) -> (np.array, np.array, np.array):
+    """
+    rows, columns and kind of the coefficients of the LP of one storage and price variant,
+    the columns are p_plus, p_minus and volume of each hour, the rows the volume balance of each hour
+    and the volume at the end of the day, the kind selects the coefficient
+    (0: volume 1, 1: previous volume -1, 2: p_plus -eta+, 3: p_minus 1/eta-)
+    """
+    t = np.arange(T)
+    rows = np.concatenate([t, t[1:], t, t, [T]])
+    cols = np.concatenate([2 * T + t, 2 * T + t[:-1], t, T + t, [3 * T - 1]])
+    kind = np.concatenate([np.zeros(T), np.ones(T - 1), np.full(T, 2), np.full(T, 3), [0]]).astype(int)
+    return rows, cols, kind
+
+
+def solve_price_variants(storages: list, prices: list) -> bool:
+    """
+    solves the LP of each price variant of each storage as one LP with a block diagonal constraint matrix
+    and sets the results of the storages, prices holds a dict with the prices of each variant for each storage,
+    returns False if the LP could not be solved
+    """
+    if not storages:
+        return True
+    T, keys = storages[0].T, list(prices[0].keys())
+    num_blocks = len(storages) * len(keys)
+    rows, cols, kind = get_block_template(T)
+
+    systems = [storage.storage_system for storage in storages]
+    # -> parameters of each block, the price variants of a storage are consecutive blocks
+    eta_plus = np.repeat([system['eta+'] for system in systems], len(keys))
+    eta_minus = np.repeat([system['eta-'] for system in systems], len(keys))
+    coefficients = np.stack([np.ones(num_blocks), -np.ones(num_blocks), -eta_plus, 1 / eta_minus], axis=1)
+
+    block = np.repeat(np.arange(num_blocks), len(rows))
+    A_eq = coo_matrix((coefficients[block, np.tile(kind, num_blocks)],
+                       (np.tile(rows, num_blocks) + block * (T + 1), np.tile(cols, num_blocks) + block * 3 * T)),
+                      shape=(num_blocks * (T + 1), num_blocks * 3 * T)).tocsr()
+
+    b_eq = np.zeros((num_blocks, T + 1))
+    b_eq[:, 0] = np.repeat([system['V0'] for system in systems], len(keys))
+    b_eq[:, T] = np.repeat([system['VMax'] / 2 for system in systems], len(keys))
+
+    upper = np.repeat([[system['P+_Max'], system['P-_Max'], system['VMax']] for system in systems], len(keys), axis=0)
+    bounds = np.stack([np.zeros(num_blocks * 3 * T), np.repeat(upper, T, axis=1).flatten()], axis=1)
+
+    # -> maximize the revenue -power * price, the power is the change of the volume
+    prices = np.asarray([variants[key] for variants in prices for key in keys], dtype=float)
+    c = np.concatenate([prices * eta_plus[:, None], -prices / eta_minus[:, None], np.zeros((num_blocks, T))],
+                       axis=1).flatten()
+
+    result = linprog(c, A_eq=A_eq, b_eq=b_eq.flatten(), bounds=bounds, method='highs')
+    if result.status != 0:
+        log.error(f'batched storage lp could not be solved: {result.message}')
+        return False
+
+    x = result.x.reshape(len(storages), len(keys), 3, T)
+    for storage, values in zip(storages, x):
+        for key, (p_plus, p_minus, volume) in zip(keys, values):
+            storage.set_variant_result(key, p_plus, p_minus, volume)
+    return True
+
+
+def get_exclusive_order_book(storages: list) -> pd.DataFrame:
+    """
+    exclusive orders of the storages with one block for each distinct schedule of the price variants,
+    the schedules of all storages are stacked into one (storages x variants x T) array
+    """
+    if not storages:
+        return pd.DataFrame(columns=['block_id', 'hour', 'name', 'price', 'volume']).set_index(
+            ['block_id', 'hour', 'name'])
+    T = storages[0].T
+    num_storages, num_variants = len(storages), len(storages[0].opt_results)
+
+    volume = np.asarray([list(storage.opt_results.values()) for storage in storages], dtype=float)
+    power_prices = np.asarray([storage.prices['power'].values[:T] for storage in storages], dtype=float)[:, None, :]
+    eta = np.asarray([storage.storage_system['eta+'] * storage.storage_system['eta-'] for storage in storages])
+
+    # -> charging hours are bid at the price, discharging hours between the price and the break even price
+    bid, ask = volume < 0, volume > 0
+    max_charging_price = np.where(bid, power_prices, -np.inf).max(axis=2)
+    max_charging_price[~bid.any(axis=2)] = 0
+    min_discharging_price = max_charging_price / eta[:, None]
+    price = np.where(ask, (power_prices + min_discharging_price[:, :, None]) / 2, np.where(bid, power_prices, 0))
+
+    # -> identical blocks of a storage are hashed to the same key, + 0.0 maps -0.0 to 0.0
+    price, volume = price.reshape(-1, T), volume.reshape(-1, T)
+    storage_index = np.repeat(np.arange(num_storages), num_variants)
+    keys = pd.DataFrame(np.concatenate([price + 0.0, volume + 0.0, storage_index[:, None]], axis=1))
+    keep = ~keys.duplicated().values
+    storage_index = storage_index[keep]
+    block_id = pd.Series(storage_index).groupby(storage_index).cumcount().values
+
+    names = np.asarray([storage.name for storage in storages], dtype=object)
+    df = pd.DataFrame(dict(block_id=np.repeat(block_id, T), hour=np.tile(np.arange(T), keep.sum()),
+                           name=np.repeat(names[storage_index], T),
+                           price=price[keep].ravel(), volume=volume[keep].ravel()))
+    return df.set_index(['block_id', 'hour', 'name'])
@@ -0,0 +1,228 @@
+'''
+Dynamic programming solver for the unit commitment of a single power plant.
+
+It solves the same problem as the MILP in PowerPlant.build_model:
+- the outer dp runs over the hours with the on/off state, the current run and the recent starts and stops,
+  which are needed for the minimal run and stop time constraints
+- the dispatch of each run is a ramp constrained LP, which is solved exactly by a dp over the
+  concave piecewise linear value function of the model power p_model (numba)
+
+As in the MILP a run starts and ends at minPower, a start in the first hour has no start costs
+and the run and stop time constraints are only applied for hours after runTime and stopTime.
+The constraint real_max is not modelled, it does not bind for minPower >= 1 kW.
+'''
+import numpy as np
+from numba import njit
+
+EPS = 1e-9
+
+
+@njit(cache=True)
+def _clip(x, y, m, lo, hi, x_out, y_out):
+    # -> restricts the function given by the breakpoints x, y to [lo, hi]
+    lo, hi = max(lo, x[0]), min(hi, x[m - 1])
+    if lo > hi + EPS:
+        return 0
+    hi = max(lo, hi)
+    x_out[0], y_out[0] = lo, np.interp(lo, x[:m], y[:m])
+    n = 1
+    for i in range(m):
+        if lo + EPS < x[i] < hi - EPS:
+            x_out[n], y_out[n] = x[i], y[i]
+            n += 1
+    if hi > lo + EPS:
+        x_out[n], y_out[n] = hi, np.interp(hi, x[:m], y[:m])
+        n += 1
+    return n
+
+
+@njit(cache=True)
+def _get_top(x, y, m):
+    # -> first and last breakpoint of the maximum
+    y_max = y[:m].max()
+    tol = EPS * max(1.0, abs(y_max))
+    first, last = -1, -1
+    for i in range(m):
+        if y[i] >= y_max - tol:
+            if first < 0:
+                first = i
+            last = i
+    return first, last
+
+
+@njit(cache=True)
+def get_run_values(s, reward, weight, kink, delta, grad_up, grad_down, lo_0, hi_0, top):
+    """
+    dispatch dp for a run starting at hour s, returns the value of the run ending in each hour
+    (with p_model = 0 in its last hour) and the value of the run lasting until the end of the horizon,
+    top[t] is the interval of the best model power in hour t for the back tracking
+    """
+    T = len(reward)
+    n = 4 * T + 8
+    x, y = np.zeros(n), np.zeros(n)
+    x_b, y_b = np.zeros(n), np.zeros(n)
+    values = np.full(T, -np.inf)
+
+    lo, hi = (lo_0, hi_0) if s == 0 else (0.0, 0.0)
+    if lo > hi + EPS:
+        return values, -np.inf
+    x[0], x[1] = lo, max(lo, hi)
+    m = 2 if hi > lo + EPS else 1
+
+    for t in range(s, T):
+        if t > s:
+            # -> best predecessor within the ramp: W(p) = max V(q) for p - grad_up <= q <= p + grad_down
+            first, last = _get_top(x, y, m)
+            k = 0
+            for i in range(first + 1):
+                x_b[k], y_b[k] = x[i] - grad_down, y[i]
+                k += 1
+            for i in range(last, m):
+                if x[i] + grad_up > x_b[k - 1] + EPS:
+                    x_b[k], y_b[k] = x[i] + grad_up, y[i]
+                    k += 1
+            m = _clip(x_b, y_b, k, 0.0, delta, x, y)
+            if m == 0:
+                return values, -np.inf
+        # -> add the reward of the hour including the kink of the difference costs
+        if x[0] + EPS < kink[t] < x[m - 1] - EPS:
+            i = np.searchsorted(x[:m], kink[t])
+            if abs(x[i] - kink[t]) > EPS:
+                y_k = np.interp(kink[t], x[:m], y[:m])
+                for j in range(m, i, -1):
+                    x[j], y[j] = x[j - 1], y[j - 1]
+                x[i], y[i] = kink[t], y_k
+                m += 1
+        for i in range(m):
+            y[i] += reward[t] * x[i] - weight[t] * abs(kink[t] - x[i])
+        first, last = _get_top(x, y, m)
+        top[t, 0], top[t, 1] = x[first], x[last]
+        if x[0] <= EPS:
+            values[t] = y[0]
+    return values, y[:m].max()
+
+
+def _get_dispatch(s: int, e: int, end: bool, top: np.array, grad_up: float, grad_down: float) -> np.array:
+    # -> back tracking of the dispatch dp, the best model power is clipped to the ramp of the following hour
+    p_model = np.zeros(e - s + 1)
+    p_model[-1] = 0 if end else top[e, 0]
+    for t in range(e - 1, s - 1, -1):
+        following = p_model[t - s + 1]
+        p_model[t - s] = min(max(top[t, 0], following - grad_up), following + grad_down)
+    return p_model
+
+
+def solve_unit_commitment(power_price: np.array, fuel_price: np.array, emission_price: np.array,
+                          generation_system: dict, start_cost: float, committed_power: np.array = None,
+                          on_hours: np.array = None) -> dict:
+    """
+    returns the optimal schedule with power, on state, starts and objective value,
+    status is 'optimal' or 'infeasible', the plant can be forced to run in on_hours
+    """
+    pwp = generation_system
+    T = len(power_price)
+    min_power, max_power = pwp['minPower'], pwp['maxPower']
+    delta = max_power - min_power
+    run_time, stop_time = pwp['runTime'], pwp['stopTime']
+
+    # -> marginal revenue per kW and difference costs to the committed power
+    margin = power_price - (fuel_price + pwp['chi'] * emission_price) / pwp['eta']
+    if committed_power is None:
+        committed_power, weight = np.zeros(T), np.zeros(T)
+    else:
+        committed_power, weight = np.asarray(committed_power, dtype=float), np.abs(2 * power_price)
+    # -> reward of the model power p_model, the constant part at minPower is added per hour
+    reward = margin.astype(float)
+    kink = committed_power - min_power
+    on_value = margin * min_power
+    off_value = -weight * np.abs(committed_power)
+
+    must_on = np.zeros(T, dtype=bool)
+    must_off = np.zeros(T, dtype=bool)
+    for t in range(T):
+        must_on[t] = pwp['on'] > 0 and t < run_time - pwp['on']
+        must_off[t] = not must_on[t] and pwp['off'] > 0 and t < stop_time - pwp['off']
+    if on_hours is not None:
+        must_on[on_hours] = True
+
+    # -> value of each run, value[s, e] for runs from s to e and open_value[s] for runs until the horizon end
+    lo_0 = max(0.0, pwp['P0'] - pwp['gradM'] - min_power)
+    hi_0 = min(delta, pwp['P0'] + pwp['gradP'] - min_power)
+    value, open_value = np.full((T, T), -np.inf), np.full(T, -np.inf)
+    tops = np.zeros((T, T, 2))
+    cumulated_on = np.concatenate([[0], np.cumsum(on_value)])
+    for s in range(T):
+        if must_off[s]:
+            continue
+        run_values, open_value[s] = get_run_values(s, reward, weight, kink, delta, pwp['gradP'], pwp['gradM'],
+                                                   lo_0, hi_0, tops[s])
+        value[s] = run_values + cumulated_on[1:] - cumulated_on[s]
+        open_value[s] += cumulated_on[T] - cumulated_on[s]
+
+    # -> outer dp, a state is (on, start of the current run, recent starts, recent stops)
+    states = {}
+    if not must_on[0] and pwp['P0'] - pwp['gradM'] <= EPS:
+        states[(0, -1, (), ())] = (off_value[0], None)
+    if not must_off[0] and lo_0 <= hi_0 + EPS:
+        states[(1, 0, (), ())] = (0.0, None)
+    history = [states]
+    for t in range(1, T):
+        new_states = {}
+        for key, (val, _) in states.items():
+            on, run_start, starts, stops = key
+            for z in (0, 1):
+                if (z and must_off[t]) or (not z and must_on[t]):
+                    continue
+                new_val, new_start, new_starts, new_stops = val, run_start, starts, stops
+                if on and not z:
+                    new_val += value[run_start, t - 1]
+                    new_stops = stops + (t,)
+                elif z and not on:
+                    new_val -= start_cost
+                    new_start, new_starts = t, starts + (t,)
+                if new_val == -np.inf:
+                    continue
+                # -> minimal run and stop time, starts and stops in [t - runTime, t) or [t - stopTime, t)
+                if t > run_time and sum(1 for k in new_starts if t - run_time <= k < t) > z:
+                    continue
+                if t > stop_time and sum(1 for k in new_stops if t - stop_time <= k < t) > 1 - z:
+                    continue
+                if not z:
+                    new_val += off_value[t]
+                    new_start = -1
+                new_key = (z, new_start, tuple(k for k in new_starts if k >= t + 1 - run_time),
+                           tuple(k for k in new_stops if k >= t + 1 - stop_time))
+                if new_key not in new_states or new_states[new_key][0] < new_val:
+                    new_states[new_key] = (new_val, key)
+        states = new_states
+        history.append(states)
+
+    best_key, best_value = None, -np.inf
+    for key, (val, _) in states.items():
+        total = val + (open_value[key[1]] if key[0] else 0)
+        if total > best_value:
+            best_key, best_value = key, total
+    if best_key is None:
+        return dict(status='infeasible', power=np.zeros(T), on=np.zeros(T), start=np.zeros(T), obj=0)
+
+    # -> back tracking of the commitment and the dispatch of each run
+    on = np.zeros(T)
+    key = best_key
+    for t in range(T - 1, -1, -1):
+        on[t] = key[0]
+        key = history[t][key][1]
+    start = np.zeros(T)
+    start[1:] = np.diff(on) > 0
+    power = np.zeros(T)
+    t = 0
+    while t < T:
+        if on[t]:
+            e = t
+            while e + 1 < T and on[e + 1]:
+                e += 1
+            power[t:e + 1] = min_power + _get_dispatch(t, e, e + 1 < T, tops[t], pwp['gradP'], pwp['gradM'])
+            t = e + 1
+        else:
+            t += 1
+
+    return dict(status='optimal', power=np.minimum(power, max_power), on=on, start=start, obj=best_value)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from demandlib.electric_profile import StandardLoadProfile, get_load_profiles, get_profile_table, profiles
+
+
+def test_profile_table():
+    for year in [2019, 2020]:
+        quarter_hourly, hourly, factor = get_profile_table('business', year)
+        assert quarter_hourly.shape == (365 + (year == 2020), 96) and hourly.shape == (len(quarter_hourly), 24)
+        # -> christmas is a holiday in winter, 2019-01-05 is a saturday and 2020-01-05 a sunday
+        assert quarter_hourly[date(year, 12, 25).timetuple().tm_yday - 1] == approx(profiles['business'][:, 1])
+        assert quarter_hourly[4] == approx(profiles['business'][:, 0 if year == 2019 else 1])
+        assert hourly[0] == approx(quarter_hourly[0].reshape((24, 4))[:, :3].mean(axis=1))
+        assert factor == approx(1)
+
+
+def test_load_profiles():
+    # -> profiles of a demandP of 1e6 kWh computed day by day with the former run_model,
+    # the days cover the season boundaries, saturdays and holidays
+    references = pd.read_csv(os.path.join(os.path.dirname(__file__), 'data', 'load_profiles.csv'))
+    demand = np.asarray([3500, 5000, 1e6])
+    for _, reference in references.iterrows():
+        d, hourly = pd.Timestamp(reference['day']), reference['hourly']
+        expected = reference[[str(i) for i in range(24 if hourly else 96)]].values.astype(float)
+        power = get_load_profiles(demand, d, type=reference['type'], hourly=hourly)
+        assert power.shape == (3, len(expected))
+        for demand_p, p in zip(demand, power):
+            assert p == approx(expected * demand_p / 1e6)
+        assert StandardLoadProfile(1e6, type=reference['type'], hourly=hourly).run_model(d) == approx(expected)
+    # -> one year of the profile with demandP of 1e6 kWh is about 1 GWh
+    power = sum(StandardLoadProfile(1e6).run_model(d).sum() for d in pd.date_range('2019-01-01', '2019-12-31'))
+    assert 0.5 < power / 1e6 < 1.5
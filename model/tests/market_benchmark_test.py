@@ -0,0 +1,18 @@
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from benchmarks.order_book import get_order_book
+from benchmarks.market_clearing import clear
+
+
+@pytest.fixture(scope='module')
+def order_book():
+    return get_order_book(num_plants=10, num_storages=3, num_hourly=10)
+
+
+@pytest.mark.parametrize('backend', ['pyomo', 'matrix'])
+def test_market_clearing(benchmark, order_book, backend):
+    market = benchmark(clear, order_book, backend)
+    benchmark.extra_info.update(market.timings)
+    assert all(market.timings[step] >= 0 for step in ['build', 'solve', 'extraction'])
@@ -2,11 +2,16 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
-from systems.utils import visualize_orderbook
+from pytest import approx
+
+from systems.utils import visualize_orderbook, get_test_prices, get_test_storage, get_test_power_plant, \
+    get_test_demand_orders
 from systems.powerPlant import PowerPlant
 from systems.storage_hydroPlant import Storage
 from systems.market import DayAheadMarket
 from aggregation.portfolio_powerPlant import PowerPlantPortfolio
+from benchmarks.order_book import get_order_book, save_order_book
+from benchmarks.market_solvers import run_benchmark
 
 
 def test_market():
@@ -147,4 +152,189 @@ def test_market():
     comm[committed_power.index] = committed_power
     committed_power.plot()
     power = pwp.optimize_post_market(comm)
-    my_market.model.use_linked_order.pprint()
\ No newline at end of file
+
+
+def get_test_orders(as_frame: bool = False):
+    power_plant = PowerPlant(T=24, steps=(-100, 0, 100), **get_test_power_plant())
+    pwp_prices = get_test_prices(num=48)
+    pwp_prices['power'].values[18:24] = 0
+    pwp_prices['power'].values[24:] = 20
+    power_plant.optimize(date=pd.Timestamp(2018, 1, 1), prices=pwp_prices, weather=pd.DataFrame())
+    pwp_orders = power_plant.get_ask_orders()
+
+    storage = Storage(T=24, **get_test_storage())
+    storage_prices = get_test_prices(num=24)
+    storage_prices['power'].values[:8] = 100
+    storage_prices['power'] /= 1e4
+    storage.optimize(date=pd.Timestamp(2018, 1, 1), prices=storage_prices, weather=pd.DataFrame())
+    storage_orders = storage.get_exclusive_orders()
+
+    bid_orders = get_test_demand_orders(4000 * np.ones(24))
+    if as_frame:
+        return pd.DataFrame(columns=['price', 'volume']), bid_orders, pwp_orders, storage_orders
+
+    hourly_bid = {key: (value['price'], value['volume'])
+                  for key, value in bid_orders.to_dict(orient='index').items()}
+    linked_orders = {key: (value['price'], value['volume'], value['link'])
+                     for key, value in pwp_orders.to_dict(orient='index').items()}
+    exclusive_orders = {key: (value['price'], value['volume'])
+                        for key, value in storage_orders.to_dict(orient='index').items()}
+    return {}, hourly_bid, linked_orders, exclusive_orders
+
+
+def test_matrix_backend():
+    orders = get_test_orders()
+
+    pyomo_market = DayAheadMarket()
+    pyomo_market.set_parameter(*orders)
+    pyomo_result = pyomo_market.optimize()
+
+    matrix_market = DayAheadMarket(backend='matrix')
+    matrix_market.set_parameter(*orders)
+    matrix_result = matrix_market.optimize()
+
+    assert pyomo_result[0]['price'].values == approx(matrix_result[0]['price'].values)
+    assert pyomo_result[0]['volume'].values == approx(matrix_result[0]['volume'].values)
+    assert pyomo_result[0]['magic_source'].values == approx(matrix_result[0]['magic_source'].values)
+    # -> same accepted volumes for linked and exclusive orders
+    for pyomo_orders, matrix_orders in zip(pyomo_result[1:4], matrix_result[1:4]):
+        volume = pyomo_orders.groupby('hour')['volume'].sum()
+        assert volume.values == approx(matrix_orders.groupby('hour')['volume'].sum().values)
+
+
+def test_highs_solver():
+    orders = get_test_orders()
+    results = []
+    for backend in ['pyomo', 'matrix']:
+        market = DayAheadMarket(solver_type='highs', backend=backend)
+        assert market.solver_type == 'highs'
+        market.set_parameter(*orders)
+        results.append(market.optimize())
+
+    for column in ['price', 'volume', 'magic_source']:
+        assert results[0][0][column].values == approx(results[1][0][column].values)
+
+
+def test_warm_start():
+    orders = get_test_orders()
+    assert not DayAheadMarket().warm_start and not DayAheadMarket().presolve
+    cold_market = DayAheadMarket(solver_type='highs')
+    cold_market.set_parameter(*orders)
+    cold_result = cold_market.optimize()
+    # -> the second clearing starts from the accepted blocks of the first one
+    market = DayAheadMarket(solver_type='highs', warm_start=True)
+    for _ in range(2):
+        market.set_parameter(*orders)
+        result = market.optimize()
+    for column in ['price', 'volume', 'magic_source']:
+        assert result[0][column].values == approx(cold_result[0][column].values)
+
+
+def test_presolve():
+    hourly_ask, hourly_bid = {}, {}
+    for t in range(24):
+        hourly_ask[(t, t, 'res_a')] = (-0.5, 100)
+        hourly_ask[(t, t, 'res_b')] = (-0.5, 300)
+        hourly_ask[(t, t, 'pwp')] = (0.05, 1000)
+        hourly_bid[(t, t, 'dem')] = (3, -200 if t < 12 else -600)
+
+    results = []
+    for presolve in [True, False]:
+        market = DayAheadMarket(solver_type='highs', presolve=presolve)
+        market.set_parameter(dict(hourly_ask), dict(hourly_bid), {}, {})
+        results.append(market.optimize())
+
+    presolved, original = results
+    for column in ['price', 'volume', 'magic_source']:
+        assert presolved[0][column].values == approx(original[0][column].values)
+    # -> the merged orders are split pro rata to the agents
+    used = presolved[1].reset_index()
+    assert used.loc[used['name'] == 'res_a', 'volume'].values == approx(np.r_[50 * np.ones(12), 100 * np.ones(12)])
+    assert used.loc[used['name'] == 'res_b', 'volume'].values == approx(np.r_[150 * np.ones(12), 300 * np.ones(12)])
+    assert used.loc[used['name'] == 'pwp', 'volume'].values == approx(200 * np.ones(12))
+
+
+def test_dual_prices():
+    hourly_ask, hourly_bid = {}, {}
+    for t in range(24):
+        hourly_ask[(t, t, 'res')] = (-0.5, 400)
+        hourly_ask[(t, t, 'pwp')] = (0.05, 1000)
+        hourly_bid[(t, t, 'dem')] = (3, -200 if t < 12 else -600)
+
+    for backend in ['pyomo', 'matrix']:
+        market = DayAheadMarket(solver_type='highs', backend=backend, pricing='dual')
+        market.set_parameter(dict(hourly_ask), dict(hourly_bid), {}, {})
+        prices = market.optimize()[0]['price'].values
+        # -> the partially used order sets the price
+        assert prices == approx(np.r_[-0.5 * np.ones(12), 0.05 * np.ones(12)])
+
+
+def test_dataframe_orders():
+    dict_market = DayAheadMarket()
+    dict_market.set_parameter(*get_test_orders())
+
+    frame_market = DayAheadMarket()
+    frame_market.set_parameter(*get_test_orders(as_frame=True))
+
+    for order_type in ['single_ask', 'single_bid', 'linked_ask', 'exclusive_ask']:
+        assert dict_market.orders[order_type] == frame_market.orders[order_type]
+        index = frame_market.orders[f'{order_type}_index']
+        assert {t: sorted(v) for t, v in dict_market.orders[f'{order_type}_index'].items()} == \
+               {t: sorted(v) for t, v in index.items()}
+    assert dict_market.parent_blocks == frame_market.parent_blocks
+    assert dict_market.start_block == frame_market.start_block
+
+
+def test_merit_order():
+    demand = 4000 * np.ones(24)
+    demand[6:9] = 5000
+    hourly_bid = {key: (value['price'], value['volume'])
+                  for key, value in get_test_demand_orders(demand).to_dict(orient='index').items()}
+    hourly_ask = {}
+    for name, price, volume in [('eeg', -0.5, 1500), ('mrk', -0.001, 1000), ('mrk_2', -0.001, 1000),
+                                ('bio', 0.05, 1200), ('peak', 0.2, 1000)]:
+        for t in range(24):
+            hourly_ask[(t, t, name)] = (price, volume * (1 + t % 3) / 2)
+
+    merit_market = DayAheadMarket()
+    merit_market.set_parameter(hourly_ask, hourly_bid, {}, {})
+    assert merit_market.only_hourly_orders()
+    merit_result = merit_market.clear_merit_order()
+
+    optimize_market = DayAheadMarket()
+    optimize_market.set_parameter(hourly_ask, hourly_bid, {}, {})
+    optimize_result = optimize_market.optimize()
+
+    for column in ['price', 'volume', 'magic_source']:
+        assert merit_result[0][column].values == approx(optimize_result[0][column].values)
+    merit_volume = merit_result[1].groupby('hour')['volume'].sum()
+    assert merit_volume.values == approx(optimize_result[1].groupby('hour')['volume'].sum().values)
+    # -> equal prices share the marginal step pro rata
+    used = merit_result[1].reset_index()
+    mrk = used.loc[used['name'] == 'mrk', 'volume'].values
+    assert mrk == approx(used.loc[used['name'] == 'mrk_2', 'volume'].values)
+
+
+def test_max_prices_hours():
+    market = DayAheadMarket()
+    orders = {'single_ask': dict(hour=np.asarray([0, 5, 24, 30]), price=np.asarray([10., 20., 99., 99.]),
+                                 volume=np.ones(4))}
+    # -> used orders outside of the market hours are ignored
+    prices = market._get_max_prices(orders, {'single_ask': np.ones(4)})
+    assert prices[0] == 10 and prices[5] == 20
+    assert (np.delete(prices, [0, 5]) == -1000).all()
+
+
+def test_order_book_demand():
+    hourly_ask, hourly_bid, linked_orders, _ = get_order_book(num_plants=2, num_storages=0, num_hourly=4)
+    # -> the demand agents share 70 percent of the offered generation
+    generation = linked_orders.groupby('hour')['volume'].sum().reindex(range(24), fill_value=0).values
+    demand = -hourly_bid.groupby('hour')['volume'].sum().values
+    assert demand == approx(np.maximum(0.7 * generation, 1e3))
+
+
+def test_benchmark_solvers(tmp_path):
+    save_order_book(get_order_book(num_plants=2, num_storages=1, num_hourly=2), str(tmp_path))
+    # -> the matrix backend only runs the solvers it supports
+    results = run_benchmark([str(tmp_path)], ['matrix'], ['highs', 'glpk'])
+    assert list(results['solver']) == ['highs']
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+from pytest import approx
+
+from aggregation.portfolio_powerPlant import PowerPlantPortfolio
+from systems.utils import get_test_power_plant
+from tests.powerplant_test import create_pwp
+
+
+def create_portfolio(workers: int = 0) -> PowerPlantPortfolio:
+    portfolio = PowerPlantPortfolio(workers=workers)
+    for i, p_max in enumerate([300, 600, 1500, 1500, 900]):
+        plant = get_test_power_plant(p_max)
+        plant.update(unitID=f'pwp_{i}', fuel=['coal', 'lignite', 'gas'][i % 3], on=i % 3)
+        portfolio.add_energy_system(plant)
+    return portfolio
+
+
+@pytest.mark.parametrize('days', [2, 3])
+def test_workers(days):
+    _, prices = create_pwp()
+    if days == 2:
+        prices['power'] = np.linspace(0.02, 0.12, 48)
+    else:
+        # -> cheap nights, the plants prevent a start on each day
+        prices['power'] = 0.1
+        prices['power'].values[20:30] = 0.05
+    results = []
+    for workers in [0, 2]:
+        portfolio = create_portfolio(workers)
+        result = []
+        # -> more days to check that the workers keep the state of their plants
+        for day in range(1, days + 1):
+            power = portfolio.optimize(pd.Timestamp(2018, 1, day), pd.DataFrame(), prices)
+            orders = portfolio.get_ask_orders()
+            committed = orders.reset_index().groupby(['name', 'hour'], as_index=False)['volume'].sum()
+            post_power = portfolio.optimize_post_market(committed, prices['power'].values[:24] * 1.1)
+            reductions = [{day: (delta, list(hours)) for day, (delta, hours) in model.reduction_next_day.items()}
+                          for model in portfolio.energy_systems]
+            states = [(dict(model.generation_system), reduction)
+                      for model, reduction in zip(portfolio.energy_systems, reductions)]
+            result.append((power, orders, post_power, states))
+        results.append(result)
+        # -> with workers no model is built in this process
+        assert all(len(model.models) == 0 for model in portfolio.energy_systems) == (workers > 0)
+        portfolio.close()
+
+    for (power, orders, post_power, states), (power_w, orders_w, post_power_w, states_w) in zip(*results):
+        assert power_w == approx(power)
+        assert orders_w.index.equals(orders.index)
+        columns = ['price', 'volume', 'link']
+        assert orders_w[columns].values.astype(float) == approx(orders[columns].values.astype(float))
+        assert post_power_w == approx(post_power)
+        assert states_w == states
+
+
+def test_clustering():
+    _, prices = create_pwp()
+    prices['power'] = np.linspace(0.02, 0.12, 48)
+    date = pd.Timestamp(2018, 1, 1)
+    portfolio = PowerPlantPortfolio(clusters=3)
+    for i, p_max in enumerate([300, 600, 1500, 1500, 900]):
+        plant = get_test_power_plant(p_max)
+        plant.update(unitID=f'pwp_{i}', fuel=['coal', 'lignite'][i % 2], eta=0.4 + 0.01 * (i // 2),
+                     startCost=1e3 * (i + 1))
+        portfolio.add_energy_system(plant)
+    power = portfolio.optimize(date, pd.DataFrame(), prices)
+    assert len(portfolio.representatives) == 3
+    for representative, members in zip(portfolio.representatives, portfolio.cluster_members):
+        models = [portfolio.energy_systems[index] for index in members]
+        # -> a start of the representative is paid by each member with its own start cost
+        starts = representative.opt_results[0]['start'] / representative.start_cost
+        assert sum(model.opt_results[0]['start'] for model in models) == approx(representative.opt_results[0]['start'])
+        for model in models:
+            assert model.opt_results[0]['start'] == approx(starts * model.start_cost)
+            # -> the scaled schedule is feasible for the member with the same ratios as the representative
+            pwp, power_model = model.generation_system, model.opt_results[0]['power']
+            assert (power_model <= pwp['maxPower'] + 1e-6).all()
+            assert (power_model[power_model > 0] >= pwp['minPower'] - 1e-6).all()
+            running = (power_model[1:] > 0) & (power_model[:-1] > 0)
+            ramps = np.diff(power_model)[running]
+            assert (ramps <= pwp['gradP'] + 1e-6).all() and (-ramps <= pwp['gradM'] + 1e-6).all()
+    error = portfolio.get_clustering_error(date, pd.DataFrame(), prices)
+    assert error['systems'] == 5 and error['representatives'] == 3
+    assert error['power'] < 0.05 and error['obj'] < 0.05
+    # -> each plant offers its share of the representative
+    orders = portfolio.get_ask_orders()
+    volume = orders.groupby('name')['volume'].sum()
+    for model in portfolio.energy_systems:
+        assert volume[model.name] == approx(model.opt_results[max(model.steps)]['power'].sum())
+    assert power == approx(sum(model.power for model in portfolio.energy_systems))
+
+
+def test_clustering_states():
+    _, prices = create_pwp()
+    date = pd.Timestamp(2018, 1, 1)
+    portfolio = PowerPlantPortfolio(clusters=1)
+    for i, on in enumerate([2, 2, 0]):
+        plant = get_test_power_plant(600)
+        plant.update(unitID=f'pwp_{i}', on=on, off=0 if on else 3)
+        portfolio.add_energy_system(plant)
+    portfolio.optimize(date, pd.DataFrame(), prices)
+    # -> plants with a different must run or must stop time are not in one cluster
+    assert sorted(portfolio.cluster_members) == [[0, 1], [2]]
+    representative = portfolio.representatives[portfolio.cluster_members.index([0, 1])]
+    assert representative.generation_system['on'] == 2
+    # -> the plants are clustered again, if the states of the members differ
+    portfolio.energy_systems[1].generation_system.update(on=0, off=3, P0=0)
+    portfolio.optimize(date, pd.DataFrame(), prices)
+    assert sorted(portfolio.cluster_members) == [[0], [1, 2]]
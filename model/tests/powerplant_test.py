@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import pickle
+
 import numpy as np
 import pandas as pd
-from systems.powerPlant import PowerPlant
+import pytest
+from systems.cache import LRUCache
+from systems.powerPlant import PowerPlant, NO_LINK
 from pytest import approx
 # @pytest.fixture(scope='module')
 
@@ -120,3 +125,213 @@ def test_run_twice():
     print(committed)
     print(committed2)
     assert committed2 == approx(committed)
+
+
+def test_model_is_reused():
+    plant, prices = create_pwp()
+    steps = (-10, 0, 10)
+
+    pwp = PowerPlant(T=24, steps=steps, **plant)
+    pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    models = dict(pwp.models)
+    pwp.optimize(pd.Timestamp(2018, 1, 2), None, prices)
+    pwp.optimize_post_market(pwp.power)
+    # -> one model per horizon, only the parameters change
+    assert all(pwp.models[T] is model for T, model in models.items())
+    assert set(pwp.models.keys()) <= {24, 48}
+
+
+def test_batch_steps():
+    plant, prices = create_pwp()
+    steps = (-10, 0, 10, 1e6)
+
+    pwp = PowerPlant(T=24, steps=steps, **plant)
+    pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    batch = PowerPlant(T=24, steps=steps, batch_steps=True, **plant)
+    batch.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    # -> one model for all steps with the same results as the single solves
+    assert (24, steps) in batch.models
+    for step in steps:
+        assert batch.opt_results[step]['obj'] == approx(pwp.opt_results[step]['obj'])
+        assert batch.opt_results[step]['power'] == approx(pwp.opt_results[step]['power'])
+    assert batch.prevented_start['prevent'] == pwp.prevented_start['prevent']
+
+
+def test_cache():
+    plant, prices = create_pwp(300)
+    steps = (-10, 0, 10)
+    cache = LRUCache()
+
+    pwp = PowerPlant(T=24, steps=steps, cache=cache, **plant)
+    pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    # -> same plant with twice the power and start costs
+    double = {key: 2 * value if key in ['maxPower', 'minPower', 'P0', 'gradP', 'gradM', 'startCost'] else value
+              for key, value in plant.items()}
+    pwp_double = PowerPlant(T=24, steps=steps, cache=cache, **double)
+    misses = cache.misses
+    pwp_double.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    assert cache.misses == misses and cache.hits > 0
+    for step in steps:
+        assert pwp_double.opt_results[step]['power'] == approx(2 * pwp.opt_results[step]['power'])
+        assert pwp_double.opt_results[step]['obj'] == approx(2 * pwp.opt_results[step]['obj'])
+    assert pwp_double.prevented_start['prevent'] == pwp.prevented_start['prevent']
+    # -> a cache hit equals a fresh solve
+    fresh = PowerPlant(T=24, steps=steps, **double)
+    fresh.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    for step in steps:
+        assert pwp_double.opt_results[step]['power'] == approx(fresh.opt_results[step]['power'])
+        assert pwp_double.opt_results[step]['obj'] == approx(fresh.opt_results[step]['obj'])
+    # -> real_max does not scale with maxPower for a minPower below 1
+    small = {key: value / 1e3 if key in ['maxPower', 'minPower', 'P0', 'gradP', 'gradM', 'startCost'] else value
+             for key, value in plant.items()}
+    pwp_small = PowerPlant(T=24, steps=steps, cache=cache, **small)
+    assert pwp_small.get_cache_key_parameters() != pwp.get_cache_key_parameters()
+
+
+@pytest.mark.parametrize('night_price', [0.05, -0.5])
+def test_prevented_start(night_price):
+    plant, prices = create_pwp()
+    # -> cheap hours in the night, running through is cheaper than a restart for the higher night price
+    prices['power'] = 0.1
+    prices['power'].values[20:30] = night_price
+    steps = (-10, 0, 10)
+    results = []
+    for run_through_check in [True, False]:
+        pwp = PowerPlant(T=24, steps=steps, **plant)
+        if not run_through_check:
+            pwp._get_run_through_value = lambda on_hours: np.inf
+        pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+        results.append((pwp.prevented_start, pwp.reduction_next_day))
+    (prevented, reduction), (prevented_solved, reduction_solved) = results
+    assert prevented['prevent'] == (night_price > 0)
+    assert prevented['prevent'] == prevented_solved['prevent']
+    assert prevented['delta'] == approx(prevented_solved['delta'])
+    assert list(prevented['hours']) == list(prevented_solved['hours'])
+    assert reduction.keys() == reduction_solved.keys()
+
+
+@pytest.mark.parametrize('night_price', [0.05, -0.5])
+def test_prevented_start_prices(night_price):
+    plant, prices = create_pwp()
+    prices['power'] = 0.1
+    prices['power'].values[20:30] = night_price
+    # -> the check of the prevented start in the last step leaves the 48 hour prices
+    pwp = PowerPlant(T=24, steps=(-10, 0), **plant)
+    pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    assert len(pwp.prices) == 48
+    assert pwp.prices['power'].values == approx(prices['power'].values[:48])
+
+
+def test_ask_orders():
+    plant, prices = create_pwp()
+    prices['power'] = 0.1
+    prices['power'].values[20:30] = 0.05
+    pwp = PowerPlant(T=24, steps=(-10, 0, 10), **plant)
+    pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    assert pwp.prevented_start['prevent']
+    orders = pwp.get_ask_orders()
+    assert orders.index.is_unique
+    # -> each link points to a block of the order book
+    links = orders.loc[orders['link'] != -1, 'link']
+    assert links.isin(orders.index.get_level_values('block_id')).all()
+    # -> in the hours of the prevented start the minimal power is offered in one block
+    hours = orders.index.get_level_values('hour').isin(pwp.prevented_start['hours'])
+    first_block = orders.loc[hours].index.get_level_values('block_id').min()
+    assert orders.loc[first_block, 'volume'].values == approx(plant['minPower'])
+    volume = orders.groupby('hour')['volume'].sum()
+    assert volume.values == approx(pwp.opt_results[10]['power'][volume.index])
+
+
+def get_order_scenarios():
+    """
+    power plants with fixed schedules of the steps, which cover the stacking of the blocks on top, before and
+    behind the mother block, a start before another start, a running plant and a prevented start
+    """
+    def get_power(*blocks):
+        power = np.zeros(24)
+        for start, end, value in blocks:
+            power[start:end] = value
+        return power
+
+    plant, prices = create_pwp()
+    # -> the window of runTime hours with the highest revenue starts at hour 6
+    prices['power'] = 0.05
+    prices['power'].values[6:18] = 0.1
+    running = dict(plant, P0=600, on=10)
+    late_start = [get_power((6, 18, 600)), get_power((6, 18, 900), (18, 21, 600)),
+                  get_power((3, 6, 900), (6, 21, 1500))]
+    return {'late_start': (plant, prices, late_start, None),
+            # -> the start before the mother block begins above minPower
+            'early_start': (plant, prices, [get_power((6, 24, 600)), get_power((1, 3, 900), (6, 24, 900)),
+                                            get_power((1, 3, 1200), (6, 24, 1200))], None),
+            'running': (running, prices, [get_power((0, 24, 600)), get_power((0, 24, 900)),
+                                          get_power((0, 8, 900), (8, 21, 1500), (21, 24, 900))], None),
+            'prevented_start': (plant, prices, late_start, dict(prevent=True, hours=np.arange(21, 24), delta=0.01))}
+
+
+def set_order_scenario(pwp, prices: pd.DataFrame, powers: list, prevented_start: dict) -> None:
+    pwp.set_parameter(pd.Timestamp(2018, 1, 2), None, prices.copy())
+    for step, power in zip(pwp.steps, powers):
+        pwp.opt_results[step]['power'] = power.copy()
+        pwp.opt_results[step]['start'] = np.diff(np.r_[0, power > 0]).clip(0) * pwp.start_cost
+    if prevented_start is not None:
+        pwp.prevented_start = prevented_start
+
+
+def test_order_reference():
+    # -> order books of the former DataFrame implementation, a missing link is stored as NO_LINK
+    references = pd.read_csv(os.path.join(os.path.dirname(__file__), 'data', 'pwp_orders.csv'))
+    for name, (plant, prices, powers, prevented_start) in get_order_scenarios().items():
+        pwp = PowerPlant(T=24, steps=(-10, 0, 10), **plant)
+        set_order_scenario(pwp, prices, powers, prevented_start)
+        orders = pwp.get_ask_orders().reset_index()
+        reference = references.loc[references['scenario'] == name]
+        for column in ['block_id', 'hour', 'link']:
+            assert list(orders[column]) == list(reference[column])
+        assert orders['price'].values == approx(reference['price'].values)
+        assert orders['volume'].values == approx(reference['volume'].values)
+    assert (references['link'] == NO_LINK).any()
+
+
+def test_infeasible():
+    plant, prices = create_pwp()
+    # -> P0 above maxPower can not be reached with the ramp of the first hour
+    plant.update(P0=1500, on=0, maxPower=1200, gradM=100)
+    pwp = PowerPlant(T=24, steps=(0,), solver_type='highs', **plant)
+    pwp.set_parameter(pd.Timestamp(2018, 1, 1), None, prices)
+    pwp.prices = prices.iloc[:24].copy()
+    assert pwp._solve()['status'] == 'infeasible'
+    power = pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    assert power == approx(np.zeros(24))
+
+
+def test_post_market_skip():
+    plant, prices = create_pwp()
+    prices['power'] = 0.1 + 0.02 * np.sin(np.arange(48) / 4)
+    results = []
+    for skip in [True, False]:
+        pwp = PowerPlant(T=24, steps=(-10, 0, 10), **plant)
+        pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+        solves = []
+        solve = pwp._solve
+        pwp._solve = lambda *args, **kwargs: solves.append(1) or solve(*args, **kwargs)
+        if not skip:
+            pwp._get_committed_result = lambda committed_power: None
+        power = pwp.optimize_post_market(pwp.opt_results[0]['power'].copy(), prices['power'].values[:24])
+        # -> the day ahead solution is still optimal and is not solved again
+        assert len(solves) == (0 if skip else 1)
+        results.append((power, pwp.opt_results[0]['obj'], dict(pwp.generation_system)))
+    (power, obj, state), (power_solved, obj_solved, state_solved) = results
+    assert power == approx(power_solved)
+    assert obj == approx(obj_solved)
+    assert state == state_solved
+
+
+def test_pickle():
+    plant, prices = create_pwp()
+    pwp = PowerPlant(T=24, steps=(0, 10), **plant)
+    power = pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    # -> the solver is created again in the process, which unpickles the plant
+    pwp = pickle.loads(pickle.dumps(pwp))
+    assert pwp.opt is not None
+    assert pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices) == approx(power)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from aggregation.portfolio_demand import DemandPortfolio
+from aggregation.portfolio_renewable import RenewablePortfolio
+from systems.basic_system import EnergySystem
+from systems.prosumer import Prosumer, get_solar_generation
+
+
+def get_test_weather() -> pd.DataFrame:
+    sun = np.clip(np.sin(np.pi * (np.arange(24) - 6) / 12), 0, None)
+    return pd.DataFrame(dict(zenith=90 - 60 * sun, azimuth=90 + np.arange(24) * 7.5,
+                             dni=600 * sun, ghi=500 * sun, dhi=100 * sun))
+
+
+def get_test_battery(i: int) -> dict:
+    return dict(unitID=f'bat_{i}', type='battery', maxPower=4 + i, batPower=5, VMax=4 + 2 * i, V0=i,
+                eta=0.96, azimuth=180, tilt=30, demandP=3000 + 500 * i)
+
+
+def test_battery_fleet():
+    weather = get_test_weather()
+    portfolio = DemandPortfolio(name='dem')
+    portfolio.run_multi_processing = False
+    for i in range(4):
+        portfolio.add_energy_system(get_test_battery(i))
+    portfolio.add_unique_systems()
+    prosumers = [Prosumer(T=24, storage=True, **get_test_battery(i)) for i in range(4)]
+
+    # -> two days to check that the volume is kept
+    for day in [1, 2]:
+        date = pd.Timestamp(2018, 6, day)
+        power = portfolio.optimize(date, weather, pd.DataFrame())
+        for model, prosumer in zip(portfolio.energy_systems, prosumers):
+            prosumer.optimize(date, weather, pd.DataFrame())
+            assert np.array_equal(model.power, prosumer.power)
+            assert np.array_equal(model.volume, prosumer.volume)
+            assert model.storage_system['v0'] == prosumer.storage_system['v0']
+        # -> the portfolio exchanges the grid usage of the prosumers
+        assert np.allclose(power, -sum(prosumer.power for prosumer in prosumers))
+        assert np.abs(portfolio.generation['storage']).sum() > 0
+
+
+def test_pv_fleet():
+    weather = get_test_weather()
+    portfolio = RenewablePortfolio(name='res')
+    portfolio.run_multi_processing = False
+    for i in range(12):
+        portfolio.add_energy_system(dict(unitID=f'pv_{i}', type='solar', maxPower=10 + i,
+                                         azimuth=[135, 180, 225][i % 3], tilt=[20, 30][i % 2]))
+    # -> one irradiance per orientation
+    assert len(portfolio.pv_fleet.generation_systems) == 6
+    generation = portfolio.pv_fleet.get_generation(weather)
+    for model, power in zip(portfolio.energy_systems, generation):
+        assert np.array_equal(power, get_solar_generation(model.generation_system, weather))
+    portfolio.optimize(pd.Timestamp(2018, 6, 1), weather, pd.DataFrame())
+    assert np.allclose(portfolio.generation['solar'], generation.sum(axis=0))
+
+
+def test_consumer_aggregation():
+    date = pd.Timestamp(2018, 6, 1)
+    portfolio = DemandPortfolio(name='dem')
+    portfolio.run_multi_processing = False
+    consumers = [dict(unitID=f'{consumer_type}_{i}', demandP=1e6 * (i + 1), type=consumer_type)
+                 for consumer_type in ['household', 'business'] for i in range(3)]
+    for consumer in consumers:
+        portfolio.add_energy_system(dict(consumer))
+    # -> one aggregated load per type
+    assert len(portfolio.energy_systems) == 2
+    power = portfolio.optimize(date, pd.DataFrame(), pd.DataFrame())
+
+    demand = portfolio.get_consumer_demand()
+    assert list(demand.columns) == [consumer['unitID'] for consumer in consumers]
+    expected = [EnergySystem(demand_type=consumer['type'], **consumer).optimize(date) for consumer in consumers]
+    assert np.allclose(power, np.sum(expected, axis=0))
+    assert np.allclose(demand.values.T, -np.asarray(expected))
+    # -> consumers added after an optimization are part of the aggregated load
+    portfolio.add_energy_system(dict(unitID='household_3', demandP=1e6, type='household'))
+    assert len(portfolio.energy_systems) == 2
+    assert portfolio.energy_systems[0].demand_generator.demandP == 7e6
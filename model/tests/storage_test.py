@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from aggregation.portfolio_storage import StrPort
+from systems.storage_hydroPlant import Storage, PRICE_FUNCS
+from systems.storage_matrix import get_exclusive_order_book
+from systems.utils import get_test_prices, get_test_storage
+
+
+def get_revenue(storage: Storage, volume: np.array, prices: np.array) -> float:
+    return -(prices * np.diff(np.concatenate([[storage.storage_system['V0']], volume]))).sum()
+
+
+def test_batch_variants():
+    prices = get_test_prices()
+    prices['power'] = np.random.default_rng(0).uniform(0.01, 0.2, len(prices))
+    storages, volumes = [], []
+    for batch in [False, True]:
+        storage = Storage(T=24, batch_variants=batch, **get_test_storage(2000))
+        # -> volume of each price function
+        variant_volumes = {}
+        set_variant_result = storage.set_variant_result
+        storage.set_variant_result = lambda key, p_plus, p_minus, volume: (
+            variant_volumes.update({key: volume}), set_variant_result(key, p_plus, p_minus, volume))
+        storage.optimize(pd.Timestamp(2018, 1, 1), pd.DataFrame(), prices.copy())
+        storages.append(storage)
+        volumes.append(variant_volumes)
+
+    storage, batch_storage = storages
+    assert list(batch_storage.opt_results.keys()) == list(PRICE_FUNCS.keys())
+    assert batch_storage.prices['power'].values == approx(storage.prices['power'].values)
+    variants = storage.get_price_variants(prices['power'].values.copy())
+    for key, price in variants.items():
+        assert get_revenue(batch_storage, volumes[1][key], price) == approx(get_revenue(storage, volumes[0][key], price))
+
+
+def test_batch_portfolio():
+    prices = get_test_prices()
+    prices['power'] = np.random.default_rng(1).uniform(0.01, 0.2, len(prices))
+    results = []
+    for batch in [False, True]:
+        portfolio = StrPort(name='str', batch=batch, run_multi_processing=False)
+        for i, v_max in enumerate([200, 2000, 5000]):
+            portfolio.add_energy_system(dict(get_test_storage(v_max), unitID=f'str_{i}'))
+        portfolio.optimize(pd.Timestamp(2018, 1, 1), pd.DataFrame(), prices.copy())
+        orders = portfolio.get_exclusive_orders()
+        assert set(orders.index.get_level_values('name')) == {'str_0', 'str_1', 'str_2'}
+        results.append(portfolio)
+
+    for storage, batch_storage in zip(*[portfolio.energy_systems for portfolio in results]):
+        price = storage.prices['power'].values[:24]
+        assert get_revenue(batch_storage, batch_storage.volume, price) == approx(get_revenue(storage, storage.volume, price))
+
+
+def test_exclusive_orders():
+    prices = get_test_prices()
+    prices['power'] = np.random.default_rng(2).uniform(0.01, 0.2, len(prices))
+    portfolio = StrPort(name='str', batch=True, run_multi_processing=False)
+    for i, v_max in enumerate([200, 2000]):
+        portfolio.add_energy_system(dict(get_test_storage(v_max), unitID=f'str_{i}'))
+    portfolio.optimize(pd.Timestamp(2018, 1, 1), pd.DataFrame(), prices.copy())
+    # -> two price variants with the same schedule give one block
+    portfolio.energy_systems[1].opt_results = dict(portfolio.energy_systems[0].opt_results)
+    portfolio.energy_systems[1].opt_results['left'] = portfolio.energy_systems[1].opt_results['normal']
+    orders = portfolio.get_exclusive_orders()
+
+    for storage in portfolio.energy_systems:
+        storage_orders = storage.get_exclusive_orders()
+        assert storage_orders.values == approx(orders.xs(storage.name, level='name', drop_level=False).values)
+        blocks = {tuple(block.values.flatten()) for _, block in storage_orders.groupby(level='block_id')}
+        assert len(blocks) == storage_orders.index.get_level_values('block_id').nunique()
+        volumes = {tuple(power) for power in storage.opt_results.values()}
+        assert len(blocks) == len(volumes)
+
+
+def test_exclusive_order_book():
+    storage = Storage(T=24, **get_test_storage())
+    storage.prices = pd.DataFrame(dict(power=0.01 * np.arange(1, 25)))
+    charge = np.zeros(24)
+    charge[[0, 1]], charge[[12, 13]] = -10, 10
+    discharge = np.zeros(24)
+    discharge[12] = 10
+    # -> left equals normal and demand equals right, pv_sink has no charging hours
+    storage.opt_results = {'left': charge, 'right': np.zeros(24), 'normal': charge.copy(),
+                           'pv_sink:': discharge, 'demand': np.zeros(24)}
+    orders = get_exclusive_order_book([storage])
+    assert list(orders.index.get_level_values('block_id').unique()) == [0, 1, 2]
+
+    eta = 0.8 * 0.87
+    price = np.zeros(24)
+    # -> charging at the price, discharging between the price and the break even price of the charging hours
+    price[[0, 1]] = [0.01, 0.02]
+    price[[12, 13]] = (np.asarray([0.13, 0.14]) + 0.02 / eta) / 2
+    expected = {0: (price, charge), 1: (np.zeros(24), np.zeros(24)),
+                # -> without charging hours the charging price is 0 and the discharging hour is bid at half its price
+                2: (np.r_[np.zeros(12), 0.065, np.zeros(11)], discharge)}
+    for block_id, (block_price, block_volume) in expected.items():
+        block = orders.xs(block_id, level='block_id')
+        assert list(block.index.get_level_values('hour')) == list(range(24))
+        assert block['price'].values == approx(block_price)
+        assert block['volume'].values == approx(block_volume)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+from pytest import approx
+
+from systems.powerPlant import PowerPlant
+from systems.unit_commitment import solve_unit_commitment
+from tests.powerplant_test import create_pwp
+
+
+def get_utils_pwp(max_p: float = 300, min_p: float = 100):
+    # -> power plant and prices of systems/utils.py
+    plant = {'unitID': 'x', 'fuel': 'lignite', 'maxPower': max_p, 'minPower': min_p, 'eta': 0.4, 'P0': 120,
+             'chi': 0.407 / 1e3, 'stopTime': 12, 'runTime': 6, 'gradP': 300, 'gradM': 300, 'on': 1, 'off': 0,
+             'startCost': 1e3}
+    prices = dict(power=np.ones(48), gas=np.ones(48) * 0.03, co=np.ones(48) * 23.8, lignite=np.ones(48) * 0.015,
+                  coal=np.ones(48) * 0.02, nuc=np.ones(48) * 0.01)
+    prices = pd.DataFrame(data=prices, index=pd.date_range(start='2018-01-01', freq='h', periods=48))
+    return plant, prices
+
+
+def get_run_through_pwp():
+    plant, prices = create_pwp(1500)
+    plant['on'] = 24
+    plant['P0'] = 1500
+    prices['power'] += 10
+    return plant, prices
+
+
+# -> committed power of the post market optimization as function of the day ahead power
+COMMITTED = {'same': lambda p: p, 'half': lambda p: p / 2, 'zero': lambda p: p * 0,
+             'gap': lambda p: np.where((np.arange(24) >= 4) & (np.arange(24) < 10), 0, p),
+             'up_down': lambda p: np.where(np.arange(24) % 2 == 0, 0, p)}
+
+CASES = [(lambda: create_pwp(1500), (-10, 0, 10, 1e6), 'same'),
+         (get_run_through_pwp, (-10, 0, 10, 1e6), 'same'),
+         (lambda: create_pwp(300), (-100, 0, 100), 'gap'),
+         (lambda: create_pwp(), (-10, 0, 10), 'same'),
+         (lambda: get_utils_pwp(), (-100, 0, 100), 'half'),
+         (lambda: get_utils_pwp(), (-100, 0, 100), 'zero'),
+         (lambda: get_utils_pwp(700), (-100, 0, 100), 'zero'),
+         (lambda: get_utils_pwp(700, 10), (-100, 0, 100), 'zero'),
+         (lambda: get_utils_pwp(600, 10), (-100, 0, 100), 'half'),
+         (lambda: get_utils_pwp(600, 10), (-100, 0, 100), 'gap'),
+         (lambda: get_utils_pwp(600, 10), (-100, 0, 100), 'up_down')]
+
+
+def run_pwp(solver_type: str, plant: dict, prices: pd.DataFrame, steps: tuple, committed: str):
+    pwp = PowerPlant(T=24, steps=steps, solver_type=solver_type, **plant)
+    results = []
+    for day in range(2):
+        power = pwp.optimize(pd.Timestamp(2018, 1, 1 + day), None, prices.copy())
+        results.append({step: pwp.opt_results[step]['obj'] for step in steps})
+        pwp.optimize_post_market(COMMITTED[committed](power))
+        results.append(dict(obj=pwp.opt_results[0]['obj'], on=pwp.generation_system['on'],
+                            off=pwp.generation_system['off'], P0=pwp.generation_system['P0']))
+    return results, pwp
+
+
+@pytest.mark.parametrize('case', range(len(CASES)))
+def test_dp_equals_milp(case):
+    create, steps, committed = CASES[case]
+    plant, prices = create()
+    milp, _ = run_pwp('glpk', plant.copy(), prices, steps, committed)
+    dp, _ = run_pwp('dp', plant.copy(), prices, steps, committed)
+    for milp_result, dp_result in zip(milp, dp):
+        for key, value in milp_result.items():
+            # -> the milp solution is optimal within the relative mip gap of the solver
+            assert dp_result[key] == approx(value, rel=1e-4, abs=1e-6)
+
+
+def test_dp_schedule():
+    plant, prices = create_pwp(1500)
+    pwp = PowerPlant(T=24, steps=(0,), solver_type='dp', **plant)
+    power = pwp.optimize(pd.Timestamp(2018, 1, 1), None, prices)
+    # -> runs at minPower in the first hour, ramps up and shuts down at minPower in the zero price hours
+    expected = [600., 1200.] + [1500.] * 16 + [900., 600.] + [0.] * 4
+    assert power == approx(expected)
+
+
+def test_initial_ramp():
+    plant, prices = create_pwp(1500)
+    # -> plant has to stay close to P0 in the first hour and can not shut down
+    plant.update(P0=1500, on=0, off=0, gradM=100)
+    result = solve_unit_commitment(prices['power'].values[:24], prices['coal'].values[:24], prices['co'].values[:24],
+                                   plant, plant['startCost'])
+    assert result['status'] == 'optimal'
+    assert result['power'][0] >= 1400
+    # -> P0 above maxPower can not be reached
+    plant.update(maxPower=1200)
+    result = solve_unit_commitment(prices['power'].values[:24], prices['coal'].values[:24], prices['co'].values[:24],
+                                   plant, plant['startCost'])
+    assert result['status'] == 'infeasible'